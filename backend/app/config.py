@@ -0,0 +1,85 @@
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.environ.get("NUTRICARE_DATA_DIR", os.path.join(BASE_DIR, "data"))
+
+# Local SQLite store for extracted biomarkers and report history
+STORE_PATH = os.environ.get("NUTRICARE_STORE_PATH", os.path.join(DATA_DIR, "nutricare.db"))
+
+# Meal/food knowledge base (hot-reloaded when files change)
+KNOWLEDGE_DIR = os.environ.get("NUTRICARE_KNOWLEDGE_DIR", os.path.join(BASE_DIR, "knowledge"))
+NUTRITION_GUIDELINES_PATH = os.environ.get(
+    "NUTRICARE_GUIDELINES_PATH",
+    os.path.join(BASE_DIR, "..", "..", "training", "data", "nutrition_guidelines.csv")
+)
+
+# Upper bound on time spent optimizing one weekly meal plan
+PLANNER_TIME_BUDGET_MS = float(os.environ.get("NUTRICARE_PLANNER_TIME_BUDGET_MS", "50"))
+
+# Disease text classifier: "bert" (the fine-tuned teacher) or "student"
+# (distilled by training/distill_classifier.py)
+DISEASE_CLASSIFIER = os.environ.get("NUTRICARE_DISEASE_CLASSIFIER", "bert").lower()
+DISEASE_TEACHER_DIR = os.environ.get(
+    "NUTRICARE_DISEASE_TEACHER_DIR", os.path.join(BASE_DIR, "models", "bert_disease_classifier")
+)
+DISEASE_STUDENT_DIR = os.environ.get(
+    "NUTRICARE_DISEASE_STUDENT_DIR", os.path.join(BASE_DIR, "models", "disease_student")
+)
+DISEASE_MODEL_DIR = DISEASE_STUDENT_DIR if DISEASE_CLASSIFIER == "student" else DISEASE_TEACHER_DIR
+# Extra model bundles kept loaded for A/B switching: "name=path,name=path"
+DISEASE_MODEL_VERSIONS = os.environ.get("NUTRICARE_DISEASE_MODEL_VERSIONS", "")
+# Version chosen via POST /models/{name}/activate, shared by all server workers
+ACTIVE_MODEL_PATH = os.environ.get("NUTRICARE_ACTIVE_MODEL_PATH", os.path.join(DATA_DIR, "active_model.json"))
+
+# Shadow evaluation: a candidate model (version name or bundle directory)
+# scores this fraction of predict_disease requests off the response path
+SHADOW_MODEL = os.environ.get("NUTRICARE_SHADOW_MODEL", "")
+SHADOW_FRACTION = float(os.environ.get("NUTRICARE_SHADOW_FRACTION", "0"))
+SHADOW_QUEUE_SIZE = int(os.environ.get("NUTRICARE_SHADOW_QUEUE_SIZE", "256"))
+SHADOW_DB_PATH = os.environ.get("NUTRICARE_SHADOW_DB_PATH", os.path.join(DATA_DIR, "shadow.db"))
+
+# CPU inference threading. Each server worker gets INFERENCE_THREADS
+# intra-op threads (0 = its share of the cores: cores // workers) and
+# INFERENCE_INTEROP_THREADS inter-op threads. With PIN_WORKER_CORES=1 each
+# worker claims a slot and is pinned to its own disjoint block of cores.
+# Worker count follows uvicorn's WEB_CONCURRENCY unless set explicitly.
+INFERENCE_WORKERS = int(os.environ.get("NUTRICARE_WORKERS", os.environ.get("WEB_CONCURRENCY", "1")))
+INFERENCE_THREADS = int(os.environ.get("NUTRICARE_INFERENCE_THREADS", "0"))
+INFERENCE_INTEROP_THREADS = int(os.environ.get("NUTRICARE_INFERENCE_INTEROP_THREADS", "1"))
+PIN_WORKER_CORES = os.environ.get("NUTRICARE_PIN_WORKER_CORES", "0") == "1"
+WORKER_SLOT_DIR = os.environ.get("NUTRICARE_WORKER_SLOT_DIR", os.path.join(DATA_DIR, "worker_slots"))
+# Map model.safetensors read-only instead of copying it into each process,
+# so every worker shares the page-cache copy of the BERT weights
+MMAP_WEIGHTS = os.environ.get("NUTRICARE_MMAP_WEIGHTS", "0") == "1"
+
+# Optional plan narration by a language model ("none", "transformers" or
+# "openai" for any OpenAI-compatible server, e.g. a local llama.cpp/vLLM)
+NARRATION_BACKEND = os.environ.get("NUTRICARE_NARRATION_BACKEND", "none").lower()
+NARRATION_MODEL = os.environ.get("NUTRICARE_NARRATION_MODEL", "Qwen/Qwen2.5-0.5B-Instruct")
+NARRATION_BASE_URL = os.environ.get("NUTRICARE_NARRATION_BASE_URL", "http://localhost:8080/v1")
+NARRATION_API_KEY = os.environ.get("NUTRICARE_NARRATION_API_KEY", "not-needed")
+NARRATION_TIMEOUT_MS = float(os.environ.get("NUTRICARE_NARRATION_TIMEOUT_MS", "2000"))
+NARRATION_MAX_TOKENS = int(os.environ.get("NUTRICARE_NARRATION_MAX_TOKENS", "256"))
+NARRATION_BATCH_SIZE = int(os.environ.get("NUTRICARE_NARRATION_BATCH_SIZE", "8"))
+NARRATION_BATCH_WAIT_MS = float(os.environ.get("NUTRICARE_NARRATION_BATCH_WAIT_MS", "20"))
+NARRATION_CACHE_SIZE = int(os.environ.get("NUTRICARE_NARRATION_CACHE_SIZE", "1024"))
+# Requests waiting for the narration backend; beyond this, plans are served un-narrated
+NARRATION_QUEUE_SIZE = int(os.environ.get("NUTRICARE_NARRATION_QUEUE_SIZE", "64"))
+
+# Precomputed meal/rule embeddings for semantic meal search. The encoder
+# defaults to the shipped BERT classifier weights (mean pooled).
+EMBEDDINGS_DIR = os.environ.get("NUTRICARE_EMBEDDINGS_DIR", os.path.join(DATA_DIR, "embeddings"))
+EMBEDDING_MODEL = os.environ.get(
+    "NUTRICARE_EMBEDDING_MODEL",
+    os.path.join(BASE_DIR, "models", "bert_disease_classifier")
+)
+
+# RandomForest numeric risk model trained by training/train_ml_model.py
+TRAINING_MODELS_DIR = os.environ.get(
+    "NUTRICARE_TRAINING_MODELS_DIR",
+    os.path.join(BASE_DIR, "..", "..", "training", "models")
+)
+ML_MODEL_PATH = os.environ.get("NUTRICARE_ML_MODEL_PATH", os.path.join(TRAINING_MODELS_DIR, "ml_model.pkl"))
+SCALER_PATH = os.environ.get("NUTRICARE_SCALER_PATH", os.path.join(TRAINING_MODELS_DIR, "scaler.pkl"))
+# Array export of the same forest (training/export_forest.py); preferred when present
+COMPACT_FOREST_DIR = os.environ.get("NUTRICARE_COMPACT_FOREST_DIR", os.path.join(TRAINING_MODELS_DIR, "forest"))
@@ -2,12 +2,16 @@ from fastapi import FastAPI
 from app.routes.upload import router as upload_router
 from app.routes.diet import router as diet_router
 from app.routes.predict import router as predict_router
+from app.routes.history import router as history_router
+from app.routes.knowledge import router as knowledge_router
 
 app = FastAPI(title="AI Diet Plan Generator")
 
 app.include_router(upload_router)
 app.include_router(diet_router)
 app.include_router(predict_router)
+app.include_router(history_router)
+app.include_router(knowledge_router)
 
 @app.get("/")
 def home():
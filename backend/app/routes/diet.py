@@ -1,49 +1,47 @@
-from fastapi import APIRouter
-from pydantic import BaseModel
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel, Field
+
+from app.services.diet_engine import generate_quick_plan
+from app.services.knowledge_base import get_knowledge_base
+from app.services.meal_embeddings import StaleIndexError, search_meals
 
 router = APIRouter(prefix="/api/diet", tags=["Diet Generator"])
 
 class DietRequest(BaseModel):
-    age: int
-    weight: float
-    height: float
+    age: int = Field(gt=0)
+    weight: float = Field(gt=0)  # kg
+    height: float = Field(gt=0)  # cm
     condition: str
     goal: str
     diet_type: str
+    gender: Optional[str] = None
+    allergies: List[str] = []
 
 @router.post("/generate")
 def generate_diet(data: DietRequest):
-    # STEP 1: Read user input
-    condition = data.condition.lower()
-    goal = data.goal.lower()
-    diet_type = data.diet_type.lower()
-
-    # STEP 2: Rule-based logic (can later replace with AI)
-    breakfast = []
-    lunch = []
-    dinner = []
-    avoid = []
-
-    if condition == "diabetes":
-        avoid += ["Sugar", "White bread", "Soft drinks"]
-        breakfast += ["Oats", "Boiled eggs", "Green tea"]
-        lunch += ["Brown rice", "Vegetables", "Salad"]
-        dinner += ["Soup", "Grilled vegetables"]
-
-    if goal == "weight_loss":
-        breakfast.append("Fruit (low sugar)")
-        dinner = ["Light soup", "Salad"]
-
-    if diet_type == "veg":
-        breakfast = [item for item in breakfast if "egg" not in item.lower()]
-
-    # STEP 3: Final diet plan
-    diet_plan = {
-        "breakfast": breakfast,
-        "lunch": lunch,
-        "dinner": dinner,
-        "avoid": avoid,
-        "notes": "Personalized diet generated based on health condition and goal."
-    }
-
-    return diet_plan
+    # Same knowledge base, rule tables and planner as /upload/, without OCR.
+    # Equivalent requests are served from the memoized plan cache.
+    return generate_quick_plan(
+        data.age,
+        data.weight,
+        data.height,
+        data.condition,
+        data.goal,
+        data.diet_type,
+        data.gender,
+        data.allergies
+    )
+
+@router.get("/meals/search")
+def search_meal_catalog(q: str, k: int = Query(10, ge=1, le=50), meal_type: Optional[str] = None,
+                        preferences: List[str] = Query([]), allergies: List[str] = Query([])):
+    # Semantic lookup over precomputed meal embeddings, e.g. q="low potassium"
+    try:
+        results = search_meals(q, k, meal_type, preferences, allergies)
+    except (FileNotFoundError, StaleIndexError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    # Allergies with no ingredient flag filter nothing; say so rather than imply safety
+    return {"query": q, "results": results,
+            "unrecognized_allergies": get_knowledge_base().unrecognized_allergies(allergies)}
@@ -0,0 +1,43 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+
+from app.services.biomarker_store import (
+    cohort_aggregate,
+    get_timeseries,
+    list_reports,
+    parse_report_date,
+    summarize_trend,
+)
+
+router = APIRouter(prefix="/api/history", tags=["History"])
+
+def _date_range(start: Optional[str], end: Optional[str]):
+    try:
+        return parse_report_date(start), parse_report_date(end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/patients/{patient_id}/reports")
+def patient_reports(patient_id: str):
+    return {"patient_id": patient_id, "reports": list_reports(patient_id)}
+
+@router.get("/patients/{patient_id}/biomarkers/{biomarker}")
+def patient_timeseries(patient_id: str, biomarker: str, start: Optional[str] = None, end: Optional[str] = None):
+    start, end = _date_range(start, end)
+    series = get_timeseries(patient_id, biomarker.lower(), start, end)
+    return {
+        "patient_id": patient_id,
+        "biomarker": biomarker.lower(),
+        "series": series,
+        "trend": summarize_trend(series)
+    }
+
+@router.get("/cohort/{biomarker}")
+def cohort_stats(biomarker: str, start: Optional[str] = None, end: Optional[str] = None, period: Optional[str] = None):
+    start, end = _date_range(start, end)
+    try:
+        stats = cohort_aggregate(biomarker.lower(), start, end, period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"biomarker": biomarker.lower(), "period": period, "stats": stats}
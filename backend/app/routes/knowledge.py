@@ -0,0 +1,18 @@
+from fastapi import APIRouter, HTTPException
+
+from app.services.knowledge_base import get_knowledge_base, reload_knowledge_base
+
+router = APIRouter(prefix="/api/knowledge", tags=["Knowledge Base"])
+
+@router.get("/")
+def knowledge_stats():
+    return get_knowledge_base().stats()
+
+@router.post("/reload")
+def reload_knowledge():
+    try:
+        kb = reload_knowledge_base()
+    except Exception as e:
+        # The previous snapshot stays active
+        raise HTTPException(status_code=500, detail=f"Reload failed: {e}")
+    return {"reloaded": True, **kb.stats()}
@@ -1,5 +1,5 @@
-from fastapi import APIRouter
-from app.services.bert_services import predict_disease
+from fastapi import APIRouter, HTTPException
+from app.services.bert_services import predict_disease, registry, shadow
 
 router = APIRouter()
 
@@ -9,5 +9,28 @@ def predict_disease_api(payload: dict):
     if not text:
         return {"predicted_disease": []}
 
-    conditions = predict_disease(text)
-    return {"predicted_disease": conditions}
+    version = payload.get("model_version")
+    if version and version not in registry.names():
+        raise HTTPException(status_code=404, detail=f"Unknown model version: {version}")
+    conditions = predict_disease(text, model_version=version)
+    return {"predicted_disease": conditions, "model_version": version or registry.active.name}
+
+@router.get("/models")
+def list_models():
+    return registry.describe()
+
+@router.get("/models/shadow")
+def shadow_report():
+    if shadow is None:
+        return {"enabled": False}
+    return {"enabled": True, **shadow.summary()}
+
+@router.post("/models/{name}/activate")
+def activate_model(name: str):
+    # Swap the active version; every version is already loaded. Recorded in
+    # the shared state file, so the other workers switch on their next request
+    try:
+        bundle = registry.activate(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model version: {name}")
+    return {"active": bundle.name}
@@ -1,64 +1,92 @@
-from fastapi import APIRouter, UploadFile, File
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form
 
 from app.services.ocr_service import extract_text
-from app.services.text_cleaner import clean_text
-from app.services.bert_services import predict_disease
-from app.services.diet_generator import generate_diet_plan
-from app.services.medical_parser import build_medical_intent
-from app.services.gpt_service import normalize_rules
+from app.services.pipeline import compute_fingerprints, run_pipeline
+from app.services.biomarker_store import (
+    NAME_KEY_WARNING, keyed_by_name, parse_report_date, patient_key, save_report, save_stage_outputs
+)
 
 router = APIRouter(prefix="/upload", tags=["Upload"])
 
 @router.post("/")
-async def upload_report(file: UploadFile = File(...)):
+async def upload_report(
+    file: UploadFile = File(...),
+    patient_id: Optional[str] = Form(None),
+    report_date: Optional[str] = Form(None),
+    preferences: Optional[str] = Form(None),
+    allergies: Optional[str] = Form(None)
+):
+
+    # Reject a malformed date before the (slow) OCR and pipeline run
+    try:
+        report_date = parse_report_date(report_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     # 1️⃣ OCR - Extract text from medical report
     text = extract_text(await file.read(), file.filename)
     print(f"Extracted text: {text[:200]}...")
 
-    # 2️⃣ Clean text - Preprocess and normalize
-    cleaned_text = clean_text(text)
-    print(f"Cleaned text: {cleaned_text[:200]}...")
+    # 2️⃣-7️⃣ Clean text, extract biomarkers, detect diseases, score risk,
+    # normalize rules and generate the diet plan (see app.services.pipeline.STAGES)
+    # Comma-separated form values, e.g. preferences="vegan,gluten_free"
+    outputs = run_pipeline({
+        "source": text,
+        "preferences": {
+            "preferences": [p.strip() for p in (preferences or "").split(",") if p.strip()],
+            "allergies": [a.strip() for a in (allergies or "").split(",") if a.strip()]
+        }
+    })
+    print(f"Cleaned text: {outputs['text'][:200]}...")
 
-    # 3️⃣ Build medical intent FIRST (extracts biomarkers, patient info)
-    medical_intent = build_medical_intent([], cleaned_text)
-    print(f"Medical intent: {medical_intent}")
-    
-    # Get extracted biomarkers for disease prediction
+    medical_intent = outputs["biomarkers"]
     biomarkers = medical_intent.get("biomarkers", {})
-
-    # 4️⃣ Disease detection (BERT + biomarker-based)
-    diseases = predict_disease(cleaned_text, biomarkers)
+    diseases = outputs["conditions"]
+    risk = outputs["risk"]
+    diet_plan = outputs["plan"]
     print(f"Detected diseases: {diseases}")
-    
-    # Update medical intent with detected diseases
-    medical_intent["conditions"] = diseases
-
-    # 5️⃣ Normalize rules based on conditions and biomarkers
-    normalized = normalize_rules(medical_intent)
-    print(f"Normalized rules: {normalized}")
-
-    # 6️⃣ Prepare comprehensive GPT output dictionary
-    gpt_output = {
-        "diet_rules": normalized.get("diet_rules", []),
-        "condition": ", ".join(diseases) if diseases else "general wellness",
-        "patient": medical_intent.get("patient_info", {}).get("name", "Patient"),
-        "medical_condition": diseases if diseases else ["general"],
-        "patient_info": medical_intent.get("patient_info", {}),
-        "biomarkers": biomarkers,
-        "medical_intent": medical_intent,
-        "risk_level": medical_intent.get("risk_level", "medium")
-    }
-
-    # 7️⃣ Diet generation using LLM (with biomarkers context)
-    diet_plan = generate_diet_plan(gpt_output)
+    print(f"Normalized rules: {outputs['rules']}")
     print(f"Generated diet plan successfully")
 
+    # 8️⃣ Persist extracted values and stage outputs for longitudinal queries
+    # and incremental regeneration. Reports with no patient_id and no
+    # extracted name are not stored: they could not be told apart later.
+    # Name-keyed reports are stored with a warning, since namesakes share a key.
+    patient_info = medical_intent.get("patient_info", {})
+    by_name = keyed_by_name(patient_info, patient_id)
+    patient_id = patient_key(patient_info, patient_id)
+    report_id = None
+    warnings = []
+    if patient_id is None:
+        warnings.append("Report not saved to history: pass a patient_id to track it over time")
+    elif by_name:
+        warnings.append(NAME_KEY_WARNING.format(key=patient_id))
+    try:
+        if patient_id is not None:
+            report_id = save_report(
+                patient_id,
+                biomarkers,
+                patient_info,
+                diseases,
+                risk["level"],
+                report_date,
+                file.filename
+            )
+            save_stage_outputs(report_id, outputs, compute_fingerprints())
+    except Exception as e:
+        print(f"Biomarker store error: {e}")
+
     return {
         "success": True,
+        "patient_id": patient_id,
+        "report_id": report_id,
+        "warnings": warnings,
         "detected_conditions": diseases,
         "biomarkers": biomarkers,
-        "patient_info": medical_intent.get("patient_info", {}),
-        "risk_level": medical_intent.get("risk_level", "medium"),
+        "patient_info": patient_info,
+        "risk_level": risk["level"],
+        "risk": risk,
         "diet_plan": diet_plan
     }
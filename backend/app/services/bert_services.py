@@ -1,19 +1,33 @@
-from transformers import BertTokenizer, BertForSequenceClassification
-import torch
 import re
+import time
 
-import os
-MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "models", "bert_disease_classifier")
+from ..config import ACTIVE_MODEL_PATH, DISEASE_CLASSIFIER, DISEASE_MODEL_DIR, DISEASE_MODEL_VERSIONS
+from .disease_rules import evaluate
+from .inference_threads import configure_process
+from .model_bundle import ModelRegistry, load_bundle, parse_versions
+from .shadow_inference import create_shadow
 
-# Load the trained model and tokenizer
-tokenizer = BertTokenizer.from_pretrained(MODEL_PATH, local_files_only=True)
-model = BertForSequenceClassification.from_pretrained(MODEL_PATH, local_files_only=True)
-model.eval()
+MODEL_PATH = DISEASE_MODEL_DIR
 
-# Label mapping (should match training)
+# Label mapping for model directories without a bundle.json (legacy models)
 label_map = {0: 'cholesterol', 1: 'thyroid', 2: 'diabetes', 3: 'hypertension', 4: 'healthy'}
 id_to_label = {v: k for k, v in label_map.items()}
 
+# Size thread pools (and optionally pin cores) for this worker before any model loads
+configure_process()
+
+# Load and validate the configured model (BERT teacher or distilled student,
+# see config.DISEASE_CLASSIFIER) plus any extra versions kept in memory for
+# A/B switching (config.DISEASE_MODEL_VERSIONS). The active version is
+# shared by all workers through config.ACTIVE_MODEL_PATH
+registry = ModelRegistry(ACTIVE_MODEL_PATH)
+registry.add(load_bundle(MODEL_PATH, DISEASE_CLASSIFIER, label_map))
+for version, path in parse_versions(DISEASE_MODEL_VERSIONS).items():
+    registry.add(load_bundle(path, version, label_map))
+
+# Candidate model scoring a sample of traffic in the background (None when off)
+shadow = create_shadow(registry, label_map)
+
 # Strong keyword indicators for each disease (for fallback/augmentation)
 DISEASE_KEYWORDS = {
     'diabetes': {
@@ -35,12 +49,21 @@ DISEASE_KEYWORDS = {
     'heart_disease': {
         'keywords': ['heart', 'cardiac', 'troponin', 'ck-mb', 'ck mb', 'myocardial', 'infarction', 'chest pain'],
         'biomarkers': ['ck_mb', 'troponin', 'ldh']
+    },
+    'kidney_disease': {
+        'keywords': ['kidney disease', 'renal failure', 'renal insufficiency', 'ckd', 'nephropathy'],
+        'biomarkers': ['creatinine', 'bun', 'gfr']
+    },
+    'liver_disease': {
+        'keywords': ['liver disease', 'fatty liver', 'hepatitis', 'cirrhosis', 'nafld'],
+        'biomarkers': ['alt', 'ast', 'bilirubin']
     }
 }
 
-def predict_disease(text: str, biomarkers: dict = None) -> list[str]:
+def predict_disease(text: str, biomarkers: dict = None, model_version: str = None) -> list[str]:
     """
-    Predict diseases using BERT model + keyword-based augmentation + biomarker detection.
+    Predict diseases using the text classifier + keyword-based augmentation + biomarker detection.
+    model_version picks a loaded registry version; default is the active one.
     """
     diseases = []
     text_lower = text.lower()
@@ -51,21 +74,24 @@ def predict_disease(text: str, biomarkers: dict = None) -> list[str]:
         if biomarker_diseases:
             diseases.extend(biomarker_diseases)
     
-    # Step 2: BERT model prediction
+    # Step 2: Classifier prediction
     try:
-        inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=128)
-        with torch.no_grad():
-            outputs = model(**inputs)
-            predictions = torch.softmax(outputs.logits, dim=-1)
-            predicted_label = label_map[torch.argmax(predictions, dim=-1).item()]
-            
-            # Get confidence score
-            confidence = predictions.max().item()
-            
-            # Only trust BERT if confidence is > 0.6
-            if confidence > 0.6 and predicted_label != "healthy":
-                if predicted_label not in diseases:
-                    diseases.append(predicted_label)
+        bundle = registry.get(model_version)
+        start = time.perf_counter()
+        predictions = bundle.classifier.predict_proba([text])[0]
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        predicted_label = bundle.labels[int(predictions.argmax())]
+        
+        # Get confidence score
+        confidence = float(predictions.max())
+        
+        if shadow is not None and shadow.candidate is not bundle and shadow.sample():
+            shadow.submit(text, bundle.name, predicted_label, confidence, elapsed_ms)
+        
+        # Only trust the model if confidence is > 0.6
+        if confidence > 0.6 and predicted_label != "healthy":
+            if predicted_label not in diseases:
+                diseases.append(predicted_label)
     except Exception as e:
         print(f"BERT prediction error: {e}")
     
@@ -90,47 +116,9 @@ def predict_disease(text: str, biomarkers: dict = None) -> list[str]:
 
 def detect_diseases_from_biomarkers(biomarkers: dict) -> list[str]:
     """
-    Detect diseases based on abnormal biomarker values.
+    Detect diseases based on abnormal biomarker values (see disease_rules.DETECTION_RULES).
     """
-    diseases = []
-    
-    # Diabetes indicators
-    if 'fasting_glucose' in biomarkers and biomarkers['fasting_glucose'].get('value', 0) >= 126:
-        diseases.append('diabetes')
-    elif 'hba1c' in biomarkers and biomarkers['hba1c'].get('value', 0) >= 6.5:
-        diseases.append('diabetes')
-    elif 'random_glucose' in biomarkers and biomarkers['random_glucose'].get('value', 0) >= 200:
-        diseases.append('diabetes')
-    
-    # Hypertension indicators
-    if 'blood_pressure' in biomarkers:
-        bp_value = str(biomarkers['blood_pressure'].get('value', ''))
-        try:
-            systolic, diastolic = map(int, bp_value.split('/'))
-            if systolic >= 140 or diastolic >= 90:
-                diseases.append('hypertension')
-        except:
-            pass
-    
-    # Cholesterol/Lipid indicators
-    if 'total_cholesterol' in biomarkers and biomarkers['total_cholesterol'].get('value', 0) >= 240:
-        diseases.append('cholesterol')
-    elif 'ldl' in biomarkers and biomarkers['ldl'].get('value', 0) >= 160:
-        diseases.append('cholesterol')
-    
-    # Thyroid indicators
-    if 'tsh' in biomarkers:
-        tsh_value = biomarkers['tsh'].get('value', 0)
-        if tsh_value < 0.4 or tsh_value > 4.0:
-            diseases.append('thyroid')
-    
-    # Cardiac indicators
-    if 'ck_mb' in biomarkers and biomarkers['ck_mb'].get('value', 0) > 24:
-        diseases.append('heart_disease')
-    elif 'troponin' in biomarkers:
-        diseases.append('heart_disease')
-    
-    return list(set(diseases))
+    return evaluate(biomarkers)
 
 def detect_patterns_in_text(text_lower: str) -> list[str]:
     """
@@ -158,4 +146,12 @@ def detect_patterns_in_text(text_lower: str) -> list[str]:
     if re.search(r'cardiac|myocardial infarction|mi|cad|coronary', text_lower):
         diseases.append('heart_disease')
     
+    # Renal patterns
+    if re.search(r'chronic kidney disease|\bckd\b|renal (?:failure|insufficiency|impairment)|nephropathy', text_lower):
+        diseases.append('kidney_disease')
+    
+    # Hepatic patterns
+    if re.search(r'fatty liver|hepatitis|cirrhosis|\bnafld\b|hepatic steatosis|liver disease', text_lower):
+        diseases.append('liver_disease')
+    
     return list(set(diseases))
@@ -0,0 +1,375 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional
+
+from ..config import STORE_PATH
+
+# Local persistent store for extracted report data.
+# One row per report, one row per (report, biomarker) measurement. The
+# measurement table denormalizes patient_id/report_date so time-series and
+# cohort queries are answered from covering indexes without joins.
+# Dates are stored as ISO YYYY-MM-DD so string comparison and the
+# substr() period buckets are date order.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id TEXT NOT NULL,
+    report_date TEXT NOT NULL,
+    source_name TEXT,
+    patient_info TEXT,
+    conditions TEXT,
+    risk_level TEXT,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS measurements (
+    report_id INTEGER NOT NULL REFERENCES reports(id) ON DELETE CASCADE,
+    patient_id TEXT NOT NULL,
+    report_date TEXT NOT NULL,
+    biomarker TEXT NOT NULL,
+    value REAL,
+    unit TEXT,
+    reported_value REAL,
+    reported_unit TEXT,
+    abnormal INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (report_id, biomarker)
+);
+
+CREATE TABLE IF NOT EXISTS stage_outputs (
+    report_id INTEGER NOT NULL REFERENCES reports(id) ON DELETE CASCADE,
+    stage TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    output TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (report_id, stage)
+);
+
+CREATE INDEX IF NOT EXISTS idx_reports_patient_date
+    ON reports (patient_id, report_date);
+CREATE INDEX IF NOT EXISTS idx_measurements_series
+    ON measurements (patient_id, biomarker, report_date, value, unit, abnormal);
+CREATE INDEX IF NOT EXISTS idx_measurements_cohort
+    ON measurements (biomarker, report_date, value, abnormal, patient_id);
+"""
+
+PERIOD_FORMATS = {
+    "day": 10,
+    "month": 7,
+    "year": 4,
+}
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+def get_connection(path: str = None) -> sqlite3.Connection:
+    """
+    Return a per-thread connection to the store, creating the schema on first use.
+    """
+    path = path or STORE_PATH
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(path)
+    if conn is None:
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        with _schema_lock:
+            if path not in _schema_ready or path == ":memory:":
+                conn.executescript(SCHEMA)
+                _schema_ready.add(path)
+        connections[path] = conn
+    return conn
+
+
+def parse_report_date(value: Optional[str]) -> Optional[str]:
+    """
+    ISO date string for a YYYY-MM-DD value, None for an empty one.
+    Raises ValueError for anything else.
+    """
+    if value is None or not value.strip():
+        return None
+    try:
+        return date.fromisoformat(value.strip()).isoformat()
+    except ValueError:
+        raise ValueError(f"Invalid date {value!r}: expected YYYY-MM-DD")
+
+
+NAME_KEY_WARNING = ("Filed under a slug of the patient name ({key}): patients whose names "
+                    "match share one history. Pass a patient_id to keep them apart.")
+
+
+def patient_key(patient_info: Dict, patient_id: Optional[str] = None) -> Optional[str]:
+    """
+    Resolve the key a report is filed under: an explicit id wins, then an
+    identifier printed on the report (UHID, MRN, ...), otherwise a slug of
+    the extracted patient name. None when there is none of these; such
+    reports are not stored, since they cannot be told apart.
+
+    Name slugs are not unique: two patients with the same name, or names
+    that slug alike ("A. Smith" and "A Smith"), share a key and therefore a
+    history. Use keyed_by_name() to warn the caller when that fallback was used.
+    """
+    if patient_id and patient_id.strip():
+        return patient_id.strip()
+    info = patient_info or {}
+    if info.get("patient_id"):
+        return str(info["patient_id"]).strip()
+    slug = re.sub(r"[^a-z0-9]+", "-", info.get("name", "").lower()).strip("-")
+    return slug or None
+
+
+def keyed_by_name(patient_info: Dict, patient_id: Optional[str] = None) -> bool:
+    """
+    True when patient_key() fell back to the name slug.
+    """
+    if (patient_id and patient_id.strip()) or (patient_info or {}).get("patient_id"):
+        return False
+    return patient_key(patient_info) is not None
+
+
+def _measurement_rows(biomarkers: Dict) -> List[tuple]:
+    """
+    Flatten the extracted biomarker dict into (biomarker, value, unit,
+    reported_value, reported_unit, abnormal) rows.
+    """
+    rows = []
+    for marker, data in (biomarkers or {}).items():
+        if marker == "blood_pressure":
+            # Stored as two numeric series so trends can be queried directly
+            try:
+                systolic, diastolic = map(int, str(data.get("value", "")).split("/"))
+            except ValueError:
+                continue
+            abnormal = int(systolic >= 140 or diastolic >= 90)
+            rows.append(("systolic_bp", systolic, "mmHg", systolic, "mmHg", abnormal))
+            rows.append(("diastolic_bp", diastolic, "mmHg", diastolic, "mmHg", abnormal))
+            continue
+
+        value = data.get("value")
+        if not isinstance(value, (int, float)):
+            continue
+        rows.append((
+            marker,
+            float(value),
+            data.get("unit", ""),
+            data.get("reported_value", value),
+            data.get("reported_unit", data.get("unit", "")),
+            int(bool(data.get("abnormal")))
+        ))
+    return rows
+
+
+def save_report(patient_id: str, biomarkers: Dict, patient_info: Dict = None,
+                conditions: List[str] = None, risk_level: str = None,
+                report_date: Optional[str] = None, source_name: Optional[str] = None,
+                path: str = None) -> int:
+    """
+    Persist one analysed report and its measurements. Returns the report id.
+    Raises ValueError for a missing patient_id or a report_date that is not
+    YYYY-MM-DD.
+    """
+    if not patient_id:
+        raise ValueError("patient_id is required")
+    report_date = parse_report_date(report_date) or date.today().isoformat()
+    conn = get_connection(path)
+    with conn:
+        cursor = conn.execute(
+            "INSERT INTO reports (patient_id, report_date, source_name, patient_info, "
+            "conditions, risk_level, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                patient_id,
+                report_date,
+                source_name,
+                json.dumps(patient_info or {}),
+                json.dumps(conditions or []),
+                risk_level,
+                datetime.now(timezone.utc).isoformat(timespec="seconds")
+            )
+        )
+        report_id = cursor.lastrowid
+        conn.executemany(
+            "INSERT OR REPLACE INTO measurements (report_id, patient_id, report_date, biomarker, "
+            "value, unit, reported_value, reported_unit, abnormal) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(report_id, patient_id, report_date) + row for row in _measurement_rows(biomarkers)]
+        )
+    return report_id
+
+
+def list_reports(patient_id: str, path: str = None) -> List[Dict]:
+    """
+    All reports filed for a patient, oldest first.
+    """
+    rows = get_connection(path).execute(
+        "SELECT id, report_date, source_name, conditions, risk_level FROM reports "
+        "WHERE patient_id = ? ORDER BY report_date, id",
+        (patient_id,)
+    ).fetchall()
+    return [
+        {
+            "report_id": row["id"],
+            "report_date": row["report_date"],
+            "source_name": row["source_name"],
+            "conditions": json.loads(row["conditions"] or "[]"),
+            "risk_level": row["risk_level"]
+        }
+        for row in rows
+    ]
+
+
+def get_timeseries(patient_id: str, biomarker: str, start: Optional[str] = None,
+                   end: Optional[str] = None, path: str = None) -> List[Dict]:
+    """
+    Time series of one biomarker for one patient, served from the series index.
+    """
+    query = ("SELECT report_date, value, unit, abnormal FROM measurements "
+             "WHERE patient_id = ? AND biomarker = ?")
+    params = [patient_id, biomarker]
+    if start:
+        query += " AND report_date >= ?"
+        params.append(start)
+    if end:
+        query += " AND report_date <= ?"
+        params.append(end)
+    query += " ORDER BY report_date"
+
+    rows = get_connection(path).execute(query, params).fetchall()
+    return [
+        {
+            "report_date": row["report_date"],
+            "value": row["value"],
+            "unit": row["unit"],
+            "abnormal": bool(row["abnormal"])
+        }
+        for row in rows
+    ]
+
+
+def summarize_trend(series: List[Dict]) -> Dict:
+    """
+    First/last comparison for a time series ("is HbA1c improving?").
+    """
+    if not series:
+        return {"points": 0}
+    first, last = series[0]["value"], series[-1]["value"]
+    return {
+        "points": len(series),
+        "first": first,
+        "last": last,
+        "change": round(last - first, 2),
+        "first_date": series[0]["report_date"],
+        "last_date": series[-1]["report_date"]
+    }
+
+
+def cohort_aggregate(biomarker: str, start: Optional[str] = None, end: Optional[str] = None,
+                     period: Optional[str] = None, path: str = None) -> List[Dict]:
+    """
+    Aggregate one biomarker across all patients, optionally bucketed by
+    day/month/year of the report date.
+    """
+    if period and period not in PERIOD_FORMATS:
+        raise ValueError(f"period must be one of {sorted(PERIOD_FORMATS)}")
+
+    bucket = f"substr(report_date, 1, {PERIOD_FORMATS[period]})" if period else "'all'"
+    query = (f"SELECT {bucket} AS period, COUNT(*) AS n, COUNT(DISTINCT patient_id) AS patients, "
+             "AVG(value) AS mean, MIN(value) AS min, MAX(value) AS max, "
+             "AVG(abnormal) AS abnormal_rate FROM measurements WHERE biomarker = ?")
+    params = [biomarker]
+    if start:
+        query += " AND report_date >= ?"
+        params.append(start)
+    if end:
+        query += " AND report_date <= ?"
+        params.append(end)
+    query += " GROUP BY period ORDER BY period"
+
+    rows = get_connection(path).execute(query, params).fetchall()
+    return [
+        {
+            "period": row["period"],
+            "count": row["n"],
+            "patients": row["patients"],
+            "mean": round(row["mean"], 2) if row["mean"] is not None else None,
+            "min": row["min"],
+            "max": row["max"],
+            "abnormal_rate": round(row["abnormal_rate"], 3) if row["abnormal_rate"] is not None else None
+        }
+        for row in rows
+    ]
+
+
+def replace_measurements(report_id: int, biomarkers: Dict, conditions: List[str] = None,
+                         risk_level: str = None, path: str = None) -> None:
+    """
+    Overwrite the derived results of an existing report after recomputation.
+    """
+    conn = get_connection(path)
+    with conn:
+        row = conn.execute(
+            "SELECT patient_id, report_date FROM reports WHERE id = ?", (report_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"Unknown report {report_id}")
+        conn.execute(
+            "UPDATE reports SET conditions = ?, risk_level = ? WHERE id = ?",
+            (json.dumps(conditions or []), risk_level, report_id)
+        )
+        conn.execute("DELETE FROM measurements WHERE report_id = ?", (report_id,))
+        conn.executemany(
+            "INSERT INTO measurements (report_id, patient_id, report_date, biomarker, "
+            "value, unit, reported_value, reported_unit, abnormal) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(report_id, row["patient_id"], row["report_date"]) + r for r in _measurement_rows(biomarkers)]
+        )
+
+
+def save_stage_outputs(report_id: int, outputs: Dict, fingerprints: Dict, path: str = None) -> None:
+    """
+    Persist pipeline stage outputs together with the fingerprint that produced them.
+    """
+    now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    conn = get_connection(path)
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO stage_outputs (report_id, stage, fingerprint, output, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (report_id, stage, fingerprints.get(stage, ""), json.dumps(output), now)
+                for stage, output in outputs.items()
+            ]
+        )
+
+
+def load_stage_outputs(report_id: int, path: str = None) -> Dict:
+    """
+    Stored stage outputs of one report, keyed by stage name.
+    """
+    rows = get_connection(path).execute(
+        "SELECT stage, output FROM stage_outputs WHERE report_id = ?", (report_id,)
+    ).fetchall()
+    return {row["stage"]: json.loads(row["output"]) for row in rows}
+
+
+def list_stage_fingerprints(path: str = None) -> Dict[int, Dict[str, str]]:
+    """
+    Fingerprints of every stored stage output across the archive.
+    """
+    fingerprints: Dict[int, Dict[str, str]] = {}
+    rows = get_connection(path).execute(
+        "SELECT report_id, stage, fingerprint FROM stage_outputs"
+    ).fetchall()
+    for row in rows:
+        fingerprints.setdefault(row["report_id"], {})[row["stage"]] = row["fingerprint"]
+    return fingerprints
@@ -0,0 +1,174 @@
+import copy
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from .gpt_service import normalize_rules
+from .knowledge_base import MEAL_TYPES, KnowledgeBase, condition_key, get_knowledge_base
+from .meal_planner import constraints_from_rules, plan_week
+
+# No-OCR fast path for /api/diet/generate. Uses the same knowledge base,
+# rule tables and planner as the upload pipeline; responses are memoized
+# per normalized request signature and knowledge base snapshot. Callers get
+# a deep copy, so mutating a response never changes the cached plan.
+
+ACTIVITY_FACTOR = 1.375  # lightly active
+
+GOAL_ADJUSTMENTS = {
+    "weight_loss": -500,
+    "weight_gain": 300,
+    "maintain": 0,
+}
+GOAL_ALIASES = {
+    "lose weight": "weight_loss", "weight loss": "weight_loss", "loss": "weight_loss",
+    "gain weight": "weight_gain", "weight gain": "weight_gain", "muscle gain": "weight_gain",
+    "maintenance": "maintain", "maintain weight": "maintain",
+}
+MIN_CALORIES = 1200
+
+# Diet types are knowledge base preferences (app/knowledge/ingredients.json);
+# "veg" keeps the existing no-egg convention
+DIET_TYPE_ALIASES = {"non-veg": "any", "nonveg": "any", "non_veg": "any", "pure veg": "veg"}
+
+CACHE_SIZE = 4096
+
+
+def calculate_bmi(weight_kg: float, height_cm: float) -> Optional[float]:
+    if not weight_kg or not height_cm:
+        return None
+    height_m = height_cm / 100
+    return round(weight_kg / (height_m * height_m), 1)
+
+
+def bmi_category(bmi: Optional[float]) -> str:
+    if bmi is None:
+        return "unknown"
+    if bmi < 18.5:
+        return "underweight"
+    if bmi < 25:
+        return "normal"
+    if bmi < 30:
+        return "overweight"
+    return "obese"
+
+
+def estimate_daily_calories(age: int, weight_kg: float, height_cm: float,
+                            gender: Optional[str] = None, goal: str = "maintain") -> int:
+    """
+    Mifflin-St Jeor resting energy times a light activity factor, adjusted for the goal.
+    """
+    sex_offset = {"male": 5, "female": -161}.get((gender or "").lower(), -78)
+    bmr = 10 * weight_kg + 6.25 * height_cm - 5 * age + sex_offset
+    calories = bmr * ACTIVITY_FACTOR + GOAL_ADJUSTMENTS.get(goal, 0)
+    return int(round(max(calories, MIN_CALORIES), -1))
+
+
+def normalize_goal(goal: str) -> str:
+    goal = (goal or "").lower().strip()
+    goal = GOAL_ALIASES.get(goal, goal.replace(" ", "_"))
+    return goal if goal in GOAL_ADJUSTMENTS else "maintain"
+
+
+def normalize_diet_type(diet_type: str) -> str:
+    diet_type = (diet_type or "").lower().strip()
+    return DIET_TYPE_ALIASES.get(diet_type, diet_type or "any")
+
+
+def split_conditions(condition: str) -> List[str]:
+    parts = re.split(r",|/|\band\b|\+", (condition or "").lower())
+    return [part.strip() for part in parts if part.strip()]
+
+
+def normalize_allergies(allergies: Optional[List[str]]) -> tuple:
+    return tuple(sorted({a.lower().strip() for a in allergies or [] if a and a.strip()}))
+
+
+def generate_quick_plan(age: int, weight: float, height: float, condition: str, goal: str,
+                        diet_type: str, gender: Optional[str] = None,
+                        allergies: Optional[List[str]] = None) -> Dict:
+    """
+    Build a plan from numeric inputs without a report. Inputs are normalized
+    into a signature first so equivalent requests share one cache entry.
+    """
+    kb = get_knowledge_base()
+    conditions = tuple(sorted(set(split_conditions(condition))))
+    signature = (
+        int(age),
+        round(float(weight), 1),
+        round(float(height), 1),
+        conditions,
+        normalize_goal(goal),
+        normalize_diet_type(diet_type),
+        (gender or "").lower(),
+        normalize_allergies(allergies),
+    )
+    global _cache_version
+    if kb.version != _cache_version:
+        # Plans for an older catalog are never hit again; drop them with their snapshot
+        _cached_plan.cache_clear()
+        _cache_version = kb.version
+    return copy.deepcopy(_cached_plan(signature, kb))
+
+
+_cache_version: Optional[str] = None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _cached_plan(signature: tuple, kb: KnowledgeBase) -> Dict:
+    """
+    Plan for a normalized signature, built entirely from the `kb` snapshot
+    it is keyed on (snapshots hash by identity).
+    """
+    age, weight, height, conditions, goal, diet_type, gender, allergies = signature
+
+    bmi = calculate_bmi(weight, height)
+    calories = estimate_daily_calories(age, weight, height, gender, goal)
+    rules = normalize_rules({"conditions": list(conditions), "biomarkers": {}})["diet_rules"]
+
+    condition_keys = []
+    for name in conditions:
+        key = condition_key(name)
+        if key and key not in condition_keys:
+            condition_keys.append(key)
+
+    exclude_mask = kb.exclusion_mask([diet_type], allergies)
+    candidates = {
+        meal_type: kb.select_meal_ids(meal_type, condition_keys, exclude_mask)
+        for meal_type in MEAL_TYPES
+    }
+    week = plan_week(kb, candidates, constraints_from_rules(rules, calories))
+
+    avoid = []
+    for key in condition_keys:
+        for food in kb.avoid_for(key):
+            if food not in avoid:
+                avoid.append(food)
+
+    def distinct(slot):
+        seen = []
+        for day in week:
+            items = day[slot] if isinstance(day[slot], list) else [day[slot]]
+            for item in items:
+                if item is not None and item not in seen:
+                    seen.append(item)
+        return seen
+
+    return {
+        "breakfast": distinct("breakfast"),
+        "lunch": distinct("lunch"),
+        "dinner": distinct("dinner"),
+        "snacks": distinct("snacks"),
+        "avoid": avoid,
+        "bmi": bmi,
+        "bmi_category": bmi_category(bmi),
+        "daily_calories": calories,
+        "diet_rules": rules,
+        "weekly_plan": week,
+        "unrecognized_allergies": kb.unrecognized_allergies(allergies),
+        # Slots no meal fits, with the excluded flags that emptied them
+        "unfilled_slots": {
+            meal_type: kb.excluded_flags(meal_type, exclude_mask)
+            for meal_type, ids in candidates.items() if not ids
+        },
+        "notes": "Personalized diet generated based on health condition and goal."
+    }
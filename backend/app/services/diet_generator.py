@@ -1,4 +1,5 @@
 from app.services.llm_service import generate_natural_diet, extract_patient_info
+from app.services.narration_service import narrate_plan
 
 def generate_diet_plan(gpt_output: dict) -> dict:
     """
@@ -17,9 +18,14 @@ def generate_diet_plan(gpt_output: dict) -> dict:
         rules, 
         conditions, 
         patient_info,
-        biomarkers or medical_intent.get("biomarkers", {})
+        biomarkers or medical_intent.get("biomarkers", {}),
+        gpt_output.get("preferences", []),
+        gpt_output.get("allergies", [])
     )
 
+    # Optional model-written explanation; falls back to the rule-based text
+    narration = narrate_plan(diet_plan_text, conditions)
+
     # Structure the response
     plan = {
         "patient": gpt_output.get("patient", "Patient"),
@@ -28,6 +34,8 @@ def generate_diet_plan(gpt_output: dict) -> dict:
         "biomarkers": biomarkers or medical_intent.get("biomarkers", {}),
         "risk_level": medical_intent.get("risk_level", "unknown"),
         "diet_plan": diet_plan_text,
+        "narrative": narration["text"],
+        "narrated_by": narration["source"],
         "generated_by": "AI Nutritionist",
         "notes": "This personalized diet plan is generated based on your medical report analysis and lab values. Please consult with your healthcare provider or a registered dietitian before making significant dietary changes."
     }
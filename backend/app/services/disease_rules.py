@@ -0,0 +1,124 @@
+import operator
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+# Biomarker thresholds that indicate a condition, as one table.
+# Values are in the canonical units of unit_conversion.CANONICAL_UNITS.
+# A condition is detected when any of its rows fires. The same table drives
+# the per-report evaluator used in the upload path and the vectorized batch
+# scorer used for cohorts.
+
+# Transaminase upper reference limits (U/L). medical_parser.is_abnormal
+# flags values above them; liver disease is detected at a multiple of them.
+ALT_ULN = 56
+AST_ULN = 40
+TRANSAMINASE_ULN_MULTIPLE = 2
+
+DETECTION_RULES = [
+    # (condition, biomarker, op, threshold)
+    ("diabetes", "fasting_glucose", ">=", 126),
+    ("diabetes", "hba1c", ">=", 6.5),
+    ("diabetes", "random_glucose", ">=", 200),
+    ("hypertension", "systolic_bp", ">=", 140),
+    ("hypertension", "diastolic_bp", ">=", 90),
+    ("cholesterol", "total_cholesterol", ">=", 240),
+    ("cholesterol", "ldl", ">=", 160),
+    ("thyroid", "tsh", "<", 0.4),
+    ("thyroid", "tsh", ">", 4.0),
+    ("heart_disease", "ck_mb", ">", 24),
+    ("heart_disease", "troponin", "present", None),
+    # Renal: reduced filtration or raised retention markers
+    ("kidney_disease", "gfr", "<", 60),
+    ("kidney_disease", "creatinine", ">", 1.3),
+    ("kidney_disease", "bun", ">", 25),
+    # Hepatic: transaminases at 2x the upper reference limit, or jaundice range bilirubin
+    ("liver_disease", "alt", ">=", TRANSAMINASE_ULN_MULTIPLE * ALT_ULN),
+    ("liver_disease", "ast", ">=", TRANSAMINASE_ULN_MULTIPLE * AST_ULN),
+    ("liver_disease", "bilirubin", ">", 2.0),
+]
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+CONDITIONS = list(dict.fromkeys(condition for condition, _, _, _ in DETECTION_RULES))
+RULE_BIOMARKERS = list(dict.fromkeys(biomarker for _, biomarker, _, _ in DETECTION_RULES))
+
+
+def biomarker_values(biomarkers: Dict) -> Dict[str, float]:
+    """
+    Flatten the extracted biomarker dict to {biomarker: number}, splitting
+    blood pressure into systolic_bp and diastolic_bp.
+    """
+    values = {}
+    for marker, data in (biomarkers or {}).items():
+        value = data.get("value") if isinstance(data, dict) else data
+        if marker == "blood_pressure":
+            try:
+                values["systolic_bp"], values["diastolic_bp"] = map(float, str(value).split("/"))
+            except ValueError:
+                pass
+        elif isinstance(value, (int, float)):
+            values[marker] = float(value)
+    return values
+
+
+def _fires(op: str, value: float, threshold) -> bool:
+    if op == "present":
+        return True
+    return OPERATORS[op](value, threshold)
+
+
+def evaluate(biomarkers: Dict) -> List[str]:
+    """
+    Conditions indicated by one report's biomarkers, in table order.
+    """
+    values = biomarker_values(biomarkers)
+    detected = []
+    for condition, biomarker, op, threshold in DETECTION_RULES:
+        if condition in detected or biomarker not in values:
+            continue
+        if _fires(op, values[biomarker], threshold):
+            detected.append(condition)
+    return detected
+
+
+def biomarker_frame(reports: List[Dict]) -> pd.DataFrame:
+    """
+    One row per report, one float column per rule biomarker (NaN when missing).
+    """
+    rows = [biomarker_values(biomarkers) for biomarkers in reports]
+    return pd.DataFrame(rows, columns=RULE_BIOMARKERS, dtype=np.float64)
+
+
+def score_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Vectorized evaluation of DETECTION_RULES: a boolean column per condition
+    for every row of `frame` (columns named like the rule biomarkers).
+    Missing columns and NaN values never fire.
+    """
+    result = {condition: np.zeros(len(frame), dtype=bool) for condition in CONDITIONS}
+    for condition, biomarker, op, threshold in DETECTION_RULES:
+        if biomarker not in frame:
+            continue
+        column = frame[biomarker].to_numpy(dtype=np.float64, na_value=np.nan)
+        if op == "present":
+            fired = ~np.isnan(column)
+        else:
+            with np.errstate(invalid="ignore"):
+                fired = OPERATORS[op](column, threshold)  # NaN compares False
+        result[condition] |= fired
+    return pd.DataFrame(result, index=frame.index)
+
+
+def detect_many(reports: List[Dict]) -> List[List[str]]:
+    """
+    evaluate() for a batch of biomarker dicts in one vectorized pass.
+    """
+    scores = score_frame(biomarker_frame(reports)).to_numpy()
+    return [[CONDITIONS[i] for i in np.flatnonzero(row)] for row in scores]
@@ -51,7 +51,7 @@ def normalize_rules(medical_intent: dict) -> dict:
         ])
 
     # HEART DISEASE - Cardiac protection
-    if any(c.lower() in ["heart disease", "cardiac", "coronary"] for c in conditions):
+    if any(c.lower() in ["heart disease", "heart_disease", "cardiac", "coronary"] for c in conditions):
         rules.update([
             "Mediterranean diet approach",
             "limit sodium",
@@ -61,6 +61,33 @@ def normalize_rules(medical_intent: dict) -> dict:
             "maintain DASH principles"
         ])
 
+    # KIDNEY DISEASE - Renal diet
+    if any(c.lower() in ["kidney_disease", "kidney disease", "chronic kidney disease", "ckd", "renal"] for c in conditions):
+        rules.update([
+            "limit sodium to <2000mg daily",
+            "limit potassium to <2000mg daily",
+            "limit phosphorus-rich foods (dairy, nuts, colas)",
+            "moderate protein intake (0.6-0.8 g/kg)",
+            "monitor fluid intake"
+        ])
+        # Potassium-rich advice from the DASH rules conflicts with a renal diet
+        rules.discard("increase potassium-rich foods")
+        if "potassium" in biomarkers and biomarkers["potassium"].get("abnormal"):
+            rules.add("avoid high-potassium fruits and vegetables")
+
+    # LIVER DISEASE - Hepatic protection
+    if any(c.lower() in ["liver_disease", "liver disease", "fatty liver", "hepatitis", "cirrhosis"] for c in conditions):
+        rules.update([
+            "avoid alcohol completely",
+            "limit saturated fats to <7% of calories",
+            "avoid fried foods",
+            "limit added sugars and fructose",
+            "choose lean proteins",
+            "small frequent meals"
+        ])
+        if "bilirubin" in biomarkers and biomarkers["bilirubin"].get("abnormal"):
+            rules.add("limit sodium to <2000mg daily")
+
     # General healthy guidelines (always include)
     rules.update([
         "adequate hydration (8-10 glasses daily)",
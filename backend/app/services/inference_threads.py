@@ -0,0 +1,167 @@
+import fcntl
+import os
+import sys
+from typing import Dict, List, Optional
+
+from ..config import (
+    INFERENCE_INTEROP_THREADS,
+    INFERENCE_THREADS,
+    INFERENCE_WORKERS,
+    PIN_WORKER_CORES,
+    WORKER_SLOT_DIR,
+)
+
+# Per-process CPU budget for model inference.
+#
+# Every uvicorn worker would otherwise start a torch (and OpenMP/BLAS) pool
+# as wide as the machine, so N workers run N x cores threads and latency
+# swings with contention. configure_process() runs once per worker before
+# any model loads: it sizes the thread pools to the worker's share of the
+# cores and, when PIN_WORKER_CORES is on, pins the worker to a disjoint
+# block of cores. configure_torch() applies the same budget to torch the
+# first time a torch model is built.
+#
+# numpy (and with it its BLAS) is already imported by the time this runs,
+# so OMP_NUM_THREADS & co. come too late for it; those pools are resized at
+# runtime with threadpoolctl (installed with scikit-learn) instead.
+#
+# uvicorn does not tell a worker its index, so pinned workers claim a slot
+# by taking an exclusive lock on WORKER_SLOT_DIR/slot-<i>.lock; the lock is
+# released by the kernel when the worker exits, freeing the slot for its
+# replacement.
+
+_state: Dict = {"configured": False, "torch": False, "slot": None, "cores": None, "threads": None,
+                "native_pools": []}
+_slot_handle = None
+
+
+def available_cores() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def core_blocks(cores: List[int], workers: int) -> List[List[int]]:
+    """
+    Split cores into `workers` contiguous blocks, as evenly as possible.
+    With more workers than cores, blocks wrap around and share cores.
+    """
+    if workers <= len(cores):
+        size, extra = divmod(len(cores), workers)
+        blocks, start = [], 0
+        for i in range(workers):
+            end = start + size + (1 if i < extra else 0)
+            blocks.append(cores[start:end])
+            start = end
+        return blocks
+    return [[cores[i % len(cores)]] for i in range(workers)]
+
+
+def threads_per_worker(workers: int, cores: int, requested: int = INFERENCE_THREADS) -> int:
+    return requested if requested > 0 else max(1, cores // max(1, workers))
+
+
+def claim_slot(workers: int, slot_dir: str = WORKER_SLOT_DIR) -> Optional[int]:
+    """
+    Index of the first free worker slot, held until this process exits.
+    """
+    global _slot_handle
+    os.makedirs(slot_dir, exist_ok=True)
+    for index in range(workers):
+        handle = open(os.path.join(slot_dir, f"slot-{index}.lock"), "w")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            continue
+        _slot_handle = handle
+        return index
+    return None
+
+
+def configure_process(worker_index: int = None, workers: int = INFERENCE_WORKERS,
+                      pin: bool = PIN_WORKER_CORES) -> Dict:
+    """
+    Pin this worker (optional) and size its thread pools. Safe to call
+    more than once; only the first call in a process takes effect.
+    """
+    if _state["configured"]:
+        return describe()
+    cores = available_cores()
+    if pin and hasattr(os, "sched_setaffinity"):
+        index = worker_index if worker_index is not None else claim_slot(workers)
+        if index is not None:
+            cores = core_blocks(cores, workers)[index % workers]
+            try:
+                os.sched_setaffinity(0, cores)
+                _state["slot"] = index
+            except OSError as e:
+                print(f"Core pinning error: {e}")
+                cores = available_cores()
+    threads = threads_per_worker(1 if _state["slot"] is not None else workers, len(cores))
+
+    # Only seen by native libraries loaded after this point (not numpy's BLAS)
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ.setdefault(variable, str(threads))
+
+    _state.update(configured=True, cores=cores, threads=threads, native_pools=limit_native_pools(threads))
+    return describe()
+
+
+def limit_native_pools(threads: int) -> List[Dict]:
+    """
+    Resize the BLAS/OpenMP pools of native libraries already loaded in this
+    process. Returns the pools found, empty without threadpoolctl.
+    """
+    try:
+        from threadpoolctl import threadpool_info, threadpool_limits
+    except ImportError:
+        return []
+    try:
+        threadpool_limits(limits=threads)
+    except Exception as e:
+        print(f"Native thread pool limit error: {e}")
+    return [{"api": pool["internal_api"], "threads": pool["num_threads"]} for pool in threadpool_info()]
+
+
+def configure_torch(torch) -> None:
+    """
+    Apply the thread budget to torch; called by each torch model loader.
+    """
+    if _state["torch"]:
+        return
+    if not _state["configured"]:
+        configure_process()
+    torch.set_num_threads(_state["threads"])
+    try:
+        # Only allowed before torch runs its first parallel region
+        torch.set_num_interop_threads(INFERENCE_INTEROP_THREADS)
+    except RuntimeError as e:
+        print(f"Inter-op threads not set: {e}")
+    _state["torch"] = True
+
+
+def configure_forked_worker(worker_index: int, workers: int, pin: bool = PIN_WORKER_CORES) -> Dict:
+    """
+    Re-apply the budget in a worker forked from an unpinned master that
+    already configured itself (backend/serve.py). The slot is the worker's
+    index, so no lock files are needed.
+    """
+    _state.update(configured=False, slot=None)
+    layout = configure_process(worker_index=worker_index, workers=workers, pin=pin)
+    torch = sys.modules.get("torch")
+    if torch is not None and _state["torch"]:
+        # Intra-op size can change after fork; inter-op stays as the master set it
+        torch.set_num_threads(_state["threads"])
+    return layout
+
+
+def describe() -> Dict:
+    return {
+        "pid": os.getpid(),
+        "slot": _state["slot"],
+        "cores": _state["cores"],
+        "intra_op_threads": _state["threads"],
+        "inter_op_threads": INFERENCE_INTEROP_THREADS,
+        "native_pools": _state["native_pools"],
+    }
@@ -0,0 +1,373 @@
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from ..config import KNOWLEDGE_DIR, NUTRITION_GUIDELINES_PATH
+
+# Meal and food knowledge base loaded from files at runtime.
+# All lookups go through prebuilt indexes; a reload builds a complete new
+# KnowledgeBase and swaps the module-level reference in one assignment, so
+# in-flight requests keep reading the snapshot they started with.
+
+MEALS_FILE = os.path.join(KNOWLEDGE_DIR, "meals.json")
+FOODS_TO_AVOID_FILE = os.path.join(KNOWLEDGE_DIR, "foods_to_avoid.json")
+INGREDIENTS_FILE = os.path.join(KNOWLEDGE_DIR, "ingredients.json")
+
+MEAL_TYPES = ["breakfast", "lunch", "dinner", "snack"]
+
+# Free-text condition -> knowledge base condition key (first match wins)
+CONDITION_KEYWORDS = [
+    ("diabetes", ["diabetes"]),
+    ("hypertension", ["hypertension", "blood pressure"]),
+    ("cholesterol", ["cholesterol", "dyslipidemia", "hyperlipidemia"]),
+    ("thyroid", ["thyroid"]),
+    ("heart_disease", ["heart", "cardiac", "coronary"]),
+    ("kidney_disease", ["kidney", "renal", "ckd", "nephro"]),
+    ("liver_disease", ["liver", "hepat", "cirrhosis"]),
+]
+
+# One bit per supported condition for compatibility masks
+CONDITION_BITS = {key: 1 << i for i, (key, _) in enumerate(CONDITION_KEYWORDS)}
+
+MIN_MEAL_CHOICES = 4  # smallest rotation a selected slot should offer
+
+RELOAD_CHECK_INTERVAL = 5.0  # seconds between mtime checks
+
+
+def condition_mask(conditions: List[str]) -> int:
+    """
+    OR of the condition bits for a list of knowledge base condition keys.
+    """
+    mask = 0
+    for condition in conditions:
+        mask |= CONDITION_BITS.get(condition, 0)
+    return mask
+
+
+def condition_key(condition: str) -> Optional[str]:
+    """
+    Map a detected condition string to its knowledge base key.
+    """
+    condition_lower = condition.lower()
+    for key, keywords in CONDITION_KEYWORDS:
+        if any(keyword in condition_lower for keyword in keywords):
+            return key
+    return None
+
+
+class KnowledgeBase:
+    """
+    Immutable snapshot of the meal catalog with inverted indexes.
+    """
+
+    def __init__(self, meals: List[Dict], foods_to_avoid: Dict[str, List[str]],
+                 guidelines: Dict[str, Dict[str, List[str]]], version: str,
+                 excluded_tags: Dict[str, List[str]] = None, ingredient_data: Dict = None):
+        self.version = version
+        self.meals = {meal["id"]: meal for meal in meals}
+        self.foods_to_avoid = foods_to_avoid
+        self.guidelines = guidelines
+        self.excluded_tags = excluded_tags or {}
+        ingredient_data = ingredient_data or {}
+
+        self.by_condition: Dict[str, List[str]] = {}
+        self.by_slot: Dict[tuple, List[str]] = {}
+        self.by_ingredient: Dict[str, List[str]] = {}
+        self.tags_by_meal: Dict[str, frozenset] = {}
+
+        for meal in meals:
+            meal_id = meal["id"]
+            for condition in meal.get("conditions", []):
+                self.by_condition.setdefault(condition, []).append(meal_id)
+                self.by_slot.setdefault((meal["meal_type"], condition), []).append(meal_id)
+            for ingredient in meal.get("ingredients", []):
+                self.by_ingredient.setdefault(ingredient, []).append(meal_id)
+            self.tags_by_meal[meal_id] = frozenset(meal.get("tags", []))
+
+        # Bitmasks per meal: which conditions it is safe for (no excluded
+        # tag) and which conditions it was designed for
+        self.compat_mask: Dict[str, int] = {}
+        self.designed_mask: Dict[str, int] = {}
+        self.by_type: Dict[str, List[tuple]] = {}
+        for meal in meals:
+            meal_id = meal["id"]
+            compat = 0
+            for condition, bit in CONDITION_BITS.items():
+                if not self.tags_by_meal[meal_id] & set(self.excluded_tags.get(condition, [])):
+                    compat |= bit
+            designed = condition_mask(meal.get("conditions", []))
+            self.compat_mask[meal_id] = compat
+            self.designed_mask[meal_id] = designed
+
+        # Allergen / diet flags: one bit per flag in ingredients.json, set on
+        # a meal when any of its ingredients carries the flag
+        flag_ingredients = ingredient_data.get("ingredient_flags", {})
+        self.flag_bits = {flag: 1 << i for i, flag in enumerate(flag_ingredients)}
+        flags_of_ingredient: Dict[str, int] = {}
+        for flag, ingredients in flag_ingredients.items():
+            for ingredient in ingredients:
+                flags_of_ingredient[ingredient] = flags_of_ingredient.get(ingredient, 0) | self.flag_bits[flag]
+        self.flags_by_meal: Dict[str, int] = {}
+        for meal in meals:
+            flags = 0
+            for ingredient in meal.get("ingredients", []):
+                flags |= flags_of_ingredient.get(ingredient, 0)
+            self.flags_by_meal[meal["id"]] = flags
+
+        # Preference and allergy names -> flag masks, and the precomputed set
+        # of meal ids each preference rules out
+        self.preference_masks = {
+            name: self.flags_mask(flags) for name, flags in ingredient_data.get("preferences", {}).items()
+        }
+        self.allergy_masks = dict(self.flag_bits)
+        for alias, flags in ingredient_data.get("allergy_aliases", {}).items():
+            self.allergy_masks[alias] = self.flags_mask(flags)
+        self.excluded_by_preference = {
+            name: frozenset(meal_id for meal_id, flags in self.flags_by_meal.items() if flags & mask)
+            for name, mask in self.preference_masks.items()
+        }
+
+        for meal in meals:
+            meal_id = meal["id"]
+            self.by_type.setdefault(meal["meal_type"], []).append(
+                (meal_id, self.compat_mask[meal_id], self.designed_mask[meal_id], self.flags_by_meal[meal_id])
+            )
+
+        self._selection_cache: Dict[tuple, Tuple[str, ...]] = {}
+
+    def meals_for(self, meal_type: str, condition: str) -> List[str]:
+        """
+        Meal names for a slot and condition, falling back to the general list.
+        """
+        ids = self.by_slot.get((meal_type, condition)) or self.by_slot.get((meal_type, "general"), [])
+        return [self.meals[meal_id]["name"] for meal_id in ids]
+
+    def select_meals(self, meal_type: str, conditions: List[str], exclude_mask: int = 0) -> List[str]:
+        """
+        Meal names for a slot that are compatible with every condition.
+        """
+        return [self.meals[meal_id]["name"] for meal_id in self.select_meal_ids(meal_type, conditions, exclude_mask)]
+
+    def flags_mask(self, flags: List[str]) -> int:
+        mask = 0
+        for flag in flags:
+            mask |= self.flag_bits.get(flag, 0)
+        return mask
+
+    def exclusion_mask(self, preferences: List[str] = None, allergies: List[str] = None) -> int:
+        """
+        Flag mask of everything a patient's diet preferences and allergies rule
+        out. Unknown names contribute nothing; report them to the patient with
+        unrecognized_allergies().
+        """
+        mask = 0
+        for name in preferences or []:
+            mask |= self.preference_masks.get(_normalize_name(name), 0)
+        for name in allergies or []:
+            mask |= self.allergy_masks.get(_normalize_name(name), 0)
+        return mask
+
+    def unrecognized_allergies(self, allergies: List[str] = None) -> List[str]:
+        """
+        Allergies with no flag in ingredients.json, i.e. ones meals are not filtered for.
+        """
+        return [name for name in allergies or [] if _normalize_name(name) not in self.allergy_masks]
+
+    def excluded_flags(self, meal_type: str, exclude_mask: int) -> List[str]:
+        """
+        Flags in `exclude_mask` carried by meals of a slot: what removed them
+        when select_meal_ids comes back empty.
+        """
+        carried = 0
+        for _, _, _, flags in self.by_type.get(meal_type, []):
+            carried |= flags
+        return [flag for flag, bit in self.flag_bits.items() if carried & exclude_mask & bit]
+
+    def meal_flags(self, meal_id: str) -> List[str]:
+        flags = self.flags_by_meal.get(meal_id, 0)
+        return [flag for flag, bit in self.flag_bits.items() if flags & bit]
+
+    def select_meal_ids(self, meal_type: str, conditions: List[str], exclude_mask: int = 0) -> Tuple[str, ...]:
+        """
+        Meal ids for a slot that are compatible with every condition, leaving
+        out meals carrying any flag in `exclude_mask` (see exclusion_mask).
+
+        Selection is a bitwise AND of each meal's compatibility mask against
+        the patient's condition mask, ranked by how many of the conditions the
+        meal was designed for. If no meal is compatible with all conditions,
+        meals are ranked by how many conditions they do satisfy instead.
+        Preference and allergy exclusions are never relaxed.
+
+        Returns a tuple: results are cached per knowledge base snapshot and
+        shared between requests, so callers must not be able to mutate them.
+        """
+        required = condition_mask(conditions)
+        if not required and not exclude_mask:
+            return tuple(self.by_slot.get((meal_type, "general"), []))
+
+        cache_key = (meal_type, required, exclude_mask)
+        cached = self._selection_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        entries = [entry for entry in self.by_type.get(meal_type, []) if not entry[3] & exclude_mask]
+        if not required:
+            # No condition constraint: prefer the general list, then anything left
+            entries = sorted(entries, key=lambda entry: "general" not in self.meals[entry[0]].get("conditions", []))
+        ranked = [
+            ((designed & required).bit_count(), meal_id)
+            for meal_id, compat, designed, _ in entries
+            if compat & required == required
+        ]
+        if not ranked:
+            # Ranked fallback: most satisfied conditions first
+            ranked = [
+                ((compat & required).bit_count() * 8 + (designed & required).bit_count(), meal_id)
+                for meal_id, compat, designed, _ in entries
+            ]
+        ranked.sort(key=lambda item: -item[0])  # stable: keeps catalog order within a score
+
+        # Best tier first, topped up from the next tiers to a usable rotation
+        best = ranked[0][0] if ranked else 0
+        selected = [meal_id for score, meal_id in ranked if score == best]
+        for score, meal_id in ranked:
+            if len(selected) >= MIN_MEAL_CHOICES:
+                break
+            if score != best:
+                selected.append(meal_id)
+
+        selected = tuple(selected)
+        self._selection_cache[cache_key] = selected
+        return selected
+
+    def meals_with_ingredient(self, ingredient: str) -> List[str]:
+        return list(self.by_ingredient.get(ingredient, []))
+
+    def avoid_for(self, condition: str) -> List[str]:
+        """
+        Foods to avoid for a condition key, including restricted foods from
+        the nutrition guidelines table.
+        """
+        avoid = list(self.foods_to_avoid.get(condition, []))
+        for food in self.guidelines.get(condition, {}).get("restricted", []):
+            if food not in avoid:
+                avoid.append(food)
+        return avoid
+
+    def stats(self) -> Dict:
+        return {
+            "version": self.version,
+            "meals": len(self.meals),
+            "conditions": sorted(self.by_condition),
+            "ingredients": len(self.by_ingredient),
+            "preferences": {name: len(ids) for name, ids in self.excluded_by_preference.items()}
+        }
+
+
+def _normalize_name(name: str) -> str:
+    return name.lower().strip().replace("-", "_").replace(" ", "_")
+
+
+def _split_foods(value: str) -> List[str]:
+    return [food.strip() for food in (value or "").split(",") if food.strip()]
+
+
+def load_guidelines(path: str = NUTRITION_GUIDELINES_PATH) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Read training/data/nutrition_guidelines.csv into {condition: {allowed, restricted}}.
+    """
+    guidelines = {}
+    if not os.path.exists(path):
+        return guidelines
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            key = condition_key(row.get("disease", ""))
+            if key is None:
+                continue
+            guidelines[key] = {
+                "allowed": _split_foods(row.get("allowed_foods")),
+                "restricted": _split_foods(row.get("restricted_foods"))
+            }
+    return guidelines
+
+
+def source_files() -> List[str]:
+    return [MEALS_FILE, FOODS_TO_AVOID_FILE, INGREDIENTS_FILE, NUTRITION_GUIDELINES_PATH]
+
+
+def content_hash() -> str:
+    """
+    Hash of the knowledge base files currently on disk.
+    """
+    digest = hashlib.sha256()
+    for path in source_files():
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def _mtimes() -> tuple:
+    return tuple(os.stat(path).st_mtime_ns if os.path.exists(path) else 0 for path in source_files())
+
+
+def load_knowledge_base() -> KnowledgeBase:
+    with open(MEALS_FILE, encoding="utf-8") as f:
+        meals = json.load(f)["meals"]
+    with open(FOODS_TO_AVOID_FILE, encoding="utf-8") as f:
+        avoid_data = json.load(f)
+    ingredient_data = {}
+    if os.path.exists(INGREDIENTS_FILE):
+        with open(INGREDIENTS_FILE, encoding="utf-8") as f:
+            ingredient_data = json.load(f)
+    return KnowledgeBase(
+        meals,
+        avoid_data["foods_to_avoid"],
+        load_guidelines(),
+        content_hash(),
+        avoid_data.get("excluded_tags", {}),
+        ingredient_data
+    )
+
+
+_kb: Optional[KnowledgeBase] = None
+_kb_mtimes: tuple = ()
+_last_check = 0.0
+_reload_lock = threading.Lock()
+
+
+def reload_knowledge_base() -> KnowledgeBase:
+    """
+    Build a new snapshot from disk and swap it in. If loading fails the
+    current snapshot stays active and the error is raised to the caller.
+    """
+    global _kb, _kb_mtimes
+    with _reload_lock:
+        mtimes = _mtimes()
+        kb = load_knowledge_base()
+        _kb, _kb_mtimes = kb, mtimes
+    return kb
+
+
+def get_knowledge_base() -> KnowledgeBase:
+    """
+    Current snapshot. Picks up edited files at most every RELOAD_CHECK_INTERVAL seconds.
+    """
+    global _last_check
+    kb = _kb
+    if kb is None:
+        return reload_knowledge_base()
+
+    now = time.monotonic()
+    if now - _last_check >= RELOAD_CHECK_INTERVAL:
+        _last_check = now
+        if _mtimes() != _kb_mtimes:
+            try:
+                return reload_knowledge_base()
+            except Exception as e:
+                print(f"Knowledge base reload error: {e}")
+    return kb
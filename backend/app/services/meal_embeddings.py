@@ -0,0 +1,356 @@
+"""
+Semantic meal retrieval over precomputed embeddings.
+
+Every meal in the knowledge base and every diet rule that normalize_rules
+can emit is embedded once, offline, and stored as an L2-normalized float32
+matrix under EMBEDDINGS_DIR. At query time the matrices are memory-mapped,
+so worker processes share the pages, and top-k is one matrix-vector product
+plus argpartition. Catalogs above IVF_MIN_ITEMS also get an inverted-file
+index (k-means lists) so only the closest lists are scanned.
+
+Known rule strings are looked up in the rule table and need no encoder;
+free-text queries load the encoder on first use. An index built from a
+different knowledge base version than the one loaded is refused
+(StaleIndexError) until it is rebuilt, rather than returning meals whose
+vectors describe an older catalog.
+
+Usage (from the backend directory):
+    python -m app.services.meal_embeddings build
+    python -m app.services.meal_embeddings search "low potassium" --k 5
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ..config import EMBEDDING_MODEL, EMBEDDINGS_DIR
+from .gpt_service import normalize_rules
+from .inference_threads import configure_torch
+from .knowledge_base import get_knowledge_base
+
+MEAL_VECTORS_FILE = "meal_vectors.npy"
+RULE_VECTORS_FILE = "rule_vectors.npy"
+IVF_CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_ORDER_FILE = "ivf_order.npy"
+IVF_OFFSETS_FILE = "ivf_offsets.npy"
+INDEX_FILE = "index.json"
+
+IVF_MIN_ITEMS = 5000  # exact search below this many meals
+IVF_ITERATIONS = 10
+IVF_PROBES = 4
+ALLOWED_CACHE_SIZE = 64  # (kb version, slot, exclusion mask) row filters kept
+
+
+class StaleIndexError(RuntimeError):
+    pass
+
+# Condition names that make normalize_rules emit its full rule set
+RULE_CORPUS_CONDITIONS = ["diabetes", "hypertension", "cholesterol", "thyroid", "heart disease",
+                          "kidney disease", "liver disease"]
+
+# Per-serving nutrient values -> words added to a meal's document, so
+# queries like "low potassium" match on the numbers, not only on tags
+NUTRIENT_DESCRIPTORS = [
+    ("sodium_mg", "max", 140, "low sodium"),
+    ("sodium_mg", "min", 600, "high sodium"),
+    ("potassium_mg", "max", 250, "low potassium"),
+    ("potassium_mg", "min", 500, "potassium rich"),
+    ("sugar_g", "max", 5, "low sugar"),
+    ("carbs_g", "max", 20, "low carb"),
+    ("fiber_g", "min", 6, "high fiber"),
+    ("protein_g", "min", 25, "high protein"),
+    ("protein_g", "max", 8, "low protein"),
+    ("sat_fat_g", "max", 1.5, "low saturated fat"),
+]
+
+
+def meal_document(meal: Dict) -> str:
+    """
+    Text embedded for one meal: name, slot, conditions, ingredients, tags and nutrient descriptors.
+    """
+    nutrients = meal.get("nutrients", {})
+    descriptors = []
+    for nutrient, kind, limit, words in NUTRIENT_DESCRIPTORS:
+        value = nutrients.get(nutrient)
+        if value is None:
+            continue
+        if (kind == "max" and value <= limit) or (kind == "min" and value >= limit):
+            descriptors.append(words)
+
+    def words(items):
+        return ", ".join(item.replace("_", " ") for item in items)
+
+    return (f"{meal['name']}. {meal['meal_type']}. "
+            f"Suitable for {words(meal.get('conditions', []))}. "
+            f"Ingredients: {words(meal.get('ingredients', []))}. "
+            f"{words(meal.get('tags', []) + descriptors)}.")
+
+
+def rule_corpus() -> List[str]:
+    biomarkers = {"hba1c": {"abnormal": True}}
+    return normalize_rules({"conditions": RULE_CORPUS_CONDITIONS, "biomarkers": biomarkers})["diet_rules"]
+
+
+def _normalize_query(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class TextEncoder:
+    """
+    Mean-pooled transformer encoder (the BERT body of the disease classifier by default).
+    """
+
+    def __init__(self, model_path: str = EMBEDDING_MODEL, max_length: int = 64):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        configure_torch(torch)
+        local = os.path.isdir(model_path)
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=local)
+        self.model = AutoModel.from_pretrained(model_path, local_files_only=local)
+        self.model.eval()
+        self.name = os.path.basename(os.path.normpath(model_path))
+        self.max_length = max_length
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(texts[start:start + batch_size], return_tensors="pt",
+                                    padding=True, truncation=True, max_length=self.max_length)
+            with self.torch.inference_mode():
+                hidden = self.model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+            batches.append(pooled.numpy())
+        vectors = np.concatenate(batches).astype(np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+
+def _kmeans(vectors: np.ndarray, lists: int, iterations: int = IVF_ITERATIONS, seed: int = 0) -> tuple:
+    """
+    Spherical k-means: (centroids, assignment) for the IVF index.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(lists):
+            members = vectors[assignment == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+def _save_array(out_dir: str, name: str, array: np.ndarray) -> None:
+    tmp = os.path.join(out_dir, f".{name}.tmp.npy")
+    np.save(tmp, array)
+    os.replace(tmp, os.path.join(out_dir, name))
+
+
+def build_index(out_dir: str = EMBEDDINGS_DIR, encoder: TextEncoder = None) -> Dict:
+    """
+    Embed all meals and rules and write the matrices plus index.json.
+    index.json is written last, so readers never see a half-built index.
+    """
+    kb = get_knowledge_base()
+    encoder = encoder or TextEncoder()
+    os.makedirs(out_dir, exist_ok=True)
+
+    meal_ids = list(kb.meals)
+    rules = rule_corpus()
+    started = time.perf_counter()
+    meal_vectors = encoder.encode([meal_document(kb.meals[meal_id]) for meal_id in meal_ids])
+    rule_vectors = encoder.encode(rules)
+    elapsed = time.perf_counter() - started
+
+    _save_array(out_dir, MEAL_VECTORS_FILE, meal_vectors)
+    _save_array(out_dir, RULE_VECTORS_FILE, rule_vectors)
+
+    ivf = len(meal_ids) >= IVF_MIN_ITEMS
+    if ivf:
+        centroids, assignment = _kmeans(meal_vectors, int(np.sqrt(len(meal_ids))))
+        order = np.argsort(assignment, kind="stable").astype(np.int32)
+        offsets = np.searchsorted(assignment[order], np.arange(len(centroids) + 1)).astype(np.int32)
+        _save_array(out_dir, IVF_CENTROIDS_FILE, centroids)
+        _save_array(out_dir, IVF_ORDER_FILE, order)
+        _save_array(out_dir, IVF_OFFSETS_FILE, offsets)
+
+    meta = {
+        "kb_version": kb.version,
+        "encoder": encoder.name,
+        "dim": int(meal_vectors.shape[1]),
+        "meal_ids": meal_ids,
+        "rules": rules,
+        "ivf": ivf,
+        "encode_seconds": round(elapsed, 2)
+    }
+    tmp = os.path.join(out_dir, f".{INDEX_FILE}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(out_dir, INDEX_FILE))
+    return meta
+
+
+class MealIndex:
+    """
+    Read-only view of a built index; matrices are memory-mapped.
+    """
+
+    def __init__(self, directory: str = EMBEDDINGS_DIR):
+        with open(os.path.join(directory, INDEX_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.meta = meta
+        self.meal_ids: List[str] = meta["meal_ids"]
+        self.row_of = {meal_id: row for row, meal_id in enumerate(self.meal_ids)}
+        self.rule_row = {_normalize_query(rule): row for row, rule in enumerate(meta["rules"])}
+        self.vectors = np.load(os.path.join(directory, MEAL_VECTORS_FILE), mmap_mode="r")
+        self.rule_vectors = np.load(os.path.join(directory, RULE_VECTORS_FILE), mmap_mode="r")
+        self.ivf = None
+        if meta.get("ivf"):
+            self.ivf = (
+                np.load(os.path.join(directory, IVF_CENTROIDS_FILE)),
+                np.load(os.path.join(directory, IVF_ORDER_FILE), mmap_mode="r"),
+                np.load(os.path.join(directory, IVF_OFFSETS_FILE))
+            )
+        self._allowed_cache: Dict[tuple, np.ndarray] = {}
+
+    def rule_vector(self, rules: List[str]) -> Optional[np.ndarray]:
+        """
+        Mean vector of known rules, or None if none of them is in the rule table.
+        """
+        rows = [self.rule_row[key] for key in map(_normalize_query, rules) if key in self.rule_row]
+        if not rows:
+            return None
+        vector = np.asarray(self.rule_vectors[rows]).mean(axis=0)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def allowed_rows(self, kb, meal_type: Optional[str], exclude_mask: int) -> np.ndarray:
+        """
+        Boolean row filter for a slot and exclusion mask against the current knowledge base.
+        """
+        key = (kb.version, meal_type, exclude_mask)
+        allowed = self._allowed_cache.get(key)
+        if allowed is None:
+            allowed = np.zeros(len(self.meal_ids), dtype=bool)
+            for row, meal_id in enumerate(self.meal_ids):
+                meal = kb.meals.get(meal_id)  # ids missing from a newer catalog are skipped
+                if meal is None or (meal_type and meal["meal_type"] != meal_type):
+                    continue
+                allowed[row] = not kb.flags_by_meal.get(meal_id, 0) & exclude_mask
+            if len(self._allowed_cache) >= ALLOWED_CACHE_SIZE:
+                self._allowed_cache.clear()
+            self._allowed_cache[key] = allowed
+        return allowed
+
+    def top_k(self, query: np.ndarray, k: int, allowed: np.ndarray) -> List[tuple]:
+        if self.ivf is not None:
+            centroids, order, offsets = self.ivf
+            probes = np.argpartition(-(centroids @ query), min(IVF_PROBES, len(centroids)) - 1)[:IVF_PROBES]
+            rows = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in probes])
+            rows = rows[allowed[rows]]
+            scores = self.vectors[rows] @ query
+        else:
+            rows = np.flatnonzero(allowed)
+            scores = self.vectors[rows] @ query if len(rows) < len(allowed) else self.vectors @ query
+
+        if len(scores) == 0:
+            return []
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(self.meal_ids[int(rows[i])], float(scores[i])) for i in best]
+
+
+_index: Optional[MealIndex] = None
+_index_mtime = None
+_encoder: Optional[TextEncoder] = None
+_lock = threading.Lock()
+
+
+def get_index(directory: str = None) -> Optional[MealIndex]:
+    """
+    Current index, reopened when index.json is rebuilt. None if not built yet.
+    """
+    global _index, _index_mtime
+    directory = directory or EMBEDDINGS_DIR
+    path = os.path.join(directory, INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    mtime = os.stat(path).st_mtime_ns
+    if _index is None or mtime != _index_mtime:
+        with _lock:
+            if _index is None or mtime != _index_mtime:
+                _index, _index_mtime = MealIndex(directory), mtime
+    return _index
+
+
+def get_encoder() -> TextEncoder:
+    global _encoder
+    if _encoder is None:
+        with _lock:
+            if _encoder is None:
+                _encoder = TextEncoder()
+    return _encoder
+
+
+def search_meals(query: str, k: int = 10, meal_type: Optional[str] = None,
+                 preferences: List[str] = None, allergies: List[str] = None) -> List[Dict]:
+    """
+    Top-k meals by cosine similarity to `query` (free text or a diet rule).
+    Raises FileNotFoundError if the index has not been built and
+    StaleIndexError if it was built for another knowledge base version.
+    """
+    index = get_index()
+    if index is None:
+        raise FileNotFoundError("Meal embeddings not built; run python -m app.services.meal_embeddings build")
+
+    kb = get_knowledge_base()
+    if index.meta.get("kb_version") != kb.version:
+        raise StaleIndexError(
+            f"Meal embeddings were built for knowledge base {index.meta.get('kb_version')}, "
+            f"current is {kb.version}; run python -m app.services.meal_embeddings build"
+        )
+    vector = index.rule_vector([query])
+    if vector is None:
+        vector = get_encoder().encode([query])[0]
+
+    allowed = index.allowed_rows(kb, meal_type, kb.exclusion_mask(preferences, allergies))
+    return [
+        {
+            "id": meal_id,
+            "name": kb.meals[meal_id]["name"],
+            "meal_type": kb.meals[meal_id]["meal_type"],
+            "score": round(score, 4)
+        }
+        for meal_id, score in index.top_k(vector, k, allowed)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the semantic meal index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("build")
+    search = subparsers.add_parser("search")
+    search.add_argument("query")
+    search.add_argument("--k", type=int, default=10)
+    search.add_argument("--meal-type")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        meta = build_index()
+        print(f"Embedded {len(meta['meal_ids'])} meals and {len(meta['rules'])} rules "
+              f"({meta['dim']}d, {meta['encode_seconds']}s, ivf={meta['ivf']}) into {EMBEDDINGS_DIR}")
+    else:
+        for result in search_meals(args.query, args.k, args.meal_type):
+            print(f"{result['score']:.3f}  {result['meal_type']:9}  {result['name']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import re
+import time
+from itertools import combinations, combinations_with_replacement
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ..config import PLANNER_TIME_BUDGET_MS
+
+# Nutrient-constrained weekly planner over the knowledge base food table.
+#
+# Each day is solved by scoring every breakfast x lunch x dinner x snack-pair
+# combination at once with numpy broadcasting. The score is the sum of
+# normalized constraint violations plus a repetition penalty for meals
+# already used that week, and the best combination is taken greedily day by
+# day. If the time budget runs out, the remaining days fall back to a plain
+# rotation so the response time stays bounded. A slot with no candidates
+# (every meal excluded by preferences or allergies) is left empty (None)
+# rather than dropping the whole week; callers explain it with
+# KnowledgeBase.excluded_flags.
+
+NUTRIENTS = ["calories", "carbs_g", "protein_g", "sat_fat_g", "fiber_g", "sodium_mg", "potassium_mg", "sugar_g"]
+NUTRIENT_INDEX = {name: i for i, name in enumerate(NUTRIENTS)}
+
+SLOTS = ["breakfast", "lunch", "dinner"]
+MAX_CANDIDATES = 8  # per slot, taken from the top of the ranked selection
+
+REPEAT_PENALTY = 0.35
+CALORIE_TOLERANCE = 0.15
+
+# Rule text -> daily limit. Patterns are matched against the rules emitted by
+# gpt_service.normalize_rules; the first group, when present, is the limit.
+RULE_CONSTRAINTS = [
+    (r"limit sodium to <\s*(\d+)\s*mg", "sodium_mg", "max", None),
+    (r"^limit sodium$", "sodium_mg", "max", 2300),
+    (r"strict carbohydrate control", "carbs_g", "max", 150),
+    (r"limit refined carbohydrates", "carbs_g", "max", 225),
+    (r"increase fiber intake \((\d+)\+ grams", "fiber_g", "min", None),
+    (r"^increase fiber$|increase soluble fiber", "fiber_g", "min", 25),
+    (r"increase potassium-rich foods", "potassium_mg", "min", 3000),
+    (r"limit potassium to <\s*(\d+)\s*mg", "potassium_mg", "max", None),
+    (r"moderate protein intake", "protein_g", "max", 70),
+]
+SATURATED_FAT_RULE = r"limit saturated fats to <\s*(\d+)%"
+REFERENCE_CALORIES = 2000  # for percent-of-calories rules without a patient target
+
+_matrix_cache: Dict[str, tuple] = {}
+
+
+def nutrient_matrix(kb) -> tuple:
+    """
+    (meal id -> row, matrix) for a knowledge base snapshot, built once per version.
+    """
+    cached = _matrix_cache.get(kb.version)
+    if cached is not None:
+        return cached
+
+    ids = list(kb.meals)
+    matrix = np.zeros((len(ids), len(NUTRIENTS)), dtype=np.float64)
+    for row, meal_id in enumerate(ids):
+        nutrients = kb.meals[meal_id].get("nutrients", {})
+        for name, col in NUTRIENT_INDEX.items():
+            matrix[row, col] = nutrients.get(name, 0.0)
+
+    cached = ({meal_id: row for row, meal_id in enumerate(ids)}, matrix)
+    _matrix_cache.clear()
+    _matrix_cache[kb.version] = cached
+    return cached
+
+
+def constraints_from_rules(rules: List[str], calorie_target: Optional[float] = None) -> Dict[str, tuple]:
+    """
+    Translate diet rule strings into per-day (min, max) nutrient bounds.
+    Calories are only bounded when a target is known for the patient.
+    """
+    bounds = {}
+    if calorie_target:
+        bounds["calories"] = (calorie_target * (1 - CALORIE_TOLERANCE), calorie_target * (1 + CALORIE_TOLERANCE))
+
+    def tighten(nutrient, kind, limit):
+        low, high = bounds.get(nutrient, (None, None))
+        if kind == "max":
+            high = limit if high is None else min(high, limit)
+        else:
+            low = limit if low is None else max(low, limit)
+        bounds[nutrient] = (low, high)
+
+    for rule in rules or []:
+        rule_lower = rule.lower().strip()
+        for pattern, nutrient, kind, default in RULE_CONSTRAINTS:
+            match = re.search(pattern, rule_lower)
+            if match:
+                limit = float(match.group(1)) if match.groups() else default
+                tighten(nutrient, kind, limit)
+        match = re.search(SATURATED_FAT_RULE, rule_lower)
+        if match:
+            calories = calorie_target or REFERENCE_CALORIES
+            tighten("sat_fat_g", "max", float(match.group(1)) / 100 * calories / 9)
+
+    return bounds
+
+
+def _violation(totals: np.ndarray, bounds: Dict[str, tuple]) -> np.ndarray:
+    """
+    Sum of relative bound violations over the last axis of `totals`.
+    """
+    penalty = np.zeros(totals.shape[:-1])
+    for nutrient, (low, high) in bounds.items():
+        values = totals[..., NUTRIENT_INDEX[nutrient]]
+        # A zero bound has no scale to be relative to; count absolute excess
+        if high is not None:
+            penalty += np.maximum(values - high, 0) / (high if high > 0 else 1.0)
+        if low is not None:
+            penalty += np.maximum(low - values, 0) / (low if low > 0 else 1.0)
+    return penalty
+
+
+def _totals_dict(vector: np.ndarray) -> Dict[str, float]:
+    return {name: round(float(vector[i]), 1) for name, i in NUTRIENT_INDEX.items()}
+
+
+def _satisfied(vector: np.ndarray, bounds: Dict[str, tuple]) -> bool:
+    return bool(_violation(vector, bounds) == 0)
+
+
+def plan_week(kb, candidates: Dict[str, Sequence[str]], bounds: Dict[str, tuple], days: int = 7,
+              time_budget_ms: float = None) -> List[Dict]:
+    """
+    Pick breakfast, lunch, dinner and two snacks per day from the candidate
+    meal ids of each slot, satisfying `bounds` where possible and avoiding
+    repeats across the week. Slots without candidates are None in every day
+    (both snacks for the snack slot); [] only if every slot is empty.
+    """
+    time_budget_ms = PLANNER_TIME_BUDGET_MS if time_budget_ms is None else time_budget_ms
+    deadline = time.perf_counter() + time_budget_ms / 1000.0
+    row_of, matrix = nutrient_matrix(kb)
+
+    pools = {slot: candidates.get(slot, [])[:MAX_CANDIDATES] for slot in SLOTS + ["snack"]}
+    if not any(pools.values()):
+        return []
+
+    # Empty slots get one placeholder meal (None) with all-zero nutrients
+    placeholder = len(matrix)
+    matrix = np.vstack([matrix, np.zeros(len(NUTRIENTS))])
+    pools = {slot: pool or [None] for slot, pool in pools.items()}
+
+    def name(slot, idx):
+        meal_id = pools[slot][idx]
+        return kb.meals[meal_id]["name"] if meal_id is not None else None
+
+    rows = {slot: np.array([placeholder if m is None else row_of[m] for m in pools[slot]]) for slot in pools}
+    pair_maker = combinations if len(pools["snack"]) >= 2 else combinations_with_replacement
+    snack_pairs = np.array(list(pair_maker(range(len(pools["snack"])), 2)))
+
+    B, L, D = (matrix[rows[slot]] for slot in SLOTS)
+    S = matrix[rows["snack"]]
+    SP = S[snack_pairs[:, 0]] + S[snack_pairs[:, 1]]
+
+    # Nutrient totals for every combination: shape (B, L, D, pairs, nutrients)
+    totals = (B[:, None, None, None, :] + L[None, :, None, None, :]
+              + D[None, None, :, None, :] + SP[None, None, None, :, :])
+    base_penalty = _violation(totals, bounds)
+
+    used = {slot: np.zeros(len(pools[slot])) for slot in pools}
+    plan = []
+    for day in range(days):
+        if time.perf_counter() > deadline:
+            # Out of budget: rotate through the remaining candidates
+            b, l, d = (day % len(pools[slot]) for slot in SLOTS)
+            p = day % len(snack_pairs)
+        else:
+            snack_use = used["snack"][snack_pairs[:, 0]] + used["snack"][snack_pairs[:, 1]]
+            repeats = (used["breakfast"][:, None, None, None] + used["lunch"][None, :, None, None]
+                       + used["dinner"][None, None, :, None] + snack_use[None, None, None, :])
+            score = base_penalty + REPEAT_PENALTY * repeats
+            b, l, d, p = np.unravel_index(int(np.argmin(score)), score.shape)
+
+        s1, s2 = snack_pairs[p]
+        for slot, idx in zip(SLOTS, (b, l, d)):
+            used[slot][idx] += 1
+        used["snack"][s1] += 1
+        used["snack"][s2] += 1
+
+        vector = totals[b, l, d, p]
+        plan.append({
+            "breakfast": name("breakfast", b),
+            "lunch": name("lunch", l),
+            "dinner": name("dinner", d),
+            "snacks": [name("snack", s1), name("snack", s2)],
+            "totals": _totals_dict(vector),
+            "within_limits": _satisfied(vector, bounds)
+        })
+
+    return plan
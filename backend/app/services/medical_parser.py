@@ -1,6 +1,16 @@
 import re
 from typing import Dict, List, Tuple
 
+from . import risk_scoring
+from .disease_rules import ALT_ULN, AST_ULN
+from .unit_conversion import CANONICAL_UNITS, parse_unit, to_canonical, unit_regex
+
+# Printed units accepted after values that must carry one (mg% → mg/dl, gm% → g/dl)
+MASS_OR_MOLAR = unit_regex("mg/dl", "mmol/l")
+HEMOGLOBIN_UNITS = unit_regex("g/dl", "g/l", "mmol/l")
+CREATININE_UNITS = unit_regex("mg/dl", "umol/l")
+ELECTROLYTE_UNITS = unit_regex("mmol/l", "meq/l")
+
 def build_medical_intent(diseases: list[str], extracted_text: str) -> dict:
     """
     Build a comprehensive medical intent from diseases and extracted text.
@@ -9,8 +19,9 @@ def build_medical_intent(diseases: list[str], extracted_text: str) -> dict:
     biomarkers = extract_biomarkers(extracted_text)
     patient_info = extract_patient_info(extracted_text)
 
-    # Determine risk level based on conditions and biomarkers
-    risk_level = calculate_risk_level(diseases, biomarkers)
+    # Preliminary risk level; the pipeline's "risk" stage rescores once
+    # conditions have been detected
+    risk_level = calculate_risk_level(diseases, biomarkers, patient_info)
 
     return {
         "conditions": diseases,
@@ -29,15 +40,15 @@ def extract_biomarkers(text: str) -> Dict[str, Dict]:
     # Comprehensive biomarker patterns (order matters - more specific first)
     biomarker_patterns = {
         # Glucose & Diabetes markers
-        "fasting_glucose": r"(?:fasting\s+)?glucose\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*(?:mg/dl|mg\/dl)",
+        "fasting_glucose": r"(?:fasting\s+)?glucose\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*" + MASS_OR_MOLAR,
         "hba1c": r"hba1c\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*(?:%)?",
         "random_glucose": r"random\s+(?:blood\s+)?glucose\s*(?:[:\-]?\s*)(\d+\.?\d*)",
         
         # Lipid panel
-        "total_cholesterol": r"(?:total\s+)?cholesterol\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*(?:mg/dl|mg\/dl)",
-        "hdl": r"hdl\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*(?:mg/dl|mg\/dl)",
-        "ldl": r"ldl\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*(?:mg/dl|mg\/dl)",
-        "triglycerides": r"triglycerides?\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*(?:mg/dl|mg\/dl)",
+        "total_cholesterol": r"(?:total\s+)?cholesterol\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*" + MASS_OR_MOLAR,
+        "hdl": r"hdl\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*" + MASS_OR_MOLAR,
+        "ldl": r"ldl\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*" + MASS_OR_MOLAR,
+        "triglycerides": r"triglycerides?\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*" + MASS_OR_MOLAR,
         
         # Thyroid markers
         "tsh": r"tsh\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*(?:miu/l|miu\/l|μiu/ml)?",
@@ -51,23 +62,23 @@ def extract_biomarkers(text: str) -> Dict[str, Dict]:
         "ldh": r"ldh\s*(?:[:\-]?\s*)(\d+\.?\d*)",
         
         # Hemoglobin & Blood
-        "hemoglobin": r"hemoglobin\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*(?:gm/dl|g/dl|g\/dl)",
+        "hemoglobin": r"hemoglobin\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*" + HEMOGLOBIN_UNITS,
         "hematocrit": r"hematocrit\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*(?:%)?",
         
         # Renal function
-        "creatinine": r"creatinine\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*(?:mg/dl|mg\/dl)",
-        "bun": r"(?:blood\s+)?urea\s+nitrogen|bun\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*(?:mg/dl|mg\/dl)",
+        "creatinine": r"creatinine\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*" + CREATININE_UNITS,
+        "bun": r"(?:blood\s+urea\s+nitrogen|\bbun)\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*(?:mg/dl|mg\/dl)?",
         "gfr": r"gfr\s*(?:[:\-]?\s*)(\d+\.?\d*)",
         
         # Hepatic function
-        "alt": r"alt\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*(?:u/l|u\/l)?",
-        "ast": r"ast\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*(?:u/l|u\/l)?",
+        "alt": r"\b(?:alt|sgpt)\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*(?:u/l|u\/l)?",
+        "ast": r"\b(?:ast|sgot)\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*(?:u/l|u\/l)?",
         "bilirubin": r"(?:total\s+)?bilirubin\s*(?:[:\-]?\s*)(\d+\.?\d*)",
         
         # Electrolytes
-        "sodium": r"sodium\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*(?:mmol/l|mmol\/l|meq/l)",
-        "potassium": r"potassium\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*(?:mmol/l|mmol\/l|meq/l)",
-        "calcium": r"calcium\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*(?:mg/dl|mmol/l)",
+        "sodium": r"sodium\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*" + ELECTROLYTE_UNITS,
+        "potassium": r"potassium\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*" + ELECTROLYTE_UNITS,
+        "calcium": r"calcium\s*(?:[:\-]?\s*)(\d+\.?\d*)\s*" + MASS_OR_MOLAR,
         "phosphorus": r"phosphorus\s*(?:[:\-]?\s*)(\d+\.?\d*)",
         
         # Blood pressure (special case - two values)
@@ -80,17 +91,28 @@ def extract_biomarkers(text: str) -> Dict[str, Dict]:
             value_str = match.group(1)
             # Handle blood pressure separately
             if biomarker == "blood_pressure":
-                value = value_str
-            else:
-                try:
-                    value = float(value_str)
-                except ValueError:
-                    continue
-            
+                biomarkers[biomarker] = {
+                    "value": value_str,
+                    "unit": get_unit(biomarker),
+                    "abnormal": False
+                }
+                continue
+
+            try:
+                reported_value = float(value_str)
+            except ValueError:
+                continue
+
+            # Keep what the report printed, compare in canonical units
+            reported_unit = parse_unit(text_lower, match.end(1))
+            value, unit = to_canonical(biomarker, reported_value, reported_unit)
+
             biomarkers[biomarker] = {
-                "value": value, 
-                "unit": get_unit(biomarker),
-                "abnormal": is_abnormal(biomarker, value) if biomarker != "blood_pressure" else False
+                "value": value,
+                "unit": unit,
+                "reported_value": reported_value,
+                "reported_unit": reported_unit or unit,
+                "abnormal": is_abnormal(biomarker, value)
             }
 
     return biomarkers
@@ -153,91 +175,28 @@ def extract_patient_info(text: str) -> Dict:
     if name_match:
         info["name"] = name_match.group(1).strip().title()
 
+    # Hospital / lab identifier, when printed (must contain a digit)
+    id_match = re.search(
+        r'\b(?:patient\s+id|uhid|mrn|reg(?:istration)?\.?\s*no\.?|lab\s*no\.?)\s*[:#]?\s*([a-z0-9][a-z0-9\-/]*)',
+        text, re.IGNORECASE
+    )
+    if id_match and any(c.isdigit() for c in id_match.group(1)):
+        info["patient_id"] = id_match.group(1).upper()
+
     return info
 
-def calculate_risk_level(diseases: List[str], biomarkers: Dict) -> str:
+def calculate_risk_level(diseases: List[str], biomarkers: Dict, patient_info: Dict = None) -> str:
     """
     Calculate risk level based on conditions and biomarker values.
+    See risk_scoring.score for the graded score and contributing factors.
     """
-    risk_score = 0
-
-    # Disease-based risk
-    high_risk_diseases = ["diabetes", "hypertension", "heart_disease"]
-    for disease in diseases:
-        if any(hrd in disease.lower() for hrd in high_risk_diseases):
-            risk_score += 2
-
-    # Biomarker-based risk
-    if "glucose" in biomarkers and biomarkers["glucose"]["value"] > 126:
-        risk_score += 2
-    if "hba1c" in biomarkers and biomarkers["hba1c"]["value"] > 6.5:
-        risk_score += 2
-    if "cholesterol" in biomarkers and biomarkers["cholesterol"]["value"] > 240:
-        risk_score += 1
-    if "blood_pressure" in biomarkers:
-        systolic, diastolic = map(int, biomarkers["blood_pressure"]["value"].split('/'))
-        if systolic > 140 or diastolic > 90:
-            risk_score += 2
-
-    if risk_score >= 4:
-        return "high"
-    elif risk_score >= 2:
-        return "medium"
-    else:
-        return "low"
+    return risk_scoring.score(diseases, biomarkers, patient_info)["level"]
 
 def get_unit(biomarker: str) -> str:
     """
-    Get the standard unit for a biomarker.
+    Get the canonical unit for a biomarker.
     """
-    units = {
-        # Glucose & Diabetes
-        "fasting_glucose": "mg/dl",
-        "random_glucose": "mg/dl",
-        "hba1c": "%",
-        
-        # Lipids
-        "total_cholesterol": "mg/dl",
-        "cholesterol": "mg/dl",
-        "hdl": "mg/dl",
-        "ldl": "mg/dl",
-        "triglycerides": "mg/dl",
-        
-        # Thyroid
-        "tsh": "mIU/L",
-        "t3": "pg/ml",
-        "t4": "ng/dl",
-        "tpo_antibodies": "IU/ml",
-        
-        # Cardiac
-        "ck_mb": "U/L",
-        "troponin": "ng/ml",
-        "ldh": "U/L",
-        
-        # Blood
-        "hemoglobin": "g/dl",
-        "hematocrit": "%",
-        
-        # Renal
-        "creatinine": "mg/dl",
-        "bun": "mg/dl",
-        "gfr": "ml/min",
-        
-        # Hepatic
-        "alt": "U/L",
-        "ast": "U/L",
-        "bilirubin": "mg/dl",
-        
-        # Electrolytes
-        "sodium": "mEq/L",
-        "potassium": "mEq/L",
-        "calcium": "mg/dl",
-        "phosphorus": "mg/dl",
-        
-        # Blood Pressure
-        "blood_pressure": "mmHg"
-    }
-    return units.get(biomarker, "")
+    return CANONICAL_UNITS.get(biomarker, "")
 
 def is_abnormal(biomarker: str, value: float) -> bool:
     """
@@ -255,6 +214,15 @@ def is_abnormal(biomarker: str, value: float) -> bool:
         "hemoglobin": (12.0, 17.5),
         "creatinine": (0.6, 1.2),
         "ck_mb": (0, 24),
+        "bun": (7, 20),
+        "gfr": (60, 1000),  # Higher is better
+        "alt": (0, ALT_ULN),
+        "ast": (0, AST_ULN),
+        "bilirubin": (0.1, 1.2),
+        "sodium": (135, 145),
+        "potassium": (3.5, 5.1),
+        "calcium": (8.5, 10.5),
+        "phosphorus": (2.5, 4.5),
     }
     
     if biomarker not in abnormal_ranges:
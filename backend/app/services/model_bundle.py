@@ -0,0 +1,264 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .text_classifier import STUDENT_FILE, load_text_classifier
+
+# A model bundle is a model directory plus bundle.json: the label order the
+# weights were trained with, tokenizer identity, max_length, a hash of the
+# training data, a benchmark snapshot and the size of every file. Training
+# scripts write it next to the weights; the service loads and checks it in
+# one step, so a label-order or tokenizer mismatch fails at startup rather
+# than mislabelling predictions.
+#
+# Directories without bundle.json (older models) load through the legacy
+# path: label_map.json if present, else the caller's fallback label map.
+
+BUNDLE_FILE = "bundle.json"
+BUNDLE_FORMAT = 1
+WEIGHT_FILES = ("model.safetensors", "pytorch_model.bin", STUDENT_FILE)
+
+
+class BundleError(ValueError):
+    pass
+
+
+def data_hash(texts, labels) -> str:
+    """
+    Identity of a labelled training set, recorded in the bundle.
+    """
+    digest = hashlib.sha256()
+    for text, label in zip(texts, labels):
+        digest.update(f"{label}\t{text}\n".encode())
+    return digest.hexdigest()
+
+
+def file_manifest(directory: str) -> Dict[str, int]:
+    return {
+        name: os.path.getsize(os.path.join(directory, name))
+        for name in sorted(os.listdir(directory))
+        if name != BUNDLE_FILE and os.path.isfile(os.path.join(directory, name))
+    }
+
+
+def weights_sha256(directory: str) -> Optional[str]:
+    for name in WEIGHT_FILES:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+            return digest.hexdigest()
+    return None
+
+
+def write_bundle(directory: str, labels: List[str], kind: str, max_length: int = None,
+                 data_hash: str = None, tokenizer=None, benchmark: Dict = None, **extra) -> Dict:
+    """
+    Write bundle.json for the model already saved in `directory`.
+    labels[i] is the name of output i.
+    """
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "kind": kind,
+        "labels": list(labels),
+        "max_length": max_length,
+        "tokenizer": {
+            "class": type(tokenizer).__name__,
+            "name_or_path": tokenizer.name_or_path,
+            "vocab_size": len(tokenizer),
+        } if tokenizer is not None else None,
+        "data_hash": data_hash,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "benchmark": benchmark or {},
+        "weights_sha256": weights_sha256(directory),
+        "files": file_manifest(directory),
+        **extra,
+    }
+    with open(os.path.join(directory, BUNDLE_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(directory: str) -> Optional[Dict]:
+    path = os.path.join(directory, BUNDLE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def validate(directory: str, manifest: Dict, classifier) -> None:
+    """
+    Raise BundleError if the directory or loaded model does not match its
+    manifest. Files are checked by size, which is cheap at startup.
+    """
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise BundleError(f"{directory}: unsupported bundle format {manifest.get('format')}")
+    for name, size in manifest.get("files", {}).items():
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            raise BundleError(f"{directory}: missing {name}")
+        if os.path.getsize(path) != size:
+            raise BundleError(f"{directory}: {name} is {os.path.getsize(path)} bytes, bundle says {size}")
+    if list(classifier.labels) != manifest["labels"]:
+        raise BundleError(f"{directory}: model labels {classifier.labels} != bundle labels {manifest['labels']}")
+    tokenizer = getattr(classifier, "tokenizer", None)
+    expected = manifest.get("tokenizer")
+    if tokenizer is not None and expected and len(tokenizer) != expected["vocab_size"]:
+        raise BundleError(f"{directory}: tokenizer vocab {len(tokenizer)} != bundle {expected['vocab_size']}")
+
+
+class ModelBundle:
+    def __init__(self, name: str, directory: str, classifier, manifest: Dict, legacy: bool):
+        self.name = name
+        self.directory = directory
+        self.classifier = classifier
+        self.manifest = manifest
+        self.legacy = legacy
+
+    @property
+    def labels(self) -> List[str]:
+        return self.classifier.labels
+
+    def describe(self) -> Dict:
+        return {
+            "name": self.name,
+            "directory": self.directory,
+            "legacy": self.legacy,
+            **{k: self.manifest.get(k) for k in ("kind", "labels", "max_length", "data_hash", "created", "benchmark")},
+        }
+
+
+def load_bundle(directory: str, name: str = None, fallback_labels: Dict[int, str] = None) -> ModelBundle:
+    """
+    Load and validate a model directory. Raises BundleError on mismatch.
+    """
+    name = name or os.path.basename(os.path.normpath(directory))
+    manifest = read_manifest(directory)
+    if manifest is None:
+        # Legacy directory: label_map.json ({label: index}) from the tuning script, else the fallback
+        labels = fallback_labels
+        label_file = os.path.join(directory, "label_map.json")
+        if os.path.exists(label_file):
+            with open(label_file) as f:
+                labels = {int(index): label for label, index in json.load(f).items()}
+        classifier = load_text_classifier(directory, labels)
+        manifest = {"kind": "legacy", "labels": classifier.labels}
+        return ModelBundle(name, directory, classifier, manifest, legacy=True)
+
+    labels = dict(enumerate(manifest["labels"]))
+    classifier = load_text_classifier(directory, labels, manifest.get("max_length") or 128)
+    validate(directory, manifest, classifier)
+    return ModelBundle(name, directory, classifier, manifest, legacy=False)
+
+
+def read_active_name(state_path: str) -> Optional[str]:
+    """
+    Version name stored by ModelRegistry.activate(), or None if none was stored.
+    """
+    try:
+        with open(state_path) as f:
+            return json.load(f)["active"]
+    except FileNotFoundError:
+        return None
+
+
+class ModelRegistry:
+    """
+    Loaded model versions by name with one active version. Switching the
+    active version is a reference swap; nothing is reloaded.
+
+    With a state_path, the active version is shared between server worker
+    processes: activate() writes it to that file and every worker adopts it
+    on its next lookup (one stat() per request). The file outlives restarts.
+    """
+
+    def __init__(self, state_path: str = None):
+        self._bundles: Dict[str, ModelBundle] = {}
+        self._active: Optional[str] = None
+        self._lock = threading.Lock()
+        self.state_path = state_path
+        self._state_mtime = None
+
+    def add(self, bundle: ModelBundle, activate: bool = False) -> None:
+        with self._lock:
+            self._bundles[bundle.name] = bundle
+            if activate or self._active is None:
+                self._active = bundle.name
+
+    def activate(self, name: str) -> ModelBundle:
+        with self._lock:
+            if name not in self._bundles:
+                raise KeyError(name)
+            self._active = name
+            if self.state_path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+                staging = f"{self.state_path}.{os.getpid()}.tmp"
+                with open(staging, "w") as f:
+                    json.dump({"active": name}, f)
+                os.replace(staging, self.state_path)
+                self._state_mtime = os.stat(self.state_path).st_mtime_ns
+            return self._bundles[name]
+
+    def _sync(self) -> None:
+        """
+        Adopt a version another worker activated, if the state file changed.
+        """
+        if not self.state_path:
+            return
+        try:
+            mtime = os.stat(self.state_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._state_mtime:
+            return
+        with self._lock:
+            self._state_mtime = mtime
+            try:
+                name = read_active_name(self.state_path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Active model state error: {e}")
+                return
+            if name in self._bundles:
+                self._active = name
+            else:
+                print(f"Active model {name!r} is not loaded in this worker; keeping {self._active}")
+
+    def get(self, name: str = None) -> ModelBundle:
+        if name is None:
+            self._sync()
+        bundles, active = self._bundles, self._active
+        return bundles[name or active]
+
+    @property
+    def active(self) -> ModelBundle:
+        return self.get()
+
+    def names(self) -> List[str]:
+        return list(self._bundles)
+
+    def describe(self) -> Dict:
+        self._sync()
+        return {
+            "active": self._active,
+            "pid": os.getpid(),
+            "models": [bundle.describe() for bundle in self._bundles.values()],
+        }
+
+
+def parse_versions(spec: str) -> Dict[str, str]:
+    """
+    "name=path,name=path" -> {name: path}
+    """
+    versions = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, path = item.partition("=")
+        if not path:
+            raise BundleError(f"Bad model version spec {item!r}; expected name=path")
+        versions[name.strip()] = path.strip()
+    return versions
@@ -0,0 +1,284 @@
+import abc
+import hashlib
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from ..config import (
+    NARRATION_API_KEY, NARRATION_BACKEND, NARRATION_BASE_URL, NARRATION_BATCH_SIZE,
+    NARRATION_BATCH_WAIT_MS, NARRATION_CACHE_SIZE, NARRATION_MAX_TOKENS, NARRATION_MODEL,
+    NARRATION_QUEUE_SIZE, NARRATION_TIMEOUT_MS
+)
+from .inference_threads import configure_torch
+
+# Optional language-model narration of generated diet plans.
+#
+# The rule-based plan from llm_service is always produced first; a backend
+# only rewrites it as friendlier prose. Requests are queued to one worker
+# thread that sends them to the backend in batches, answers are cached per
+# plan signature, and callers wait at most NARRATION_TIMEOUT_MS before
+# falling back to the rule-based text. The queue holds NARRATION_QUEUE_SIZE
+# requests; when it is full, new plans fall back straight away. Requests
+# whose callers have all given up by the time they are dequeued are dropped
+# rather than generated. An answer that finishes after its caller gave up
+# still lands in the cache, so the next identical plan is served from there.
+
+PROMPT_TEMPLATE = (
+    "You are a clinical nutritionist. Rewrite the following diet plan as a short, "
+    "encouraging explanation for the patient. Keep every meal and every food to "
+    "avoid exactly as given and do not add medical advice.\n\n{plan}\n\nExplanation:"
+)
+MAX_PLAN_CHARS = 3000  # keeps prompts inside small local context windows
+
+
+class NarrationBackend(abc.ABC):
+    """
+    Turns a batch of prompts into a batch of completions.
+    """
+    name = "none"
+
+    @abc.abstractmethod
+    def generate(self, prompts: List[str]) -> List[str]:
+        ...
+
+
+class TransformersBackend(NarrationBackend):
+    """
+    Small causal LM run locally on CPU with transformers.
+    """
+    name = "transformers"
+
+    def __init__(self, model_name: str = NARRATION_MODEL, max_tokens: int = NARRATION_MAX_TOKENS):
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        configure_torch(torch)
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, padding_side="left")
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.model = AutoModelForCausalLM.from_pretrained(model_name)
+        self.model.eval()
+        self.max_tokens = max_tokens
+
+    def generate(self, prompts: List[str]) -> List[str]:
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True, truncation=True)
+        with self.torch.inference_mode():
+            output = self.model.generate(
+                **inputs,
+                max_new_tokens=self.max_tokens,
+                do_sample=False,
+                pad_token_id=self.tokenizer.pad_token_id
+            )
+        # Left padding: every prompt ends at the same column
+        new_tokens = output[:, inputs["input_ids"].shape[1]:]
+        return [text.strip() for text in self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)]
+
+
+class OpenAICompatibleBackend(NarrationBackend):
+    """
+    Any server speaking the OpenAI completions API (OpenAI itself, or a local
+    stand-in such as llama.cpp or vLLM). A batch goes out as one request.
+    """
+    name = "openai"
+
+    def __init__(self, model_name: str = NARRATION_MODEL, base_url: str = NARRATION_BASE_URL,
+                 api_key: str = NARRATION_API_KEY, max_tokens: int = NARRATION_MAX_TOKENS,
+                 timeout_ms: float = NARRATION_TIMEOUT_MS):
+        from openai import OpenAI
+
+        self.client = OpenAI(base_url=base_url, api_key=api_key, timeout=timeout_ms / 1000.0, max_retries=0)
+        self.model_name = model_name
+        self.max_tokens = max_tokens
+
+    def generate(self, prompts: List[str]) -> List[str]:
+        response = self.client.completions.create(
+            model=self.model_name,
+            prompt=prompts,
+            max_tokens=self.max_tokens,
+            temperature=0
+        )
+        texts = [""] * len(prompts)
+        for choice in response.choices:
+            texts[choice.index] = choice.text.strip()
+        return texts
+
+
+BACKENDS = {
+    "transformers": TransformersBackend,
+    "openai": OpenAICompatibleBackend,
+}
+
+
+class LRUCache:
+    def __init__(self, size: int):
+        self.size = size
+        self._items: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+class Narrator:
+    """
+    Batches narration requests onto one backend from a worker thread.
+    """
+
+    def __init__(self, backend: NarrationBackend, batch_size: int = NARRATION_BATCH_SIZE,
+                 batch_wait_ms: float = NARRATION_BATCH_WAIT_MS, cache_size: int = NARRATION_CACHE_SIZE,
+                 queue_size: int = NARRATION_QUEUE_SIZE):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.cache = LRUCache(cache_size)
+        self.rejected = 0
+        self.expired = 0
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=queue_size)
+        self._pending: Dict[str, Future] = {}
+        self._deadlines: Dict[str, float] = {}
+        self._pending_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="narration-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, signature: str, prompt: str, timeout_ms: float = NARRATION_TIMEOUT_MS) -> Future:
+        """
+        Future for the narration of `prompt`, resolved with None if the queue
+        is full or every caller waiting on it gave up (after timeout_ms).
+        Identical in-flight requests share one future.
+        """
+        deadline = time.monotonic() + timeout_ms / 1000.0
+        with self._pending_lock:
+            future = self._pending.get(signature)
+            if future is not None:
+                self._deadlines[signature] = max(self._deadlines[signature], deadline)
+                return future
+            future = Future()
+            try:
+                self._queue.put_nowait((signature, prompt, future))
+            except queue.Full:
+                self.rejected += 1
+                future.set_result(None)
+                return future
+            self._pending[signature] = future
+            self._deadlines[signature] = deadline
+        return future
+
+    def _resolve(self, signature: str, future: Future, text: Optional[str]) -> None:
+        with self._pending_lock:
+            self._pending.pop(signature, None)
+            self._deadlines.pop(signature, None)
+        future.set_result(text)
+
+    def _live(self, item: tuple) -> bool:
+        """
+        False (and the future resolved) if nobody is waiting for item any more.
+        """
+        signature, _, future = item
+        with self._pending_lock:
+            expired = self._deadlines.get(signature, 0) <= time.monotonic()
+        if expired:
+            self.expired += 1
+            self._resolve(signature, future, None)
+        return not expired
+
+    def _next_batch(self) -> List[tuple]:
+        batch = []
+        while not batch:
+            item = self._queue.get()
+            if self._live(item):
+                batch.append(item)
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if self._live(item):
+                batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                texts = self.backend.generate([prompt for _, prompt, _ in batch])
+            except Exception as e:
+                print(f"Narration backend error: {e}")
+                texts = [None] * len(batch)
+
+            for (signature, _, future), text in zip(batch, texts):
+                if text:
+                    self.cache.put(signature, text)
+                self._resolve(signature, future, text)
+
+
+def plan_signature(plan_text: str, conditions: List[str]) -> str:
+    digest = hashlib.sha256()
+    digest.update("|".join(sorted(c.lower() for c in conditions or [])).encode())
+    digest.update(plan_text.encode())
+    return digest.hexdigest()
+
+
+_narrator: Optional[Narrator] = None
+_narrator_failed = False
+_narrator_lock = threading.Lock()
+
+
+def get_narrator() -> Optional[Narrator]:
+    """
+    The configured narrator, created on first use. None when narration is
+    disabled or the backend could not be loaded.
+    """
+    global _narrator, _narrator_failed
+    if _narrator is not None or _narrator_failed or NARRATION_BACKEND not in BACKENDS:
+        return _narrator
+    with _narrator_lock:
+        if _narrator is None and not _narrator_failed:
+            try:
+                _narrator = Narrator(BACKENDS[NARRATION_BACKEND]())
+            except Exception as e:
+                print(f"Narration backend load error: {e}")
+                _narrator_failed = True
+    return _narrator
+
+
+def narrate_plan(plan_text: str, conditions: List[str] = None, timeout_ms: float = NARRATION_TIMEOUT_MS) -> Dict:
+    """
+    Narrated version of a rule-based plan: {"text", "source"} where source is
+    "cache", the backend name, or "rules" when falling back to `plan_text`.
+    """
+    narrator = get_narrator()
+    if narrator is None:
+        return {"text": plan_text, "source": "rules"}
+
+    signature = plan_signature(plan_text, conditions)
+    cached = narrator.cache.get(signature)
+    if cached is not None:
+        return {"text": cached, "source": "cache"}
+
+    future = narrator.submit(signature, PROMPT_TEMPLATE.format(plan=plan_text[:MAX_PLAN_CHARS]), timeout_ms)
+    try:
+        text = future.result(timeout=timeout_ms / 1000.0)
+    except Exception:
+        text = None  # timed out; if generation already started, the answer is cached when it arrives
+    if not text:
+        return {"text": plan_text, "source": "rules"}
+    return {"text": text, "source": narrator.backend.name}
@@ -0,0 +1,184 @@
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import COMPACT_FOREST_DIR, ML_MODEL_PATH, SCALER_PATH
+from .compact_forest import ARRAYS, META_FILE, CompactForest
+from .disease_rules import biomarker_values
+
+# Serves the BRFSS RandomForest from training/train_ml_model.py.
+#
+# Report data is mapped onto the training features [BMI, Age, HighBP,
+# HighChol, PhysActivity, GenHlth]; anything the report does not state is
+# imputed with a population default and listed in "imputed". Artifacts are
+# loaded once with mmap_mode="r", so the tree arrays are shared page cache
+# rather than private copies in every worker. The compact array export
+# (compact_forest) is used when present: it loads in milliseconds and
+# predicts request-sized batches far faster than the pickled forest. If
+# ml_model.pkl or scaler.pkl changed since the export, the export is skipped
+# with a warning and the pickles are served.
+
+FEATURES = ["BMI", "Age", "HighBP", "HighChol", "PhysActivity", "GenHlth"]
+CLASSES = {0: "no_diabetes", 1: "prediabetes", 2: "diabetes"}  # Diabetes_012
+
+# Population defaults for features a report rarely states
+DEFAULT_BMI = 27.0
+DEFAULT_AGE_CATEGORY = 8  # 55-59
+DEFAULT_PHYS_ACTIVITY = 1
+DEFAULT_GEN_HLTH = 3  # "good"
+
+_model = None
+_scaler = None
+_load_failed = False
+_lock = threading.Lock()
+
+
+def age_category(age: float) -> int:
+    """
+    BRFSS _AGEG5YR: 1 = 18-24, then 5-year bands up to 13 = 80+.
+    """
+    if age < 25:
+        return 1
+    return int(min(13, (age - 25) // 5 + 2))
+
+
+def feature_vector(biomarkers: Dict, patient_info: Dict = None,
+                   conditions: List[str] = None) -> Tuple[np.ndarray, List[str]]:
+    """
+    (features in FEATURES order, names of imputed features) for one report.
+    """
+    patient_info = patient_info or {}
+    conditions = {c.lower() for c in conditions or []}
+    values = biomarker_values(biomarkers)
+    imputed = []
+
+    bmi = patient_info.get("bmi")
+    if not bmi and patient_info.get("weight") and patient_info.get("height"):
+        height_m = patient_info["height"] / 100
+        bmi = patient_info["weight"] / (height_m * height_m)
+    if not bmi:
+        bmi = DEFAULT_BMI
+        imputed.append("BMI")
+
+    if patient_info.get("age"):
+        age = age_category(patient_info["age"])
+    else:
+        age = DEFAULT_AGE_CATEGORY
+        imputed.append("Age")
+
+    high_bp = int(
+        "hypertension" in conditions
+        or values.get("systolic_bp", 0) >= 140
+        or values.get("diastolic_bp", 0) >= 90
+    )
+    high_chol = int(
+        "cholesterol" in conditions
+        or values.get("total_cholesterol", 0) >= 240
+        or values.get("ldl", 0) >= 160
+    )
+
+    phys_activity = patient_info.get("physically_active")
+    if phys_activity is None:
+        phys_activity = DEFAULT_PHYS_ACTIVITY
+        imputed.append("PhysActivity")
+
+    gen_hlth = patient_info.get("general_health")
+    if gen_hlth is None:
+        gen_hlth = DEFAULT_GEN_HLTH
+        imputed.append("GenHlth")
+
+    row = np.array([bmi, age, high_bp, high_chol, int(phys_activity), gen_hlth], dtype=np.float64)
+    return row, imputed
+
+
+def load_numeric_model():
+    """
+    (model, scaler), loaded once and memory-mapped. scaler is None for the
+    compact forest, which standardizes internally. None if the artifacts
+    are missing or cannot be loaded.
+    """
+    global _model, _scaler, _load_failed
+    if _model is not None or _load_failed:
+        return (_model, _scaler) if _model is not None else None
+    with _lock:
+        if _model is None and not _load_failed:
+            try:
+                stale = None
+                if CompactForest.exists(COMPACT_FOREST_DIR):
+                    stale = CompactForest.stale_reason(COMPACT_FOREST_DIR, {"model": ML_MODEL_PATH,
+                                                                            "scaler": SCALER_PATH})
+                    if stale:
+                        print(f"⚠️  Compact forest skipped ({stale}); re-run training/export_forest.py")
+                if CompactForest.exists(COMPACT_FOREST_DIR) and not stale:
+                    _model, _scaler = CompactForest.load(COMPACT_FOREST_DIR), None
+                else:
+                    import joblib
+                    model = joblib.load(ML_MODEL_PATH, mmap_mode="r")
+                    scaler = joblib.load(SCALER_PATH, mmap_mode="r")
+                    # Per-request batches are small; thread fan-out costs more than it saves
+                    if hasattr(model, "n_jobs"):
+                        model.n_jobs = 1
+                    _model, _scaler = model, scaler
+            except Exception as e:
+                print(f"Numeric model load error: {e}")
+                _load_failed = True
+    return (_model, _scaler) if _model is not None else None
+
+
+def predict_proba_many(rows: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Class probabilities for a (n, len(FEATURES)) array in one model call.
+    """
+    loaded = load_numeric_model()
+    if loaded is None:
+        return None
+    model, scaler = loaded
+    rows = np.atleast_2d(rows)
+    return model.predict_proba(rows if scaler is None else scaler.transform(rows))
+
+
+def _prediction(probabilities: np.ndarray, classes, row: np.ndarray, imputed: List[str]) -> Dict:
+    by_class = {CLASSES.get(int(c), str(c)): round(float(p), 4) for c, p in zip(classes, probabilities)}
+    return {
+        "probabilities": by_class,
+        "predicted": max(by_class, key=by_class.get),
+        "features": dict(zip(FEATURES, row.tolist())),
+        "imputed": imputed
+    }
+
+
+def predict_many(reports: List[Dict]) -> List[Optional[Dict]]:
+    """
+    Batched prediction for [{"biomarkers", "patient_info", "conditions"}, ...].
+    Entries are None when the model is unavailable.
+    """
+    if not reports:
+        return []
+    vectors = [feature_vector(r.get("biomarkers", {}), r.get("patient_info"), r.get("conditions")) for r in reports]
+    rows = np.vstack([row for row, _ in vectors])
+    try:
+        probabilities = predict_proba_many(rows)
+    except Exception as e:
+        print(f"Numeric model prediction error: {e}")
+        probabilities = None
+    if probabilities is None:
+        return [None] * len(reports)
+
+    classes = load_numeric_model()[0].classes_
+    return [
+        _prediction(probabilities[i], classes, row, imputed)
+        for i, (row, imputed) in enumerate(vectors)
+    ]
+
+
+def predict_numeric_risk(biomarkers: Dict, patient_info: Dict = None,
+                         conditions: List[str] = None) -> Optional[Dict]:
+    return predict_many([{"biomarkers": biomarkers, "patient_info": patient_info, "conditions": conditions}])[0]
+
+
+def artifact_paths() -> List[str]:
+    compact = [os.path.join(COMPACT_FOREST_DIR, f"{name}.npy") for name in ARRAYS]
+    compact.append(os.path.join(COMPACT_FOREST_DIR, META_FILE))
+    return [path for path in [ML_MODEL_PATH, SCALER_PATH] + compact if os.path.exists(path)]
@@ -0,0 +1,266 @@
+"""
+Dependency-tracked report pipeline.
+
+Each stage output (text, biomarkers, conditions, risk, rules, plan) is stored with
+a fingerprint of the code and data that produced it, chained with the
+fingerprints of its inputs. When a rule table, the meal knowledge base or a
+parser changes, `refresh_archive` recomputes only the stages downstream of
+the change.
+
+Usage (from the backend directory):
+    python -m app.services.pipeline refresh --workers 4
+    python -m app.services.pipeline refresh --dry-run
+"""
+import argparse
+import hashlib
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+from ..config import ACTIVE_MODEL_PATH, DISEASE_CLASSIFIER, DISEASE_MODEL_DIR, DISEASE_MODEL_VERSIONS
+from . import biomarker_store
+from .model_bundle import parse_versions, read_active_name, read_manifest
+from .knowledge_base import content_hash as knowledge_hash
+from .numeric_model_service import artifact_paths as numeric_model_paths
+
+SERVICES_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Stage table: name, upstream stages, and the files whose content defines
+# the stage's behaviour. "source" is the raw OCR text and "preferences" the
+# diet preferences/allergies given at upload; neither is ever recomputed.
+STAGES = [
+    {"name": "text", "deps": ["source"], "files": ["text_cleaner.py"]},
+    {"name": "biomarkers", "deps": ["text"], "files": ["medical_parser.py", "unit_conversion.py", "disease_rules.py"]},
+    {"name": "conditions", "deps": ["text", "biomarkers"], "files": ["bert_services.py", "disease_rules.py", "text_classifier.py"], "model": True},
+    {"name": "risk", "deps": ["biomarkers", "conditions"], "files": ["risk_scoring.py", "disease_rules.py", "numeric_model_service.py"], "numeric_model": True},
+    {"name": "rules", "deps": ["biomarkers", "conditions"], "files": ["gpt_service.py"]},
+    {"name": "plan", "deps": ["biomarkers", "conditions", "risk", "rules"], "files": ["diet_generator.py", "llm_service.py", "knowledge_base.py", "meal_planner.py", "narration_service.py"], "knowledge": True},
+]
+STAGE_NAMES = [stage["name"] for stage in STAGES]
+
+
+def _hash_files(paths: List[str]) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _active_model() -> tuple:
+    """
+    (version name, directory) of the disease model serving requests: the
+    configured classifier (config.DISEASE_CLASSIFIER) unless another loaded
+    version was activated via /models/{name}/activate. Resolved the way
+    bert_services' registry does, without loading any model.
+    """
+    bert_services = sys.modules.get(f"{__package__}.bert_services")
+    if bert_services is not None:
+        active = bert_services.registry.active
+        return active.name, active.directory
+    versions = {DISEASE_CLASSIFIER: DISEASE_MODEL_DIR, **parse_versions(DISEASE_MODEL_VERSIONS)}
+    try:
+        name = read_active_name(ACTIVE_MODEL_PATH)
+    except (OSError, ValueError, KeyError):
+        name = None
+    if name not in versions:
+        name = DISEASE_CLASSIFIER
+    return name, versions[name]
+
+
+def _model_signature() -> str:
+    """
+    Identity of the active disease model: its version name plus the weights
+    hash from bundle.json, or file names, sizes and mtimes without one.
+    """
+    name, directory = _active_model()
+    manifest = read_manifest(directory) if os.path.isdir(directory) else None
+    if manifest and manifest.get("weights_sha256"):
+        return hashlib.sha256(f"{name}|{manifest['weights_sha256']}".encode()).hexdigest()
+    if not os.path.isdir(directory):
+        return f"no-model:{name}"
+    parts = [name]
+    for file_name in sorted(os.listdir(directory)):
+        full = os.path.join(directory, file_name)
+        if os.path.isfile(full):
+            stat = os.stat(full)
+            parts.append(f"{file_name}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+def _file_signature(paths: List[str]) -> str:
+    parts = []
+    for path in sorted(paths):
+        stat = os.stat(path)
+        parts.append(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+def compute_fingerprints() -> Dict[str, str]:
+    """
+    Current fingerprint of every stage, chained through its dependencies.
+    """
+    fingerprints = {"source": "source"}
+    for stage in STAGES:
+        digest = hashlib.sha256()
+        digest.update(_hash_files([os.path.join(SERVICES_DIR, f) for f in stage["files"]]).encode())
+        if stage.get("model"):
+            digest.update(_model_signature().encode())
+        if stage.get("numeric_model"):
+            digest.update(_file_signature(numeric_model_paths()).encode())
+        if stage.get("knowledge"):
+            digest.update(knowledge_hash().encode())
+        for dep in stage["deps"]:
+            digest.update(fingerprints[dep].encode())
+        fingerprints[stage["name"]] = digest.hexdigest()[:16]
+    return fingerprints
+
+
+def _run_stage(name: str, outputs: Dict) -> object:
+    # Imports are deferred so fingerprinting and --dry-run never load the model
+    if name == "text":
+        from .text_cleaner import clean_text
+        return clean_text(outputs["source"])
+
+    if name == "biomarkers":
+        from .medical_parser import build_medical_intent
+        return build_medical_intent([], outputs["text"])
+
+    if name == "conditions":
+        from .bert_services import predict_disease
+        return predict_disease(outputs["text"], outputs["biomarkers"].get("biomarkers", {}))
+
+    if name == "risk":
+        from .numeric_model_service import predict_numeric_risk
+        from .risk_scoring import fuse_model_prediction, score
+        biomarkers = outputs["biomarkers"].get("biomarkers", {})
+        patient_info = outputs["biomarkers"].get("patient_info", {})
+        result = score(outputs["conditions"], biomarkers, patient_info)
+        return fuse_model_prediction(result, predict_numeric_risk(biomarkers, patient_info, outputs["conditions"]))
+
+    if name == "rules":
+        from .gpt_service import normalize_rules
+        medical_intent = dict(outputs["biomarkers"], conditions=outputs["conditions"])
+        return normalize_rules(medical_intent).get("diet_rules", [])
+
+    if name == "plan":
+        from .diet_generator import generate_diet_plan
+        medical_intent = dict(outputs["biomarkers"], conditions=outputs["conditions"],
+                              risk_level=outputs["risk"]["level"])
+        diseases = outputs["conditions"]
+        gpt_output = {
+            "diet_rules": outputs["rules"],
+            "condition": ", ".join(diseases) if diseases else "general wellness",
+            "patient": medical_intent.get("patient_info", {}).get("name", "Patient"),
+            "medical_condition": diseases if diseases else ["general"],
+            "patient_info": medical_intent.get("patient_info", {}),
+            "biomarkers": medical_intent.get("biomarkers", {}),
+            "medical_intent": medical_intent,
+            "risk_level": medical_intent.get("risk_level", "medium"),
+            "preferences": outputs.get("preferences", {}).get("preferences", []),
+            "allergies": outputs.get("preferences", {}).get("allergies", [])
+        }
+        return generate_diet_plan(gpt_output)
+
+    raise KeyError(f"Unknown stage {name}")
+
+
+def run_pipeline(outputs: Dict, start: str = "text") -> Dict:
+    """
+    Run every stage from `start` onwards. `outputs` must already hold the
+    outputs of all stages before `start` (at least the raw "source" text,
+    optionally "preferences").
+    """
+    outputs = dict(outputs)
+    for name in STAGE_NAMES[STAGE_NAMES.index(start):]:
+        outputs[name] = _run_stage(name, outputs)
+    return outputs
+
+
+def first_stale_stage(stored: Dict[str, str], current: Dict[str, str]) -> Optional[str]:
+    """
+    Earliest stage whose stored fingerprint differs from the current one.
+    Downstream stages are implicitly stale because fingerprints are chained.
+    """
+    for name in STAGE_NAMES:
+        if stored.get(name) != current[name]:
+            return name
+    return None
+
+
+def _refresh_report(report_id: int, start: str, fingerprints: Dict[str, str]) -> str:
+    outputs = biomarker_store.load_stage_outputs(report_id)
+    if "source" not in outputs:
+        raise ValueError("no stored source text")
+
+    outputs = run_pipeline(outputs, start)
+    recomputed = {name: outputs[name] for name in STAGE_NAMES[STAGE_NAMES.index(start):]}
+    biomarker_store.save_stage_outputs(report_id, recomputed, fingerprints)
+
+    biomarker_store.replace_measurements(
+        report_id,
+        outputs["biomarkers"].get("biomarkers", {}),
+        outputs["conditions"],
+        outputs["risk"]["level"]
+    )
+    return start
+
+
+def refresh_archive(workers: int = 4, dry_run: bool = False) -> Dict:
+    """
+    Recompute stale stages for every stored report.
+
+    Reports are processed on a thread pool: the BERT model is loaded once and
+    shared, and torch releases the GIL during inference.
+    """
+    current = compute_fingerprints()
+    stored = biomarker_store.list_stage_fingerprints()
+
+    jobs = {}
+    for report_id, fingerprints in stored.items():
+        start = first_stale_stage(fingerprints, current)
+        if start:
+            jobs[report_id] = start
+
+    summary = {"reports": len(stored), "stale": len(jobs), "by_stage": {}, "failed": []}
+    for start in jobs.values():
+        summary["by_stage"][start] = summary["by_stage"].get(start, 0) + 1
+
+    if dry_run or not jobs:
+        return summary
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_refresh_report, report_id, start, current): report_id
+            for report_id, start in jobs.items()
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Refresh error for report {futures[future]}: {e}")
+                summary["failed"].append(futures[future])
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute stale pipeline stages across stored reports")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    refresh = subparsers.add_parser("refresh")
+    refresh.add_argument("--workers", type=int, default=4)
+    refresh.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    summary = refresh_archive(args.workers, args.dry_run)
+    print(f"Reports: {summary['reports']}, stale: {summary['stale']}")
+    for stage, count in summary["by_stage"].items():
+        print(f"  from {stage}: {count}")
+    if summary["failed"]:
+        print(f"Failed: {summary['failed']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from .disease_rules import ALT_ULN, AST_ULN, OPERATORS, biomarker_values
+
+# Graded risk score from detected conditions, biomarkers and patient info.
+# Each factor adds its points once, however many of its evidence rows fire.
+# score() explains one report; score_many() applies the same tables to a
+# DataFrame for population-level stratification.
+
+CONDITION_POINTS = {
+    "diabetes": 2,
+    "hypertension": 2,
+    "heart_disease": 3,
+    "kidney_disease": 3,
+    "liver_disease": 2,
+    "cholesterol": 1,
+    "thyroid": 1,
+}
+
+# factor -> (points, [(measure, op, threshold)]). Measures are canonical
+# biomarker keys (blood pressure split into systolic_bp/diastolic_bp) or
+# the patient_info fields age and bmi.
+LIVER_INJURY_ULN_MULTIPLE = 3  # transaminases, on the ULNs disease_rules shares with is_abnormal
+
+RISK_FACTORS = {
+    "hyperglycemia": (2, [("fasting_glucose", ">=", 126), ("random_glucose", ">=", 200)]),
+    "elevated_hba1c": (2, [("hba1c", ">=", 6.5)]),
+    "poor_glycemic_control": (1, [("hba1c", ">=", 8.0)]),
+    "high_blood_pressure": (2, [("systolic_bp", ">=", 140), ("diastolic_bp", ">=", 90)]),
+    "severe_blood_pressure": (1, [("systolic_bp", ">=", 180), ("diastolic_bp", ">=", 120)]),
+    "high_cholesterol": (1, [("total_cholesterol", ">=", 240), ("ldl", ">=", 160)]),
+    "cardiac_injury": (3, [("ck_mb", ">", 24), ("troponin", "present", None)]),
+    "severe_renal_impairment": (2, [("gfr", "<", 30)]),
+    "hyperkalemia": (2, [("potassium", ">", 5.5)]),
+    "liver_injury": (1, [("alt", ">=", LIVER_INJURY_ULN_MULTIPLE * ALT_ULN),
+                         ("ast", ">=", LIVER_INJURY_ULN_MULTIPLE * AST_ULN), ("bilirubin", ">", 3.0)]),
+    "older_age": (1, [("age", ">=", 65)]),
+    "obesity": (1, [("bmi", ">=", 30)]),
+}
+
+# Numeric model (numeric_model_service) probabilities -> extra points
+MODEL_DIABETES_THRESHOLD = 0.5  # P(diabetes)
+MODEL_DIABETES_POINTS = 2
+MODEL_PREDIABETES_THRESHOLD = 0.5  # P(prediabetes) + P(diabetes)
+MODEL_PREDIABETES_POINTS = 1
+
+# (minimum score, level), highest first
+RISK_LEVELS = [(4, "high"), (2, "medium"), (0, "low")]
+
+_CONDITION_ALIASES = {
+    "heart disease": "heart_disease",
+    "kidney disease": "kidney_disease",
+    "liver disease": "liver_disease",
+    "high blood pressure": "hypertension",
+    "high cholesterol": "cholesterol",
+}
+
+
+def risk_level(score: float) -> str:
+    for minimum, level in RISK_LEVELS:
+        if score >= minimum:
+            return level
+    return RISK_LEVELS[-1][1]
+
+
+def _condition_name(condition: str) -> str:
+    name = condition.lower().strip()
+    return _CONDITION_ALIASES.get(name, name)
+
+
+def _measures(biomarkers: Dict, patient_info: Dict) -> Dict[str, float]:
+    measures = biomarker_values(biomarkers)
+    for field in ("age", "bmi"):
+        value = (patient_info or {}).get(field)
+        if isinstance(value, (int, float)):
+            measures[field] = float(value)
+    return measures
+
+
+def score(diseases: List[str], biomarkers: Dict, patient_info: Dict = None) -> Dict:
+    """
+    {"score", "level", "factors"} for one report. Each factor lists the
+    points it contributed and the evidence that triggered it.
+    """
+    factors = []
+    seen = set()
+    for disease in diseases or []:
+        name = _condition_name(disease)
+        points = CONDITION_POINTS.get(name)
+        if points and name not in seen:
+            seen.add(name)
+            factors.append({"factor": name, "points": points, "evidence": "detected condition"})
+
+    measures = _measures(biomarkers, patient_info)
+    for factor, (points, rows) in RISK_FACTORS.items():
+        for measure, op, threshold in rows:
+            if measure not in measures:
+                continue
+            value = measures[measure]
+            if op == "present" or OPERATORS[op](value, threshold):
+                evidence = f"{measure} {value:g}" if op == "present" else f"{measure} {value:g} {op} {threshold:g}"
+                factors.append({"factor": factor, "points": points, "evidence": evidence})
+                break
+
+    total = sum(factor["points"] for factor in factors)
+    return {"score": total, "level": risk_level(total), "factors": factors}
+
+
+def fuse_model_prediction(result: Dict, prediction: Dict = None) -> Dict:
+    """
+    Add the numeric model's diabetes probability to a score() result as one
+    more factor and attach the prediction under "model". Unchanged when
+    there is no prediction.
+    """
+    if not prediction:
+        return result
+    probabilities = prediction.get("probabilities", {})
+    p_diabetes = probabilities.get("diabetes", 0.0)
+    p_any = p_diabetes + probabilities.get("prediabetes", 0.0)
+
+    factors = list(result["factors"])
+    if p_diabetes >= MODEL_DIABETES_THRESHOLD:
+        factors.append({"factor": "model_diabetes_risk", "points": MODEL_DIABETES_POINTS,
+                        "evidence": f"P(diabetes) {p_diabetes:.2f}"})
+    elif p_any >= MODEL_PREDIABETES_THRESHOLD:
+        factors.append({"factor": "model_prediabetes_risk", "points": MODEL_PREDIABETES_POINTS,
+                        "evidence": f"P(prediabetes or diabetes) {p_any:.2f}"})
+
+    total = sum(factor["points"] for factor in factors)
+    return {"score": total, "level": risk_level(total), "factors": factors, "model": prediction}
+
+
+def score_many(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Vectorized score() over a DataFrame with one row per patient/report.
+
+    Recognized columns: measure columns named as in RISK_FACTORS (NaN when
+    not measured), and either a boolean column per condition key or a
+    "conditions" column holding lists of condition names. Returns one
+    boolean column per contributing factor plus risk_score and risk_level.
+    """
+    n = len(frame)
+    result = {}
+    total = np.zeros(n, dtype=np.int64)
+
+    condition_lists = None
+    if "conditions" in frame:
+        condition_lists = frame["conditions"].map(
+            lambda items: {_condition_name(c) for c in items} if isinstance(items, (list, tuple, set)) else set()
+        )
+    for condition, points in CONDITION_POINTS.items():
+        if condition in frame:
+            fired = frame[condition].fillna(False).to_numpy(dtype=bool)
+        elif condition_lists is not None:
+            fired = condition_lists.map(lambda names: condition in names).to_numpy(dtype=bool)
+        else:
+            continue
+        result[condition] = fired
+        total += points * fired
+
+    for factor, (points, rows) in RISK_FACTORS.items():
+        fired = np.zeros(n, dtype=bool)
+        for measure, op, threshold in rows:
+            if measure not in frame:
+                continue
+            column = frame[measure].to_numpy(dtype=np.float64, na_value=np.nan)
+            if op == "present":
+                fired |= ~np.isnan(column)
+            else:
+                with np.errstate(invalid="ignore"):
+                    fired |= OPERATORS[op](column, threshold)
+        result[factor] = fired
+        total += points * fired
+
+    out = pd.DataFrame(result, index=frame.index)
+    out["risk_score"] = total
+    bins = [-np.inf] + [minimum for minimum, _ in reversed(RISK_LEVELS[:-1])] + [np.inf]
+    labels = [level for _, level in reversed(RISK_LEVELS)]
+    out["risk_level"] = pd.cut(total, bins=bins, labels=labels, right=False)
+    return out
@@ -0,0 +1,176 @@
+import hashlib
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from ..config import SHADOW_DB_PATH, SHADOW_FRACTION, SHADOW_MODEL, SHADOW_QUEUE_SIZE
+
+# Shadow evaluation of a candidate disease classifier on live traffic.
+#
+# predict_disease() hands a sampled fraction of requests, with the primary
+# model's answer and latency, to one background worker. The worker drains
+# the queue in small batches, scores each request with the candidate on its
+# own (timed the way the primary was) and logs both answers to a local
+# SQLite table in one transaction per batch. The response path only does a
+# non-blocking queue put: when the queue is full the sample is dropped and
+# counted, never waited on.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shadow_predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    primary_model TEXT NOT NULL,
+    candidate_model TEXT NOT NULL,
+    primary_label TEXT,
+    candidate_label TEXT,
+    primary_confidence REAL,
+    candidate_confidence REAL,
+    primary_ms REAL,
+    candidate_ms REAL,
+    agree INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_shadow_candidate
+    ON shadow_predictions (candidate_model, agree);
+"""
+
+MAX_BATCH = 16
+
+
+class ShadowEvaluator:
+    def __init__(self, candidate, fraction: float = SHADOW_FRACTION, queue_size: int = SHADOW_QUEUE_SIZE,
+                 store_path: str = SHADOW_DB_PATH):
+        self.candidate = candidate  # a model_bundle.ModelBundle
+        self.fraction = fraction
+        self.store_path = store_path
+        self.queue_size = queue_size
+        self._start_worker()
+        # Threads do not survive fork: a worker forked from a preloading
+        # master (backend/serve.py) starts its own
+        os.register_at_fork(after_in_child=self._start_worker)
+
+    def _start_worker(self):
+        self.submitted = 0
+        self.dropped = 0
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=self.queue_size)
+        self._worker = threading.Thread(target=self._run, name="shadow-inference", daemon=True)
+        self._worker.start()
+
+    def sample(self) -> bool:
+        return random.random() < self.fraction
+
+    def submit(self, text: str, primary_model: str, primary_label: str, primary_confidence: float,
+               primary_ms: float) -> bool:
+        """
+        Queue one request for the candidate. Never blocks; False if dropped.
+        """
+        try:
+            self._queue.put_nowait((text, primary_model, primary_label, primary_confidence, primary_ms))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < MAX_BATCH:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = _connect(self.store_path)
+        while True:
+            batch = self._next_batch()
+            try:
+                rows = []
+                for text, primary_model, primary_label, primary_confidence, primary_ms in batch:
+                    # One text per call, as the primary served it, so the latencies compare like with like
+                    start = time.perf_counter()
+                    row = self.candidate.classifier.predict_proba([text])[0]
+                    candidate_ms = (time.perf_counter() - start) * 1000
+                    candidate_label = self.candidate.labels[int(row.argmax())]
+                    rows.append((
+                        datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                        hashlib.sha256(text.encode()).hexdigest()[:16],
+                        primary_model, self.candidate.name,
+                        primary_label, candidate_label,
+                        primary_confidence, float(row.max()),
+                        primary_ms, candidate_ms,
+                        int(primary_label == candidate_label),
+                    ))
+                conn.executemany(
+                    "INSERT INTO shadow_predictions (created_at, text_hash, primary_model, candidate_model, "
+                    "primary_label, candidate_label, primary_confidence, candidate_confidence, "
+                    "primary_ms, candidate_ms, agree) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                conn.commit()
+            except Exception as e:
+                print(f"Shadow inference error: {e}")
+
+    def summary(self) -> Dict:
+        conn = _connect(self.store_path)
+        count, agreement, primary_ms, candidate_ms = conn.execute(
+            "SELECT COUNT(*), AVG(agree), AVG(primary_ms), AVG(candidate_ms) "
+            "FROM shadow_predictions WHERE candidate_model = ?",
+            (self.candidate.name,)
+        ).fetchone()
+        disagreements = conn.execute(
+            "SELECT primary_label, candidate_label, COUNT(*) FROM shadow_predictions "
+            "WHERE candidate_model = ? AND agree = 0 GROUP BY primary_label, candidate_label "
+            "ORDER BY COUNT(*) DESC LIMIT 20",
+            (self.candidate.name,)
+        ).fetchall()
+        conn.close()
+        return {
+            "candidate": self.candidate.name,
+            "fraction": self.fraction,
+            "logged": count,
+            "agreement": agreement,
+            "mean_primary_ms": primary_ms,
+            "mean_candidate_ms": candidate_ms,
+            "latency_delta_ms": candidate_ms - primary_ms if count else None,
+            "disagreements": [
+                {"primary": primary, "candidate": candidate, "count": n} for primary, candidate, n in disagreements
+            ],
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+        }
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    if path != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def create_shadow(registry, fallback_labels: Dict[int, str] = None) -> Optional[ShadowEvaluator]:
+    """
+    Evaluator for config.SHADOW_MODEL (a registry version name or a bundle
+    directory), or None when shadowing is off or the candidate fails to load.
+    """
+    if not SHADOW_MODEL or SHADOW_FRACTION <= 0:
+        return None
+    try:
+        if SHADOW_MODEL in registry.names():
+            candidate = registry.get(SHADOW_MODEL)
+        else:
+            from .model_bundle import load_bundle
+            candidate = load_bundle(SHADOW_MODEL, fallback_labels=fallback_labels)
+    except Exception as e:
+        print(f"Shadow model load error: {e}")
+        return None
+    return ShadowEvaluator(candidate)
@@ -0,0 +1,122 @@
+import json
+import os
+from typing import Dict, List
+
+import numpy as np
+
+from ..config import MMAP_WEIGHTS
+from .inference_threads import configure_torch
+
+# Disease text classifiers behind one interface: .labels and
+# .predict_proba(texts) -> (n, len(labels)).
+#
+# A model directory holds either a transformers sequence classifier (the
+# fine-tuned BERT teacher, or a distilled few-layer student) or a
+# student.joblib from training/distill_classifier.py (TF-IDF + logistic
+# regression, no torch needed).
+#
+# With MMAP_WEIGHTS, BERT weights are not copied into process memory: the
+# tensors are views of a private read-only mapping of model.safetensors,
+# backed by the page cache, so every worker process shares one physical copy.
+
+STUDENT_FILE = "student.joblib"
+SAFETENSORS_FILE = "model.safetensors"
+SAFETENSORS_DTYPES = {
+    "F64": "float64", "F32": "float32", "F16": "float16", "BF16": "bfloat16",
+    "I64": "int64", "I32": "int32", "I16": "int16", "I8": "int8", "U8": "uint8", "BOOL": "bool",
+}
+
+
+def mmap_state_dict(path: str, torch) -> Dict:
+    """
+    State dict whose tensors view a MAP_PRIVATE mapping of a .safetensors file.
+    """
+    with open(path, "rb") as f:
+        header_size = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_size))
+    header.pop("__metadata__", None)
+
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=os.path.getsize(path))
+    data = torch.empty(0, dtype=torch.uint8).set_(storage)
+    data_start = 8 + header_size
+    state = {}
+    for name, info in header.items():
+        dtype = getattr(torch, SAFETENSORS_DTYPES[info["dtype"]])
+        start, end = info["data_offsets"]
+        raw = data[data_start + start:data_start + end]
+        if (data_start + start) % dtype.itemsize:
+            raw = raw.clone()  # misaligned for a zero-copy view; copy this one tensor
+        state[name] = raw.view(dtype).reshape(info["shape"])
+    return state
+
+
+class TfidfClassifier:
+    def __init__(self, pipeline, labels: List[str]):
+        self.pipeline = pipeline
+        self.labels = list(labels)
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        # Columns follow the fitted class order, which indexes self.labels
+        probabilities = np.zeros((len(texts), len(self.labels)))
+        probabilities[:, self.pipeline.classes_] = self.pipeline.predict_proba(texts)
+        return probabilities
+
+
+class BertClassifier:
+    def __init__(self, path: str, fallback_labels: Dict[int, str] = None, max_length: int = 128,
+                 mmap_weights: bool = MMAP_WEIGHTS):
+        import torch
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        configure_torch(torch)
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(path, local_files_only=True)
+        self.model = None
+        if mmap_weights and os.path.exists(os.path.join(path, SAFETENSORS_FILE)):
+            self.model = self._load_mapped(path)
+        if self.model is None:
+            self.model = AutoModelForSequenceClassification.from_pretrained(path, local_files_only=True)
+        self.model.eval()
+        self.max_length = max_length
+
+        id2label = {int(k): v for k, v in self.model.config.id2label.items()}
+        # Untrained configs carry placeholder LABEL_n names; use the caller's map then
+        if fallback_labels and all(v.startswith("LABEL_") for v in id2label.values()):
+            id2label = fallback_labels
+        self.labels = [id2label[i] for i in range(len(id2label))]
+
+    def _load_mapped(self, path: str):
+        """
+        Model with mmap-backed parameters, or None if the file's keys do not
+        match the architecture (the caller then loads normally).
+        """
+        from transformers import AutoConfig, AutoModelForSequenceClassification
+
+        config = AutoConfig.from_pretrained(path, local_files_only=True)
+        model = AutoModelForSequenceClassification.from_config(config)
+        # assign=True swaps in the mapped tensors instead of copying into the freshly initialised ones
+        result = model.load_state_dict(mmap_state_dict(os.path.join(path, SAFETENSORS_FILE), self.torch),
+                                       strict=False, assign=True)
+        if result.missing_keys or result.unexpected_keys:
+            print(f"Mapped weights do not match {path} (missing {result.missing_keys[:3]}, "
+                  f"unexpected {result.unexpected_keys[:3]}); loading a private copy")
+            return None
+        return model
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer(texts, return_tensors="pt", padding=True, truncation=True, max_length=self.max_length)
+        with self.torch.inference_mode():
+            logits = self.model(**inputs).logits
+        return self.torch.softmax(logits, dim=-1).numpy()
+
+
+def is_tfidf_model(path: str) -> bool:
+    return os.path.exists(os.path.join(path, STUDENT_FILE))
+
+
+def load_text_classifier(path: str, fallback_labels: Dict[int, str] = None, max_length: int = 128):
+    if is_tfidf_model(path):
+        import joblib
+        artifact = joblib.load(os.path.join(path, STUDENT_FILE))
+        return TfidfClassifier(artifact["pipeline"], artifact["labels"])
+    return BertClassifier(path, fallback_labels, max_length)
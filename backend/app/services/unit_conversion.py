@@ -0,0 +1,200 @@
+from typing import Dict, Optional, Tuple
+import re
+
+# Canonical unit for every biomarker. All thresholds in medical_parser and
+# bert_services are expressed in these units.
+CANONICAL_UNITS = {
+    # Glucose & Diabetes
+    "fasting_glucose": "mg/dl",
+    "random_glucose": "mg/dl",
+    "hba1c": "%",
+
+    # Lipids
+    "total_cholesterol": "mg/dl",
+    "cholesterol": "mg/dl",
+    "hdl": "mg/dl",
+    "ldl": "mg/dl",
+    "triglycerides": "mg/dl",
+
+    # Thyroid
+    "tsh": "mIU/L",
+    "t3": "pg/ml",
+    "t4": "ng/dl",
+    "tpo_antibodies": "IU/ml",
+
+    # Cardiac
+    "ck_mb": "U/L",
+    "troponin": "ng/ml",
+    "ldh": "U/L",
+
+    # Blood
+    "hemoglobin": "g/dl",
+    "hematocrit": "%",
+
+    # Renal
+    "creatinine": "mg/dl",
+    "bun": "mg/dl",
+    "gfr": "ml/min",
+
+    # Hepatic
+    "alt": "U/L",
+    "ast": "U/L",
+    "bilirubin": "mg/dl",
+
+    # Electrolytes
+    "sodium": "mEq/L",
+    "potassium": "mEq/L",
+    "calcium": "mg/dl",
+    "phosphorus": "mg/dl",
+
+    # Blood Pressure
+    "blood_pressure": "mmHg"
+}
+
+# Spellings seen on printed reports, mapped to one normalized key.
+# Report text is lower-cased before extraction, so keys are lower case.
+UNIT_ALIASES = {
+    "mg/dl": "mg/dl", "mg%": "mg/dl",
+    "mmol/l": "mmol/l",
+    "umol/l": "umol/l", "µmol/l": "umol/l", "μmol/l": "umol/l",
+    "mmol/mol": "mmol/mol",
+    "%": "%",
+    "g/dl": "g/dl", "gm/dl": "g/dl", "gm%": "g/dl",
+    "g/l": "g/l",
+    "meq/l": "meq/l",
+    "miu/l": "miu/l", "uiu/ml": "miu/l", "µiu/ml": "miu/l", "μiu/ml": "miu/l",
+    "pg/ml": "pg/ml",
+    "pmol/l": "pmol/l",
+    "ng/dl": "ng/dl",
+    "ng/ml": "ng/ml", "ug/l": "ng/ml", "µg/l": "ng/ml",
+    "ng/l": "ng/l",
+    "u/l": "u/l", "iu/l": "u/l",
+    "iu/ml": "iu/ml",
+    "ml/min": "ml/min", "ml/min/1.73m2": "ml/min",
+    "mmhg": "mmhg",
+}
+
+# Precomputed (scale, offset) pairs: canonical = value * scale + offset.
+# Keyed by (biomarker, normalized printed unit).
+CONVERSION_FACTORS: Dict[Tuple[str, str], Tuple[float, float]] = {
+    # Glucose: 1 mmol/L = 18.016 mg/dL
+    ("fasting_glucose", "mmol/l"): (18.016, 0.0),
+    ("random_glucose", "mmol/l"): (18.016, 0.0),
+
+    # HbA1c: IFCC mmol/mol -> NGSP % (master equation)
+    ("hba1c", "mmol/mol"): (0.09148, 2.152),
+
+    # Cholesterol fractions: 1 mmol/L = 38.67 mg/dL
+    ("total_cholesterol", "mmol/l"): (38.67, 0.0),
+    ("cholesterol", "mmol/l"): (38.67, 0.0),
+    ("hdl", "mmol/l"): (38.67, 0.0),
+    ("ldl", "mmol/l"): (38.67, 0.0),
+
+    # Triglycerides: 1 mmol/L = 88.57 mg/dL
+    ("triglycerides", "mmol/l"): (88.57, 0.0),
+
+    # Thyroid
+    ("t3", "pmol/l"): (0.651, 0.0),
+    ("t4", "pmol/l"): (0.0777, 0.0),
+
+    # Cardiac
+    ("troponin", "ng/l"): (0.001, 0.0),
+
+    # Blood
+    ("hemoglobin", "g/l"): (0.1, 0.0),
+    ("hemoglobin", "mmol/l"): (1.611, 0.0),
+
+    # Renal: creatinine 88.42 umol/L = 1 mg/dL, urea nitrogen 1 mmol/L = 2.801 mg/dL
+    ("creatinine", "umol/l"): (1 / 88.42, 0.0),
+    ("bun", "mmol/l"): (2.801, 0.0),
+
+    # Hepatic: bilirubin 17.1 umol/L = 1 mg/dL
+    ("bilirubin", "umol/l"): (1 / 17.1, 0.0),
+
+    # Electrolytes: monovalent ions are 1:1, divalent use molar mass
+    ("sodium", "mmol/l"): (1.0, 0.0),
+    ("potassium", "mmol/l"): (1.0, 0.0),
+    ("calcium", "mmol/l"): (4.008, 0.0),
+    ("phosphorus", "mmol/l"): (3.097, 0.0),
+}
+
+
+def unit_regex(*units: str) -> str:
+    """
+    Alternation of every printed spelling of `units` (normalized keys), or of
+    all known spellings if none are given. Longest first, so "mg%" wins over "%".
+    """
+    spellings = [alias for alias, unit in UNIT_ALIASES.items() if not units or unit in units]
+    return "(?:" + "|".join(sorted(map(re.escape, spellings), key=len, reverse=True)) + ")"
+
+
+UNIT_PATTERN = re.compile(r"\s*(" + unit_regex() + r")")
+
+
+def normalize_unit(unit: Optional[str]) -> Optional[str]:
+    """
+    Map a printed unit spelling to its normalized key, or None if unknown.
+    """
+    if not unit:
+        return None
+    return UNIT_ALIASES.get(unit.strip().lower().replace(" ", ""))
+
+
+def parse_unit(text: str, pos: int) -> Optional[str]:
+    """
+    Read the unit printed directly after a value ending at `pos`.
+    """
+    match = UNIT_PATTERN.match(text, pos)
+    if match:
+        return normalize_unit(match.group(1))
+    return None
+
+
+def get_conversion(biomarker: str, unit: Optional[str]) -> Tuple[float, float]:
+    """
+    Return the (scale, offset) that converts `unit` into the canonical unit.
+    Unknown or already-canonical units convert with the identity.
+    """
+    key = normalize_unit(unit)
+    if key is None:
+        return (1.0, 0.0)
+    return CONVERSION_FACTORS.get((biomarker, key), (1.0, 0.0))
+
+
+def to_canonical(biomarker: str, value: float, unit: Optional[str]) -> Tuple[float, str]:
+    """
+    Convert a single value to the canonical unit for `biomarker`.
+    """
+    scale, offset = get_conversion(biomarker, unit)
+    converted = value * scale + offset
+    if (scale, offset) != (1.0, 0.0):
+        converted = round(converted, 2)
+    return converted, CANONICAL_UNITS.get(biomarker, unit or "")
+
+
+def convert_frame(df, biomarker_col: str = "biomarker", value_col: str = "value",
+                  unit_col: str = "unit"):
+    """
+    Vectorized conversion of a long-format DataFrame of historical results.
+
+    Adds `canonical_value` and `canonical_unit` columns; the original value and
+    unit columns are kept untouched.
+    """
+    import pandas as pd
+
+    factors = pd.DataFrame(
+        [(b, u, s, o) for (b, u), (s, o) in CONVERSION_FACTORS.items()],
+        columns=[biomarker_col, "_unit_key", "_scale", "_offset"]
+    )
+
+    out = df.copy()
+    out["_unit_key"] = out[unit_col].astype("string").str.lower().str.replace(" ", "", regex=False).map(UNIT_ALIASES)
+    out = out.merge(factors, on=[biomarker_col, "_unit_key"], how="left")
+    out["_scale"] = out["_scale"].fillna(1.0)
+    out["_offset"] = out["_offset"].fillna(0.0)
+
+    out["canonical_value"] = pd.to_numeric(out[value_col], errors="coerce") * out["_scale"] + out["_offset"]
+    out["canonical_unit"] = out[biomarker_col].map(CANONICAL_UNITS).fillna(out[unit_col])
+
+    out.index = df.index
+    return out.drop(columns=["_unit_key", "_scale", "_offset"])
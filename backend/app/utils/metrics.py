@@ -1,9 +1,97 @@
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+# Classification metrics from one confusion matrix, computed with NumPy
+# (bincount + array arithmetic) so large evaluation sets cost one pass.
+# Undefined ratios (no predictions / no support for a class) are 0.
+
+
+def encode_labels(y_true: Sequence, y_pred: Sequence, labels: Sequence = None):
+    """
+    (true indices, predicted indices, labels). Labels default to the
+    sorted union of both sequences.
+    """
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    if labels is None:
+        labels = np.unique(np.concatenate([y_true, y_pred]))
+    labels = list(labels)
+    lookup = {label: i for i, label in enumerate(labels)}
+    true_idx = np.fromiter((lookup[v] for v in y_true.tolist()), dtype=np.int64, count=len(y_true))
+    pred_idx = np.fromiter((lookup[v] for v in y_pred.tolist()), dtype=np.int64, count=len(y_pred))
+    return true_idx, pred_idx, labels
+
+
+def confusion_matrix(true_idx: np.ndarray, pred_idx: np.ndarray, n_classes: int) -> np.ndarray:
+    """
+    (n_classes, n_classes) counts; rows are true classes, columns predictions.
+    """
+    return np.bincount(true_idx * n_classes + pred_idx, minlength=n_classes * n_classes).reshape(n_classes, n_classes)
+
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    return np.divide(numerator, denominator, out=np.zeros(len(numerator), dtype=np.float64),
+                     where=denominator > 0)
+
+
+def classification_report(y_true: Sequence, y_pred: Sequence, labels: Sequence = None) -> Dict:
+    """
+    Accuracy, per-class precision/recall/f1/support, macro and weighted
+    averages, and the confusion matrix, as plain JSON-ready types.
+    """
+    true_idx, pred_idx, labels = encode_labels(y_true, y_pred, labels)
+    cm = confusion_matrix(true_idx, pred_idx, len(labels))
+
+    tp = np.diag(cm).astype(np.float64)
+    support = cm.sum(axis=1).astype(np.float64)
+    predicted = cm.sum(axis=0).astype(np.float64)
+    precision = _safe_divide(tp, predicted)
+    recall = _safe_divide(tp, support)
+    f1 = _safe_divide(2 * precision * recall, precision + recall)
+    weights = support / support.sum() if support.sum() else support
+
+    def average(weighting):
+        return {
+            "precision": float(precision @ weighting),
+            "recall": float(recall @ weighting),
+            "f1": float(f1 @ weighting),
+        }
+
+    return {
+        "accuracy": float(tp.sum() / cm.sum()) if cm.sum() else 0.0,
+        "samples": int(cm.sum()),
+        "macro": average(np.full(len(labels), 1 / len(labels))),
+        "weighted": average(weights),
+        "per_class": {
+            str(label): {
+                "precision": float(precision[i]),
+                "recall": float(recall[i]),
+                "f1": float(f1[i]),
+                "support": int(support[i]),
+            }
+            for i, label in enumerate(labels)
+        },
+        "confusion_matrix": {"labels": [str(label) for label in labels], "matrix": cm.tolist()},
+    }
+
 
 def evaluate(y_true, y_pred):
+    report = classification_report(y_true, y_pred)
     return {
-        "accuracy": accuracy_score(y_true, y_pred),
-        "precision": precision_score(y_true, y_pred, average="weighted"),
-        "recall": recall_score(y_true, y_pred, average="weighted"),
-        "f1": f1_score(y_true, y_pred, average="weighted")
+        "accuracy": report["accuracy"],
+        "precision": report["weighted"]["precision"],
+        "recall": report["weighted"]["recall"],
+        "f1": report["weighted"]["f1"]
     }
+
+
+def metric_deltas(current: Dict, previous: Dict, keys: List[str] = ("accuracy",)) -> Dict:
+    """
+    current - previous for top-level metrics and macro/weighted f1.
+    """
+    deltas = {key: current[key] - previous[key] for key in keys if key in current and key in previous}
+    for average in ("macro", "weighted"):
+        if average in current and average in previous:
+            deltas[f"{average}_f1"] = current[average]["f1"] - previous[average]["f1"]
+    return deltas
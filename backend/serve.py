@@ -0,0 +1,154 @@
+import argparse
+import gc
+import importlib
+import os
+import signal
+import socket
+import sys
+import time
+
+# Run from backend/ (instead of `uvicorn app.main:app --workers N`):
+#   python serve.py --workers 4 --port 8000
+#   python serve.py --workers 4 --mmap-weights
+#
+# Pre-fork server. `uvicorn --workers N` starts N fresh interpreters that
+# each import the app and load their own copy of every model. Here the
+# master imports the app once, so the models are loaded once, then forks the
+# workers, which share the listening socket. Forked workers share the
+# master's memory copy-on-write: model weights are only read, so their pages
+# stay shared. gc.freeze() moves everything loaded so far out of the
+# collector's reach, so GC passes in the workers do not write to (and copy)
+# those pages. The app only loads the numeric model, knowledge base and meal
+# index on first use, so preload_services() loads them before the freeze;
+# otherwise every worker would build its own copy after fork.
+#
+# --mmap-weights (config.MMAP_WEIGHTS) also maps model.safetensors instead of
+# reading it, so the weights live in the page cache and are shared even with
+# processes that load the model on their own.
+#
+# The master never runs inference: torch thread pools started before fork
+# are not usable in the children.
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pre-fork API server with shared model memory")
+    parser.add_argument("--app", default="app.main:app", help="module:attribute of the ASGI app")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--mmap-weights", action="store_true", help="Map safetensors weights instead of copying")
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args()
+
+
+def preload(app_path: str):
+    module_name, _, attribute = app_path.partition(":")
+    return getattr(importlib.import_module(module_name), attribute or "app")
+
+
+def preload_services() -> None:
+    """
+    Load the lazily-initialized data before fork so workers share it too.
+    """
+    from app.services.knowledge_base import get_knowledge_base
+    from app.services.meal_embeddings import get_index
+    from app.services.numeric_model_service import load_numeric_model
+
+    for name, load in (("numeric model", load_numeric_model),
+                       ("knowledge base", get_knowledge_base),
+                       ("meal index", get_index)):
+        try:
+            if load() is None:
+                print(f"⚠️  {name} not available; workers will load it on demand")
+        except Exception as e:
+            print(f"⚠️  {name} preload error: {e}")
+
+
+def bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, index: int, args) -> None:
+    import uvicorn
+    from app.services.inference_threads import configure_forked_worker
+
+    gc.enable()
+    layout = configure_forked_worker(index, args.workers)
+    print(f"🚀 Worker {index} (pid {os.getpid()}): cores {layout['cores']}, {layout['intra_op_threads']} threads")
+    server = uvicorn.Server(uvicorn.Config(app, log_level=args.log_level))
+    server.run(sockets=[sock])
+
+
+def spawn(app, sock: socket.socket, index: int, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(app, sock, index, args)
+        except Exception as e:
+            print(f"Worker {index} error: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    # Settings are read when app.config is first imported
+    os.environ["NUTRICARE_WORKERS"] = str(args.workers)
+    if args.mmap_weights:
+        os.environ["NUTRICARE_MMAP_WEIGHTS"] = "1"
+
+    from app.services.inference_threads import configure_process
+    configure_process(workers=args.workers, pin=False)  # workers pin themselves after fork
+
+    start = time.perf_counter()
+    app = preload(args.app)
+    preload_services()
+    import uvicorn  # noqa: F401  imported before fork so workers share it too
+    gc.collect()
+    gc.disable()
+    gc.freeze()
+    print(f"✅ Preloaded {args.app} in {time.perf_counter() - start:.1f}s (pid {os.getpid()})")
+
+    sock = bind(args.host, args.port)
+    workers = {spawn(app, sock, index, args): index for index in range(args.workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = workers.pop(pid, None)
+        if index is None:
+            continue
+        if not stopping:
+            # Replacement forks from the already-loaded master: no reload
+            print(f"⚠️  Worker {index} (pid {pid}) exited with status {status}; restarting")
+            time.sleep(1)
+            workers[spawn(app, sock, index, args)] = index
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
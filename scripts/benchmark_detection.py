@@ -0,0 +1,95 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Run from the repository root: python scripts/benchmark_detection.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.app.services.disease_rules import CONDITIONS, biomarker_frame, detect_many, evaluate, score_frame
+from backend.app.services.medical_parser import extract_biomarkers
+
+# Synthetic cohort: (biomarker, mean, sd, fraction of reports that measured it)
+COHORT_DISTRIBUTIONS = [
+    ("fasting_glucose", 105, 25, 0.7),
+    ("hba1c", 5.9, 0.9, 0.4),
+    ("random_glucose", 140, 40, 0.2),
+    ("systolic_bp", 130, 18, 0.8),
+    ("diastolic_bp", 82, 10, 0.8),
+    ("total_cholesterol", 200, 40, 0.6),
+    ("ldl", 120, 35, 0.6),
+    ("tsh", 2.5, 2.0, 0.3),
+    ("ck_mb", 15, 8, 0.1),
+    ("creatinine", 1.0, 0.35, 0.5),
+    ("bun", 16, 7, 0.5),
+    ("gfr", 85, 25, 0.4),
+    ("alt", 35, 25, 0.5),
+    ("ast", 30, 20, 0.5),
+    ("bilirubin", 0.8, 0.5, 0.4),
+]
+
+
+def synthetic_cohort(size: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for biomarker, mean, sd, measured in COHORT_DISTRIBUTIONS:
+        values = np.abs(rng.normal(mean, sd, size))
+        values[rng.random(size) > measured] = np.nan
+        columns[biomarker] = values.round(2)
+    return pd.DataFrame(columns)
+
+
+def frame_to_reports(frame: pd.DataFrame) -> list:
+    """
+    Back to the per-report dict shape the upload path produces.
+    """
+    reports = []
+    for row in frame.to_dict("records"):
+        report = {k: {"value": v} for k, v in row.items() if not pd.isna(v) and not k.endswith("_bp")}
+        if not pd.isna(row.get("systolic_bp")) and not pd.isna(row.get("diastolic_bp")):
+            report["blood_pressure"] = {"value": f"{int(row['systolic_bp'])}/{int(row['diastolic_bp'])}"}
+        reports.append(report)
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-report vs vectorized disease rule scoring")
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--texts", default="training/data/medical_text_processed.csv")
+    args = parser.parse_args()
+
+    reports = frame_to_reports(synthetic_cohort(args.size))
+    if os.path.exists(args.texts):
+        # Include the parsed synthetic report texts so the parser output shape is covered
+        texts = pd.read_csv(args.texts)["text"].dropna()
+        reports += [extract_biomarkers(text) for text in texts]
+    print(f"Cohort: {len(reports)} reports")
+
+    start = time.perf_counter()
+    looped = [evaluate(report) for report in reports]
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    frame = biomarker_frame(reports)
+    frame_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    scores = score_frame(frame)
+    score_seconds = time.perf_counter() - start
+
+    batched = detect_many(reports)
+    mismatches = sum(sorted(a) != sorted(b) for a, b in zip(looped, batched))
+
+    print(f"Per-report evaluate: {loop_seconds:.3f}s ({len(reports) / loop_seconds:,.0f} reports/s)")
+    print(f"Build frame:         {frame_seconds:.3f}s")
+    print(f"Vectorized scoring:  {score_seconds:.3f}s ({len(reports) / score_seconds:,.0f} reports/s)")
+    print(f"Mismatches: {mismatches}")
+    print("\nPrevalence:")
+    for condition in CONDITIONS:
+        print(f"  {condition:15} {scores[condition].mean():.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Run from the repository root:
+#   python scripts/benchmark_inference_threads.py
+#   python scripts/benchmark_inference_threads.py --cores 8 --seconds 20 --model backend/app/models/disease_student
+#
+# Sweeps server layouts (workers x intra-op threads) for the disease text
+# classifier on a given number of cores. Each worker is a separate process
+# configured the way the server configures itself (inference_threads.py,
+# via the NUTRICARE_* settings) and sends single-text requests back to back
+# for a fixed time. Every layout with workers x threads <= cores is tried
+# pinned; "unpinned" rows keep every worker at the full core count, which is
+# what uvicorn workers did before, for comparison.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def layouts(cores: int):
+    threads = [t for t in (1, 2, 4, 8, 16, 32, 64) if t <= cores]
+    for workers in range(1, cores + 1):
+        for t in threads:
+            if workers * t <= cores:
+                yield workers, t, True
+        if workers > 1:
+            yield workers, cores, False
+
+
+def child(args):
+    # Restrict to the cores under test before anything reads the affinity mask
+    os.sched_setaffinity(0, sorted(os.sched_getaffinity(0))[:args.cores])
+
+    from backend.app.services.inference_threads import configure_process
+    from backend.app.services.model_bundle import load_bundle
+    from training.distill_classifier import TEACHER_LABELS, load_split
+
+    layout = configure_process(worker_index=args.worker if args.pin else None, workers=args.workers,
+                               pin=bool(args.pin))
+    classifier = load_bundle(args.model, fallback_labels=dict(enumerate(TEACHER_LABELS))).classifier
+    texts = list(load_split()[1]["text"])
+    classifier.predict_proba(texts[:1])  # warm up
+
+    print("ready", flush=True)
+    sys.stdin.readline()  # all workers start together
+
+    latencies = []
+    deadline = time.perf_counter() + args.seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        classifier.predict_proba([texts[len(latencies) % len(texts)]])
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(json.dumps({"layout": layout, "latencies": latencies}), flush=True)
+
+
+def run_layout(workers: int, threads: int, pin: bool, args) -> dict:
+    env = dict(os.environ, NUTRICARE_WORKERS=str(workers), NUTRICARE_INFERENCE_THREADS=str(threads),
+               NUTRICARE_PIN_WORKER_CORES="1" if pin else "0")
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        env.pop(variable, None)
+    procs = [
+        subprocess.Popen(
+            [sys.executable, __file__, "--child", "--model", args.model, "--cores", str(args.cores),
+             "--seconds", str(args.seconds), "--workers", str(workers), "--worker", str(i),
+             "--pin", str(int(pin))],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, env=env
+        )
+        for i in range(workers)
+    ]
+    for proc in procs:
+        proc.stdout.readline()
+    for proc in procs:
+        proc.stdin.write("go\n")
+        proc.stdin.flush()
+    results = [json.loads(proc.communicate()[0].strip().splitlines()[-1]) for proc in procs]
+
+    latencies = np.concatenate([r["latencies"] for r in results])
+    return {
+        "workers": workers,
+        "threads": threads,
+        "pinned": pin,
+        "requests_per_second": round(len(latencies) / args.seconds, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "cores": [r["layout"]["cores"] for r in results],
+    }
+
+
+def main():
+    from backend.app.config import DISEASE_MODEL_DIR
+
+    parser = argparse.ArgumentParser(description="Sweep workers x threads for CPU inference")
+    parser.add_argument("--model", default=DISEASE_MODEL_DIR, help="Disease model bundle directory")
+    parser.add_argument("--cores", type=int, default=len(os.sched_getaffinity(0)))
+    parser.add_argument("--seconds", type=float, default=10.0, help="Load duration per layout")
+    parser.add_argument("--max-p95-ms", type=float, default=None,
+                        help="Only recommend layouts whose p95 latency is at most this")
+    parser.add_argument("--json", default=None, help="Write all results here")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--workers", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--worker", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--pin", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    print(f"🔬 {args.model} on {args.cores} cores, {args.seconds:.0f}s per layout")
+    print(f"{'workers':>7} {'threads':>7} {'pinned':>6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    results = []
+    for workers, threads, pin in layouts(args.cores):
+        try:
+            row = run_layout(workers, threads, pin, args)
+        except Exception as e:
+            print(f"❌ {workers}x{threads} error: {e}")
+            continue
+        results.append(row)
+        print(f"{workers:>7} {threads:>7} {str(pin):>6} {row['requests_per_second']:>9,.1f} "
+              f"{row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f}")
+
+    eligible = [r for r in results if args.max_p95_ms is None or r["p95_ms"] <= args.max_p95_ms]
+    if eligible:
+        best = max(eligible, key=lambda r: r["requests_per_second"])
+        print(f"\n✅ Best layout: WEB_CONCURRENCY={best['workers']} NUTRICARE_INFERENCE_THREADS={best['threads']} "
+              f"NUTRICARE_PIN_WORKER_CORES={int(best['pinned'])} "
+              f"({best['requests_per_second']:,.1f} req/s, p95 {best['p95_ms']:.2f} ms)")
+    else:
+        print("\n⚠️  No layout met the latency limit")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"model": args.model, "cores": args.cores, "seconds": args.seconds, "results": results},
+                      f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Run from the repository root: python scripts/benchmark_numeric_model.py
+# Compares the joblib pickle with the compact export (training/export_forest.py):
+# cold load time and memory in a fresh process each, then single-row and
+# batch latency.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def load(kind: str, args):
+    if kind == "pickle":
+        import joblib
+        model = joblib.load(args.model, mmap_mode="r")
+        scaler = joblib.load(args.scaler, mmap_mode="r")
+        model.n_jobs = 1
+        return lambda rows: model.predict_proba(scaler.transform(rows))
+    from backend.app.services.compact_forest import CompactForest
+    forest = CompactForest.load(args.forest)
+    return forest.predict_proba
+
+
+def child(kind: str, args):
+    """
+    Measured in a fresh interpreter so import and page cache effects are
+    comparable between the two formats.
+    """
+    import sklearn  # noqa: F401  imported up front so the pickle run does not pay for it
+    baseline = rss_mb()
+    start = time.perf_counter()
+    predict = load(kind, args)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    # [BMI, Age, HighBP, HighChol, PhysActivity, GenHlth]
+    rng = np.random.default_rng(0)
+    rows = np.c_[rng.normal(28, 6, args.batch), rng.integers(1, 14, args.batch),
+                 rng.integers(0, 2, (args.batch, 3)), rng.integers(1, 6, args.batch)]
+    predict(rows[:1])  # warm up
+    start = time.perf_counter()
+    for i in range(args.repeats):
+        predict(rows[i:i + 1])
+    single_ms = (time.perf_counter() - start) / args.repeats * 1000
+    start = time.perf_counter()
+    predict(rows)
+    batch_ms = (time.perf_counter() - start) * 1000
+
+    print(json.dumps({"load_ms": load_ms, "rss_mb": rss_mb() - baseline,
+                      "single_ms": single_ms, "batch_ms": batch_ms}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pickled vs compact numeric model")
+    parser.add_argument("--model", default="training/models/ml_model.pkl")
+    parser.add_argument("--scaler", default="training/models/scaler.pkl")
+    parser.add_argument("--forest", default="training/models/forest")
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--child", choices=["pickle", "compact"])
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args)
+        return
+
+    def size_mb(path):
+        if os.path.isdir(path):
+            return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) / 1e6
+        return os.path.getsize(path) / 1e6
+
+    print(f"{'':10} {'disk MB':>8} {'load ms':>8} {'RSS MB':>8} {'1 row ms':>9} {args.batch:>6} rows ms")
+    for kind, path in (("pickle", args.model), ("compact", args.forest)):
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", kind] + sys.argv[1:],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{kind:10} {size_mb(path):8.1f} {result['load_ms']:8.1f} {result['rss_mb']:8.1f} "
+              f"{result['single_ms']:9.3f} {result['batch_ms']:13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,20 @@
+import numpy as np
 import pandas as pd
 
-df = pd.read_csv("data/raw/diabetes_012_health_indicators_BRFSS2015.csv")
-
-selected = df[[
-    "BMI",
-    "Age",
-    "HighBP",
-    "HighChol",
-    "PhysActivity",
-    "GenHlth",
-    "Diabetes_012"
-]]
+# Only the model columns, parsed as float32 instead of the default float64
+selected = pd.read_csv(
+    "data/raw/diabetes_012_health_indicators_BRFSS2015.csv",
+    usecols=[
+        "BMI",
+        "Age",
+        "HighBP",
+        "HighChol",
+        "PhysActivity",
+        "GenHlth",
+        "Diabetes_012"
+    ],
+    dtype=np.float32
+)
 
 selected.fillna(0, inplace=True)
 
@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+# Run from the repository root:
+#   python scripts/measure_worker_memory.py --workers 4
+#   python scripts/measure_worker_memory.py --workers 4 --modes uvicorn preload mmap --json memory.json
+#
+# Starts the API once per mode, sends a few predictions so every worker has
+# run the model, then reads /proc/<pid>/smaps_rollup for the server and all
+# of its child processes:
+#   uvicorn  `uvicorn app.main:app --workers N`: each worker loads its own models
+#   preload  backend/serve.py: models loaded once in the master, workers forked
+#   mmap     backend/serve.py --mmap-weights: safetensors weights mapped from the page cache
+# RSS counts shared pages in full for every process; PSS divides each shared
+# page between the processes mapping it, so total PSS is the real footprint.
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+SAMPLE_TEXT = "Fasting glucose 182 mg/dL, HbA1c 8.1%. Blood pressure 150/95."
+
+
+def smaps_rollup(pid: int) -> dict:
+    """
+    Memory totals for one process in MB.
+    """
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in FIELDS:
+                values[key] = int(rest.split()[0]) / 1024
+    return values
+
+
+def process_tree(pid: int) -> list:
+    pids = [pid]
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            for child in f.read().split():
+                pids.extend(process_tree(int(child)))
+    return pids
+
+
+def command(mode: str, args) -> list:
+    if mode == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", args.app, "--port", str(args.port), "--workers", str(args.workers)]
+    cmd = [sys.executable, "serve.py", "--app", args.app, "--port", str(args.port), "--workers", str(args.workers)]
+    return cmd + (["--mmap-weights"] if mode == "mmap" else [])
+
+
+def wait_ready(url: str, proc: subprocess.Popen, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with status {proc.returncode}")
+        try:
+            urllib.request.urlopen(url, timeout=2)
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise TimeoutError(f"server not ready after {timeout:.0f}s")
+
+
+def predict(url: str):
+    request = urllib.request.Request(url, data=json.dumps({"text": SAMPLE_TEXT}).encode(),
+                                     headers={"Content-Type": "application/json"})
+    urllib.request.urlopen(request, timeout=30).read()
+
+
+def measure(mode: str, args) -> dict:
+    url = f"http://127.0.0.1:{args.port}/"
+    proc = subprocess.Popen(command(mode, args), cwd=BACKEND_DIR, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(url, proc, args.timeout)
+        # Fresh connections are spread over the workers by the kernel; enough of
+        # them and every worker has run the model at least once
+        for _ in range(args.requests):
+            predict(url)
+        time.sleep(1)
+        processes = []
+        for pid in process_tree(proc.pid):
+            try:
+                processes.append({"pid": pid, **smaps_rollup(pid)})
+            except OSError:
+                continue
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=30)
+
+    return {
+        "mode": mode,
+        "workers": args.workers,
+        "processes": processes,
+        "total_rss_mb": round(sum(p["Rss"] for p in processes), 1),
+        "total_pss_mb": round(sum(p["Pss"] for p in processes), 1),
+        "mean_worker_pss_mb": round(sum(p["Pss"] for p in processes[1:]) / max(1, len(processes) - 1), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker RSS/PSS of the API server")
+    parser.add_argument("--modes", nargs="+", default=["uvicorn", "preload", "mmap"])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--app", default="app.main:app")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--requests", type=int, default=40, help="Predictions sent before measuring")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for startup")
+    parser.add_argument("--json", default=None, help="Write all results here")
+    args = parser.parse_args()
+
+    results = []
+    for mode in args.modes:
+        try:
+            result = measure(mode, args)
+        except Exception as e:
+            print(f"❌ {mode} error: {e}")
+            continue
+        results.append(result)
+        print(f"\n📏 {mode}: {len(result['processes'])} processes, total RSS {result['total_rss_mb']:,.1f} MB, "
+              f"total PSS {result['total_pss_mb']:,.1f} MB")
+        print(f"   {'pid':>8} {'RSS':>9} {'PSS':>9} {'shared':>9} {'private':>9}")
+        for p in result["processes"]:
+            shared = p.get("Shared_Clean", 0) + p.get("Shared_Dirty", 0)
+            private = p.get("Private_Clean", 0) + p.get("Private_Dirty", 0)
+            print(f"   {p['pid']:>8} {p['Rss']:>9.1f} {p['Pss']:>9.1f} {shared:>9.1f} {private:>9.1f}")
+
+    if len(results) > 1:
+        baseline = results[0]["total_pss_mb"]
+        print()
+        for result in results[1:]:
+            saved = baseline - result["total_pss_mb"]
+            print(f"✅ {result['mode']} vs {results[0]['mode']}: {saved:,.1f} MB less PSS ({saved / baseline:.0%})")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -77,6 +77,734 @@ def test_disease_detection():
     print(f"\n✅ Found {len(found)}/{len(expected_diseases)} key diseases")
     return len(found) >= 2
 
+def test_unit_conversion():
+    """Test that SI-unit reports are converted to canonical units"""
+    print("\n" + "="*60)
+    print("Testing Unit Conversion")
+    print("="*60 + "\n")
+    
+    sample_text = """
+    Fasting Glucose: 7.8 mmol/L
+    Total Cholesterol: 6.5 mmol/L
+    Creatinine: 110 umol/L
+    """
+    
+    from backend.app.services.medical_parser import extract_biomarkers
+    
+    biomarkers = extract_biomarkers(sample_text)
+    
+    print("✅ Converted Biomarkers:")
+    for marker, data in biomarkers.items():
+        print(f"   {marker:20} = {data['reported_value']} {data['reported_unit']} -> {data['value']} {data['unit']}")
+    
+    glucose = biomarkers.get("fasting_glucose", {})
+    cholesterol = biomarkers.get("total_cholesterol", {})
+    creatinine = biomarkers.get("creatinine", {})
+    
+    # Older reports print mg% and gm% (mg/dL and g/dL)
+    legacy = extract_biomarkers("Glucose 110 mg%\nHemoglobin 11.2 gm%\nCalcium 9.1 mg%")
+    print(f"✅ Legacy units: {({k: (v['reported_unit'], v['value']) for k, v in legacy.items()})}")
+    
+    return (
+        glucose.get("unit") == "mg/dl" and 140 <= glucose.get("value", 0) <= 141
+        and cholesterol.get("reported_unit") == "mmol/l" and cholesterol.get("value", 0) > 240
+        and 1.2 <= creatinine.get("value", 0) <= 1.3
+        and legacy.get("fasting_glucose", {}).get("value") == 110.0
+        and legacy.get("fasting_glucose", {}).get("reported_unit") == "mg/dl"
+        and legacy.get("hemoglobin", {}).get("value") == 11.2
+        and legacy.get("calcium", {}).get("value") == 9.1
+    )
+
+def test_multi_condition_meal_selection():
+    """Test that meals satisfy every detected condition, not just the first"""
+    print("\n" + "="*60)
+    print("Testing Multi-Condition Meal Selection")
+    print("="*60 + "\n")
+    
+    from backend.app.services.knowledge_base import get_knowledge_base
+    
+    kb = get_knowledge_base()
+    conditions = ["diabetes", "hypertension"]
+    
+    violations = []
+    for meal_type in ["breakfast", "lunch", "dinner", "snack"]:
+        names = kb.select_meals(meal_type, conditions)
+        print(f"✅ {meal_type:10} {len(names)} options")
+        for meal in kb.meals.values():
+            if meal["name"] in names and {"high_sodium", "high_sugar"} & set(meal["tags"]):
+                violations.append(meal["name"])
+    
+    if violations:
+        print(f"❌ Incompatible meals selected: {violations}")
+    return not violations
+
+def test_renal_hepatic_detection():
+    """Test kidney/liver detection and that batch scoring matches per-report scoring"""
+    print("\n" + "="*60)
+    print("Testing Renal and Hepatic Detection")
+    print("="*60 + "\n")
+    
+    from backend.app.services.medical_parser import extract_biomarkers
+    from backend.app.services.disease_rules import detect_many, evaluate
+    
+    reports = [
+        extract_biomarkers("Blood urea nitrogen: 38 mg/dl. Creatinine 2.1 mg/dl. eGFR 42"),
+        extract_biomarkers("SGPT 120 U/L, AST 95 U/L, total bilirubin 1.0 mg/dl"),
+        extract_biomarkers("Creatinine 0.9 mg/dl, ALT 30 U/L, blood pressure 150/95"),
+    ]
+    expected = [["kidney_disease"], ["liver_disease"], ["hypertension"]]
+    
+    single = [evaluate(report) for report in reports]
+    batch = detect_many(reports)
+    for report, result in zip(reports, single):
+        print(f"✅ {sorted(report)} -> {result}")
+    
+    if single != expected or batch != expected:
+        print(f"❌ Expected {expected}, got {single} / {batch}")
+        return False
+    
+    # Liver thresholds are multiples of the same ULN is_abnormal uses
+    from backend.app.services.disease_rules import ALT_ULN, DETECTION_RULES, TRANSAMINASE_ULN_MULTIPLE
+    from backend.app.services.medical_parser import is_abnormal
+    alt_threshold = next(t for c, b, _, t in DETECTION_RULES if b == "alt")
+    raised = extract_biomarkers(f"ALT {ALT_ULN + 30} U/L")    # abnormal, below 2x ULN
+    doubled = extract_biomarkers(f"ALT {2 * ALT_ULN} U/L")
+    print(f"✅ ALT ULN {ALT_ULN}, liver threshold {alt_threshold}")
+    return (
+        alt_threshold == TRANSAMINASE_ULN_MULTIPLE * ALT_ULN
+        and is_abnormal("alt", ALT_ULN + 1) and not is_abnormal("alt", ALT_ULN)
+        and raised["alt"]["abnormal"] and evaluate(raised) == []
+        and evaluate(doubled) == ["liver_disease"]
+    )
+
+def test_risk_scoring():
+    """Test risk scoring uses the extracted biomarker keys and detected conditions"""
+    print("\n" + "="*60)
+    print("Testing Risk Scoring")
+    print("="*60 + "\n")
+    
+    from backend.app.services.risk_scoring import score
+    
+    biomarkers = {
+        "fasting_glucose": {"value": 150, "abnormal": True},
+        "total_cholesterol": {"value": 260, "abnormal": True},
+    }
+    result = score(["diabetes"], biomarkers)
+    for factor in result["factors"]:
+        print(f"✅ +{factor['points']} {factor['factor']} ({factor['evidence']})")
+    print(f"   Score {result['score']} -> {result['level']}")
+    
+    factors = {factor["factor"] for factor in result["factors"]}
+    return {"diabetes", "hyperglycemia", "high_cholesterol"} <= factors and result["level"] == "high"
+
+def test_compact_forest_parity():
+    """Test the exported node arrays predict exactly like the sklearn forest"""
+    print("\n" + "="*60)
+    print("Testing Compact Forest Parity")
+    print("="*60 + "\n")
+    
+    import os
+    import tempfile
+    import numpy as np
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+    from backend.app.services.compact_forest import CompactForest, export_forest
+    
+    rng = np.random.default_rng(0)
+    X = np.c_[rng.normal(28, 6, 2000), rng.integers(1, 14, 2000), rng.integers(0, 2, (2000, 3)), rng.integers(1, 6, 2000)]
+    y = np.clip((X[:, 0] > 30).astype(int) + X[:, 2].astype(int) + rng.integers(-1, 2, 2000), 0, 2)
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=20, max_depth=8, random_state=0).fit(scaler.transform(X), y)
+    
+    with tempfile.TemporaryDirectory() as directory:
+        import joblib
+        pickles = {"model": os.path.join(directory, "ml_model.pkl"), "scaler": os.path.join(directory, "scaler.pkl")}
+        joblib.dump(model, pickles["model"])
+        joblib.dump(scaler, pickles["scaler"])
+        export_dir = os.path.join(directory, "forest")
+        export_forest(model, scaler, export_dir, sources=pickles)
+        compact = CompactForest.load(export_dir).predict_proba(X)
+        current = CompactForest.stale_reason(export_dir, pickles) is None
+        # A retrained forest saved over ml_model.pkl must not be shadowed by the old export
+        joblib.dump(RandomForestClassifier(n_estimators=5, random_state=1).fit(X, y), pickles["model"])
+        stale = CompactForest.stale_reason(export_dir, pickles)
+    expected = model.predict_proba(scaler.transform(X))
+    
+    max_diff = np.abs(compact - expected).max()
+    print(f"✅ max |Δp| = {max_diff:.2e} over {len(X)} rows")
+    print(f"✅ export current: {current}, after retraining: {stale}")
+    return max_diff < 1e-6 and (compact.argmax(axis=1) == expected.argmax(axis=1)).all() and current and bool(stale)
+
+def test_classification_report():
+    """Test the vectorized metrics match sklearn and text models score only held-out rows"""
+    print("\n" + "="*60)
+    print("Testing Classification Report")
+    print("="*60 + "\n")
+    
+    import numpy as np
+    import pandas as pd
+    from sklearn import metrics
+    from backend.app.utils.metrics import classification_report, evaluate
+    from training.text_split import held_out_rows, split_manifest
+    
+    rng = np.random.default_rng(1)
+    labels = np.array(["cholesterol", "diabetes", "healthy", "hypertension", "thyroid"])
+    y_true = labels[rng.integers(0, 5, 5000)]
+    # "thyroid" is never predicted: its precision must be 0, not NaN
+    y_pred = np.where(rng.random(5000) < 0.6, y_true, labels[rng.integers(0, 4, 5000)])
+    
+    report = classification_report(y_true, y_pred)
+    precision, recall, f1, support = metrics.precision_recall_fscore_support(y_true, y_pred, labels=labels,
+                                                                             zero_division=0)
+    ours = np.array([[report["per_class"][label][k] for k in ("precision", "recall", "f1")] for label in labels])
+    per_class_ok = np.allclose(ours, np.c_[precision, recall, f1])
+    support_ok = [report["per_class"][label]["support"] for label in labels] == support.tolist()
+    matrix_ok = report["confusion_matrix"]["matrix"] == metrics.confusion_matrix(y_true, y_pred, labels=labels).tolist()
+    macro_ok = np.isclose(report["macro"]["f1"], metrics.f1_score(y_true, y_pred, average="macro", zero_division=0))
+    weighted = evaluate(y_true, y_pred)
+    weighted_ok = np.isclose(weighted["f1"], metrics.f1_score(y_true, y_pred, average="weighted", zero_division=0))
+    accuracy_ok = np.isclose(report["accuracy"], metrics.accuracy_score(y_true, y_pred))
+    print(f"✅ per-class {per_class_ok}, support {support_ok}, matrix {matrix_ok}, "
+          f"macro {macro_ok}, weighted {weighted_ok}, accuracy {accuracy_ok}")
+    
+    df = pd.DataFrame({"text": [f"report {i}" for i in range(10)], "label": ["a", "b"] * 5})
+    split = split_manifest(df.iloc[7:])
+    held_out = held_out_rows(df, split)
+    split_ok = list(held_out["text"]) == ["report 7", "report 8", "report 9"] and held_out_rows(df, None) is None
+    print(f"✅ held-out rows from bundle split: {list(held_out['text'])}")
+    
+    return all([per_class_ok, support_ok, matrix_ok, macro_ok, weighted_ok, accuracy_ok, split_ok])
+
+def test_shadow_evaluation():
+    """Test shadow submit, drop-when-full and the logged summary"""
+    print("\n" + "="*60)
+    print("Testing Shadow Evaluation")
+    print("="*60 + "\n")
+    
+    import os
+    import tempfile
+    import threading
+    import time
+    import numpy as np
+    from backend.app.services.shadow_inference import ShadowEvaluator
+    
+    release = threading.Event()
+    
+    class Candidate:
+        name = "candidate"
+        labels = ["diabetes", "healthy"]
+        
+        class classifier:
+            @staticmethod
+            def predict_proba(texts):
+                release.wait(5)  # hold the worker so the queue fills up
+                return np.array([[0.9, 0.1] if "glucose" in t else [0.2, 0.8] for t in texts])
+    
+    with tempfile.TemporaryDirectory() as directory:
+        shadow = ShadowEvaluator(Candidate(), fraction=1.0, queue_size=2,
+                                 store_path=os.path.join(directory, "shadow.db"))
+        accepted = [shadow.submit("glucose 190", "primary", "diabetes", 0.8, 5.0)]
+        time.sleep(0.2)  # the worker takes the first request and blocks in the candidate
+        accepted += [shadow.submit(text, "primary", "diabetes", 0.8, 5.0)
+                     for text in ("glucose 150", "normal report", "glucose 210")]
+        release.set()
+        
+        deadline = time.time() + 5
+        summary = shadow.summary()
+        while summary["logged"] < 3 and time.time() < deadline:
+            time.sleep(0.05)
+            summary = shadow.summary()
+    
+    print(f"✅ accepted {accepted}, logged {summary['logged']}, dropped {summary['dropped']}, "
+          f"agreement {summary['agreement']:.2f}, disagreements {summary['disagreements']}")
+    return (accepted == [True, True, True, False] and summary["logged"] == 3 and summary["dropped"] == 1
+            and abs(summary["agreement"] - 2 / 3) < 1e-9
+            and summary["disagreements"] == [{"primary": "diabetes", "candidate": "healthy", "count": 1}]
+            and summary["latency_delta_ms"] is not None)
+
+def test_model_bundles():
+    """Test bundle validation rejects mismatches and activation is shared between registries"""
+    print("\n" + "="*60)
+    print("Testing Model Bundles")
+    print("="*60 + "\n")
+    
+    import json
+    import os
+    import tempfile
+    import joblib
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+    from backend.app.services.model_bundle import (
+        BUNDLE_FILE, BundleError, ModelRegistry, load_bundle, validate, write_bundle
+    )
+    from backend.app.services.text_classifier import STUDENT_FILE
+    
+    labels = ["diabetes", "healthy", "thyroid"]
+    texts = ["glucose 190 high", "all values normal", "tsh 9 elevated"] * 3
+    pipeline = Pipeline([("tfidf", TfidfVectorizer()), ("lr", LogisticRegression())]).fit(texts, [0, 1, 2] * 3)
+    
+    def rejected(check) -> bool:
+        try:
+            check()
+        except BundleError as e:
+            print(f"✅ rejected: {e}")
+            return True
+        print("❌ mismatch was accepted")
+        return False
+    
+    class Tokenized:
+        """Stands in for a BERT classifier: labels plus a tokenizer with a vocabulary size"""
+        def __init__(self, vocab_size):
+            self.labels = labels
+            self.tokenizer = [None] * vocab_size
+    
+    with tempfile.TemporaryDirectory() as root:
+        directory = os.path.join(root, "student")
+        os.makedirs(directory)
+        joblib.dump({"pipeline": pipeline, "labels": labels}, os.path.join(directory, STUDENT_FILE))
+        write_bundle(directory, labels=labels, kind="tfidf")
+        loads = load_bundle(directory).labels == labels
+        
+        # A different label order than the weights were trained with
+        with open(os.path.join(directory, BUNDLE_FILE)) as f:
+            manifest = json.load(f)
+        swapped = dict(manifest, labels=["healthy", "diabetes", "thyroid"])
+        with open(os.path.join(directory, BUNDLE_FILE), "w") as f:
+            json.dump(swapped, f)
+        label_order = rejected(lambda: load_bundle(directory))
+        
+        # A tokenizer with another vocabulary than the bundle recorded
+        vocab = rejected(lambda: validate(directory, dict(manifest, files={}, tokenizer={"vocab_size": 30522}),
+                                          Tokenized(28996)))
+        
+        # A weights file of the wrong size (e.g. a partial copy)
+        with open(os.path.join(directory, BUNDLE_FILE), "w") as f:
+            json.dump(manifest, f)
+        with open(os.path.join(directory, STUDENT_FILE), "ab") as f:
+            f.write(b"\0")
+        size = rejected(lambda: load_bundle(directory))
+        
+        # Activation in one worker's registry reaches another sharing the state file
+        state = os.path.join(root, "active_model.json")
+        worker_a, worker_b = ModelRegistry(state), ModelRegistry(state)
+        for registry in (worker_a, worker_b):
+            for name in ("bert", "student"):
+                registry.add(type("Bundle", (), {"name": name, "describe": lambda self: {}})())
+        worker_a.activate("student")
+        shared = worker_b.active.name == "student" and ModelRegistry(state).describe()["active"] is None
+    
+    print(f"✅ loads {loads}, activation shared across workers: {shared}")
+    return all([loads, label_order, vocab, size, shared])
+
+def test_biomarker_store():
+    """Test report storage, date validation and the longitudinal queries"""
+    print("\n" + "="*60)
+    print("Testing Biomarker Store")
+    print("="*60 + "\n")
+    
+    import os
+    import tempfile
+    from backend.app.services import biomarker_store as store
+    
+    def glucose(value):
+        return {"glucose": {"value": value, "unit": "mg/dL", "abnormal": value >= 126},
+                "blood_pressure": {"value": "150/95"}}
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "store.db")
+        store.save_report("p1", glucose(180), conditions=["diabetes"], report_date="2024-01-15", path=path)
+        store.save_report("p1", glucose(130), report_date="2024-03-02", path=path)
+        store.save_report("p2", glucose(95), report_date="2024-03-20", path=path)
+        
+        rejected = []
+        for bad in [dict(patient_id="p1", report_date="15/01/2024"), dict(patient_id=None, report_date=None)]:
+            try:
+                store.save_report(bad["patient_id"], glucose(100), report_date=bad["report_date"], path=path)
+            except ValueError as e:
+                rejected.append(str(e))
+        
+        reports = store.list_reports("p1", path=path)
+        series = store.get_timeseries("p1", "glucose", start="2024-02-01", path=path)
+        trend = store.summarize_trend(store.get_timeseries("p1", "glucose", path=path))
+        cohort = store.cohort_aggregate("glucose", period="month", path=path)
+        systolic = store.get_timeseries("p1", "systolic_bp", path=path)
+    
+    from backend.app.services.medical_parser import extract_patient_info
+    printed = extract_patient_info("Patient Name: A Smith\nUHID: ab-1029\nAge: 54 Yr")
+    
+    print(f"✅ rejected: {rejected}")
+    print(f"✅ trend: {trend}, cohort: {[(c['period'], c['count']) for c in cohort]}")
+    return (
+        len(rejected) == 2
+        and [r["report_date"] for r in reports] == ["2024-01-15", "2024-03-02"]
+        and [p["value"] for p in series] == [130.0]
+        and trend["change"] == -50.0
+        and [(c["period"], c["count"], c["patients"]) for c in cohort] == [("2024-01", 1, 1), ("2024-03", 2, 2)]
+        and systolic[0]["value"] == 150 and systolic[0]["abnormal"]
+        and store.patient_key({"name": "Chanda Devi"}) == "chanda-devi"
+        and store.patient_key({}, " p9 ") == "p9"
+        and store.patient_key({}) is None
+        # Namesakes collide on the slug; a printed identifier keeps them apart
+        and store.patient_key({"name": "A. Smith"}) == store.patient_key({"name": "A Smith"})
+        and store.keyed_by_name({"name": "A Smith"}) and not store.keyed_by_name({"name": "A Smith"}, "p9")
+        and store.patient_key(printed) == "AB-1029" and not store.keyed_by_name(printed)
+    )
+
+def test_history_routes():
+    """Test the /api/history endpoints, including 400s for malformed dates"""
+    print("\n" + "="*60)
+    print("Testing History Routes")
+    print("="*60 + "\n")
+    
+    import os
+    import sys
+    import tempfile
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    
+    # Routes import app.* as when the API runs from backend/
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+    from app.routes.history import router
+    from app.services import biomarker_store as store
+    
+    api = FastAPI()
+    api.include_router(router)
+    client = TestClient(api)
+    
+    original = store.STORE_PATH
+    with tempfile.TemporaryDirectory() as directory:
+        store.STORE_PATH = os.path.join(directory, "store.db")
+        try:
+            for day, value in [("2024-01-10", 8.1), ("2024-04-10", 7.2)]:
+                store.save_report("p1", {"hba1c": {"value": value, "unit": "%"}}, report_date=day)
+            reports = client.get("/api/history/patients/p1/reports").json()
+            series = client.get("/api/history/patients/p1/biomarkers/HbA1c").json()
+            cohort = client.get("/api/history/cohort/hba1c", params={"period": "year"}).json()
+            bad_date = client.get("/api/history/patients/p1/biomarkers/hba1c", params={"start": "Jan 2024"})
+            bad_period = client.get("/api/history/cohort/hba1c", params={"period": "week"})
+        finally:
+            store.STORE_PATH = original
+    
+    print(f"✅ trend: {series['trend']}")
+    print(f"✅ bad date: {bad_date.status_code} {bad_date.json()['detail']}")
+    return (
+        len(reports["reports"]) == 2
+        and series["trend"]["change"] == -0.9
+        and cohort["stats"][0]["count"] == 2
+        and bad_date.status_code == 400
+        and bad_period.status_code == 400
+    )
+
+def test_narration_batching():
+    """Test narration batching, the cache, the timeout fallback and the bounded queue"""
+    print("\n" + "="*60)
+    print("Testing Narration Batching")
+    print("="*60 + "\n")
+    
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from backend.app.services import narration_service
+    from backend.app.services.narration_service import NarrationBackend, Narrator, narrate_plan
+    
+    class RecordingBackend(NarrationBackend):
+        name = "recording"
+        
+        def __init__(self):
+            self.batches = []
+            self.release = threading.Event()
+            self.release.set()
+        
+        def generate(self, prompts):
+            self.release.wait()
+            self.batches.append(len(prompts))
+            return [f"narrated {len(p)}" for p in prompts]
+    
+    try:
+        NarrationBackend()
+        abstract = False
+    except TypeError:
+        abstract = True
+    
+    backend, stalled = RecordingBackend(), RecordingBackend()
+    original = narration_service._narrator
+    try:
+        # Concurrent plans arriving within the batch window share one backend call
+        narration_service._narrator = Narrator(backend, batch_size=8, batch_wait_ms=100, queue_size=8)
+        plans = [f"Breakfast: oats {i}" for i in range(4)]
+        with ThreadPoolExecutor(4) as pool:
+            first = list(pool.map(lambda plan: narrate_plan(plan, ["diabetes"], timeout_ms=2000), plans))
+        batched = backend.batches == [4] and all(r["source"] == "recording" for r in first)
+        cached = narrate_plan(plans[0], ["diabetes"])["source"] == "cache"
+        
+        # A stalled backend: callers fall back, the queue fills, expired requests are skipped
+        narrator = narration_service._narrator = Narrator(stalled, batch_wait_ms=0, queue_size=1)
+        stalled.release.clear()
+        narrate_plan("stalls the worker", timeout_ms=50)
+        timed_out = narrate_plan("expires in the queue", timeout_ms=50)
+        full = narrate_plan("queue is full", timeout_ms=2000)
+        stalled.release.set()
+        deadline = time.time() + 5
+        while narrator._pending and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        narration_service._narrator = original
+    
+    print(f"✅ batches {backend.batches}, cached {cached}")
+    print(f"✅ stalled backend: batches {stalled.batches}, rejected {narrator.rejected}, expired {narrator.expired}")
+    return (
+        abstract and batched and cached
+        and timed_out == {"text": "expires in the queue", "source": "rules"}
+        and full["source"] == "rules"
+        and narrator.rejected == 1 and narrator.expired == 1
+        and stalled.batches == [1]
+    )
+
+def test_meal_search_route():
+    """Test /api/diet/meals/search: k bounds, rule queries and a stale index"""
+    print("\n" + "="*60)
+    print("Testing Meal Search Route")
+    print("="*60 + "\n")
+    
+    import hashlib
+    import json
+    import os
+    import sys
+    import tempfile
+    import numpy as np
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+    from app.routes.diet import router
+    from app.services import meal_embeddings
+    
+    class HashEncoder:
+        """Deterministic stand-in for the BERT encoder"""
+        name = "hash"
+        
+        def encode(self, texts):
+            seeds = [int(hashlib.sha256(t.encode()).hexdigest()[:8], 16) for t in texts]
+            vectors = np.stack([np.random.default_rng(seed).normal(size=16) for seed in seeds]).astype(np.float32)
+            return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    
+    api = FastAPI()
+    api.include_router(router)
+    client = TestClient(api)
+    
+    original = meal_embeddings.EMBEDDINGS_DIR, meal_embeddings._index
+    with tempfile.TemporaryDirectory() as directory:
+        meal_embeddings.EMBEDDINGS_DIR, meal_embeddings._index = directory, None
+        try:
+            meta = meal_embeddings.build_index(directory, encoder=HashEncoder())
+            rule = meta["rules"][0]  # known rule: no encoder needed at query time
+            found = client.get("/api/diet/meals/search", params={"q": rule, "k": 3})
+            too_small = client.get("/api/diet/meals/search", params={"q": rule, "k": 0})
+            too_large = client.get("/api/diet/meals/search", params={"q": rule, "k": 51})
+            
+            # The knowledge base changed after the index was built
+            with open(os.path.join(directory, meal_embeddings.INDEX_FILE)) as f:
+                index = json.load(f)
+            index["kb_version"] = "older-version"
+            with open(os.path.join(directory, meal_embeddings.INDEX_FILE), "w") as f:
+                json.dump(index, f)
+            os.utime(os.path.join(directory, meal_embeddings.INDEX_FILE), ns=(1, 1))
+            stale = client.get("/api/diet/meals/search", params={"q": rule})
+        finally:
+            meal_embeddings.EMBEDDINGS_DIR, meal_embeddings._index = original
+    
+    print(f"✅ {len(found.json()['results'])} results for {rule!r}")
+    print(f"✅ k=0 -> {too_small.status_code}, k=51 -> {too_large.status_code}, stale -> {stale.status_code}")
+    return (
+        found.status_code == 200 and len(found.json()["results"]) == 3
+        and too_small.status_code == 422 and too_large.status_code == 422
+        and stale.status_code == 503 and "older-version" in stale.json()["detail"]
+    )
+
+def test_meal_planner_empty_slots():
+    """Test the weekly planner keeps the other slots when one is emptied and handles zero bounds"""
+    print("\n" + "="*60)
+    print("Testing Meal Planner Empty Slots")
+    print("="*60 + "\n")
+    
+    import numpy as np
+    from backend.app.services.knowledge_base import KnowledgeBase
+    from backend.app.services.meal_planner import _violation, plan_week
+    
+    def meal(meal_id, meal_type, ingredients, calories):
+        return {"id": meal_id, "name": meal_id, "meal_type": meal_type, "conditions": ["general"],
+                "ingredients": ingredients, "nutrients": {"calories": calories, "sodium_mg": 100}}
+    
+    meals = [meal("oat-porridge", "breakfast", ["oats"], 300), meal("toast", "breakfast", ["white_bread"], 250),
+             meal("rice-bowl", "lunch", ["rice"], 500), meal("dal", "dinner", ["lentils"], 450),
+             meal("apple", "snack", ["apple"], 80), meal("pear", "snack", ["pear"], 90)]
+    kb = KnowledgeBase(meals, {}, {}, "test", ingredient_data={
+        "ingredient_flags": {"gluten": ["oats", "white_bread"]}, "preferences": {"gluten_free": ["gluten"]}})
+    mask = kb.exclusion_mask(["gluten_free"])
+    candidates = {t: kb.select_meal_ids(t, [], mask) for t in ["breakfast", "lunch", "dinner", "snack"]}
+    week = plan_week(kb, candidates, {"calories": (1000, 1400)})
+    
+    # Zero bounds must not divide by zero
+    totals = np.zeros((2, 8))
+    totals[0, 5] = 50.0  # sodium_mg
+    penalty = _violation(totals, {"sodium_mg": (0.0, 0.0)})
+    
+    print(f"✅ empty slot: {candidates['breakfast']} (excluded by {kb.excluded_flags('breakfast', mask)})")
+    print(f"✅ day 1: {week[0]['breakfast']}, {week[0]['lunch']}, {week[0]['dinner']}, {week[0]['snacks']}")
+    print(f"✅ zero-bound penalty: {penalty.tolist()}")
+    return (
+        len(week) == 7
+        and all(day["breakfast"] is None and day["lunch"] == "rice-bowl" and day["dinner"] == "dal" for day in week)
+        and sorted(week[0]["snacks"]) == ["apple", "pear"]
+        and kb.excluded_flags("breakfast", mask) == ["gluten"]
+        # Cached selections are shared, so they come back immutable
+        and kb.select_meal_ids("lunch", ["diabetes"], mask) == ("rice-bowl",)
+        and kb.select_meal_ids("lunch", ["diabetes"], mask) is kb.select_meal_ids("lunch", ["diabetes"], mask)
+        and plan_week(kb, {}, {}) == []
+        and penalty.tolist() == [50.0, 0.0]
+    )
+
+def test_quick_plan_cache():
+    """Test /api/diet/generate validation and that cached plans are isolated per caller and snapshot"""
+    print("\n" + "="*60)
+    print("Testing Quick Plan Cache")
+    print("="*60 + "\n")
+    
+    import os
+    import sys
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+    from app.routes.diet import router
+    from app.services import diet_engine
+    from app.services.knowledge_base import KnowledgeBase
+    
+    api = FastAPI()
+    api.include_router(router)
+    client = TestClient(api)
+    request = {"age": 45, "weight": 82, "height": 170, "condition": "diabetes", "goal": "weight loss",
+               "diet_type": "veg"}
+    ok = client.post("/api/diet/generate", json=request)
+    invalid = [client.post("/api/diet/generate", json=dict(request, **{field: value})).status_code
+               for field, value in [("age", 0), ("weight", -70), ("height", 0)]]
+    
+    # A caller mutating its response must not change what the next caller gets
+    first = diet_engine.generate_quick_plan(45, 82, 170, "diabetes", "weight loss", "veg")
+    first["breakfast"].append("tampered")
+    first["weekly_plan"][0]["lunch"] = "tampered"
+    second = diet_engine.generate_quick_plan(45, 82, 170, "diabetes", "weight loss", "veg")
+    isolated = "tampered" not in second["breakfast"] and second["weekly_plan"][0]["lunch"] != "tampered"
+    
+    # The plan comes from the snapshot it is keyed on, not whatever is current
+    meals = [{"id": f"{t}-1", "name": f"snapshot {t}", "meal_type": t, "conditions": ["general"],
+              "ingredients": [], "nutrients": {"calories": 400}} for t in ["breakfast", "lunch", "dinner", "snack"]]
+    snapshot = KnowledgeBase(meals, {}, {}, "snapshot-test")
+    signature = (45, 82.0, 170.0, ("diabetes",), "weight_loss", "veg", "", ())
+    from_snapshot = diet_engine._cached_plan(signature, snapshot)["breakfast"] == ["snapshot breakfast"]
+    
+    print(f"✅ valid request {ok.status_code}, invalid age/weight/height -> {invalid}")
+    print(f"✅ cached plan isolated: {isolated}, built from passed snapshot: {from_snapshot}")
+    return ok.status_code == 200 and invalid == [422, 422, 422] and isolated and from_snapshot
+
+def test_inference_thread_budget():
+    """Test the worker thread budget reaches BLAS pools loaded before it was applied"""
+    print("\n" + "="*60)
+    print("Testing Inference Thread Budget")
+    print("="*60 + "\n")
+    
+    import json
+    import os
+    import subprocess
+    import sys
+    
+    # Fresh process: numpy (and its BLAS) is imported before configure_process runs
+    script = ("import json, numpy\n"
+              "from threadpoolctl import threadpool_info\n"
+              "from backend.app.services.inference_threads import configure_process\n"
+              "configure_process()\n"
+              "print(json.dumps([pool['num_threads'] for pool in threadpool_info()]))")
+    env = dict(os.environ, NUTRICARE_INFERENCE_THREADS="2")
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout
+    pools = json.loads(output.strip().splitlines()[-1])
+    print(f"✅ native pool sizes after configure_process: {pools}")
+    return bool(pools) and all(threads == 2 for threads in pools)
+
+def test_model_stage_fingerprint():
+    """Test the conditions stage fingerprint follows the configured and activated model"""
+    print("\n" + "="*60)
+    print("Testing Model Stage Fingerprint")
+    print("="*60 + "\n")
+    
+    import json
+    import os
+    import tempfile
+    from backend.app.services import pipeline
+    from backend.app.services.model_bundle import BUNDLE_FILE
+    
+    settings = ("DISEASE_CLASSIFIER", "DISEASE_MODEL_DIR", "DISEASE_MODEL_VERSIONS", "ACTIVE_MODEL_PATH")
+    original = {name: getattr(pipeline, name) for name in settings}
+    with tempfile.TemporaryDirectory() as root:
+        for name in ("bert", "student", "tuned"):
+            os.makedirs(os.path.join(root, name))
+            with open(os.path.join(root, name, BUNDLE_FILE), "w") as f:
+                json.dump({"weights_sha256": f"sha-of-{name}"}, f)
+        state = os.path.join(root, "active_model.json")
+        try:
+            pipeline.DISEASE_MODEL_VERSIONS = f"tuned={os.path.join(root, 'tuned')}"
+            pipeline.ACTIVE_MODEL_PATH = state
+            pipeline.DISEASE_CLASSIFIER, pipeline.DISEASE_MODEL_DIR = "bert", os.path.join(root, "bert")
+            teacher = pipeline._model_signature()
+            pipeline.DISEASE_CLASSIFIER, pipeline.DISEASE_MODEL_DIR = "student", os.path.join(root, "student")
+            student = pipeline._model_signature()
+            with open(state, "w") as f:
+                json.dump({"active": "tuned"}, f)
+            activated = pipeline._active_model()[0], pipeline._model_signature()
+            with open(state, "w") as f:
+                json.dump({"active": "not-loaded"}, f)
+            unknown = pipeline._active_model()[0]
+        finally:
+            for name, value in original.items():
+                setattr(pipeline, name, value)
+    
+    print(f"✅ teacher/student/activated signatures differ: {len({teacher, student, activated[1]}) == 3}")
+    return len({teacher, student, activated[1]}) == 3 and activated[0] == "tuned" and unknown == "student"
+
+def test_preference_filtering():
+    """Test that diet preferences and allergies remove flagged meals"""
+    print("\n" + "="*60)
+    print("Testing Preference and Allergy Filtering")
+    print("="*60 + "\n")
+    
+    from backend.app.services.knowledge_base import get_knowledge_base
+    
+    kb = get_knowledge_base()
+    mask = kb.exclusion_mask(["vegan"], ["nuts"])
+    
+    violations = []
+    for meal_type in ["breakfast", "lunch", "dinner", "snack"]:
+        ids = kb.select_meal_ids(meal_type, ["diabetes"], mask)
+        print(f"✅ {meal_type:10} {len(ids)} options")
+        for meal_id in ids:
+            if {"meat", "fish", "egg", "dairy", "tree_nuts", "peanuts"} & set(kb.meal_flags(meal_id)):
+                violations.append(kb.meals[meal_id]["name"])
+    
+    if violations:
+        print(f"❌ Excluded meals selected: {violations}")
+    
+    # Oats and other gluten grains count as gluten; unknown allergies are reported, not dropped
+    from backend.app.services.llm_service import generate_natural_diet
+    gluten_free = kb.exclusion_mask(["gluten_free"])
+    oats_kept = [meal_id for meal_id in kb.meals_with_ingredient("oats") if not kb.flags_by_meal[meal_id] & gluten_free]
+    crab = kb.exclusion_mask(allergies=["crab"]) == kb.exclusion_mask(allergies=["shellfish"]) != 0
+    unrecognized = kb.unrecognized_allergies(["crab", "strawberry", "Tree nuts"])
+    plan = generate_natural_diet(["low sugar"], ["diabetes"], allergies=["strawberry"])
+    print(f"✅ unrecognized: {unrecognized}, oat meals left gluten-free: {oats_kept}")
+    return (not violations and not oats_kept and crab and unrecognized == ["strawberry"]
+            and "NOT filtered for them: strawberry" in plan)
+
 def test_diet_rules_generation():
     """Test diet rule generation"""
     print("\n" + "="*60)
@@ -162,9 +890,26 @@ def main():
     tests = [
         ("OpenAI API v1.0.0+", test_openai_import),
         ("Biomarker Extraction", test_biomarker_extraction),
+        ("Unit Conversion", test_unit_conversion),
         ("Disease Detection", test_disease_detection),
         ("Patient Info Extraction", test_patient_info_extraction),
         ("Diet Rules Generation", test_diet_rules_generation),
+        ("Multi-Condition Meal Selection", test_multi_condition_meal_selection),
+        ("Preference Filtering", test_preference_filtering),
+        ("Renal and Hepatic Detection", test_renal_hepatic_detection),
+        ("Risk Scoring", test_risk_scoring),
+        ("Compact Forest Parity", test_compact_forest_parity),
+        ("Classification Report", test_classification_report),
+        ("Shadow Evaluation", test_shadow_evaluation),
+        ("Model Bundles", test_model_bundles),
+        ("Model Stage Fingerprint", test_model_stage_fingerprint),
+        ("Biomarker Store", test_biomarker_store),
+        ("History Routes", test_history_routes),
+        ("Narration Batching", test_narration_batching),
+        ("Meal Search Route", test_meal_search_route),
+        ("Meal Planner Empty Slots", test_meal_planner_empty_slots),
+        ("Quick Plan Cache", test_quick_plan_cache),
+        ("Inference Thread Budget", test_inference_thread_budget),
     ]
     
     results = {}
@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Run from the repository root:
+#   python training/benchmark_classifiers.py
+#   python training/benchmark_classifiers.py --models backend/app/models/bert_disease_classifier other/dir
+#
+# Teacher vs distilled student on the held-out split of distill_classifier.py:
+# accuracy, agreement with the first model, load time, resident memory,
+# single-text latency and batch throughput. Each model is measured in a
+# fresh process so memory numbers do not overlap.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from training.distill_classifier import STUDENT_DIR, TEACHER_DIR, TEACHER_LABELS, load_split
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def disk_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names) / 1e6
+
+
+def child(path: str, repeats: int):
+    from backend.app.services.model_bundle import load_bundle
+
+    _, test_df = load_split()
+    texts = list(test_df["text"])
+
+    baseline = rss_mb()
+    start = time.perf_counter()
+    classifier = load_bundle(path, fallback_labels=dict(enumerate(TEACHER_LABELS))).classifier
+    load_ms = (time.perf_counter() - start) * 1000
+    loaded_mb = rss_mb() - baseline
+
+    classifier.predict_proba(texts[:1])  # warm up
+    latencies = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        classifier.predict_proba([texts[i % len(texts)]])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    batch = texts * max(1, 256 // len(texts))
+    start = time.perf_counter()
+    classifier.predict_proba(batch)
+    batch_seconds = time.perf_counter() - start
+
+    probabilities = classifier.predict_proba(texts)
+    predictions = [classifier.labels[i] for i in probabilities.argmax(axis=1)]
+    print(json.dumps({
+        "predictions": predictions,
+        "accuracy": float(np.mean([p == g for p, g in zip(predictions, test_df["label"])])),
+        "load_ms": load_ms,
+        "rss_mb": max(loaded_mb, rss_mb() - baseline),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "texts_per_second": len(batch) / batch_seconds,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare disease text classifiers")
+    parser.add_argument("--models", nargs="+", default=[TEACHER_DIR, STUDENT_DIR])
+    parser.add_argument("--repeats", type=int, default=100)
+    parser.add_argument("--json", help="write the results here as well")
+    parser.add_argument("--child")
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.repeats)
+        return
+
+    results = {}
+    for path in args.models:
+        if not os.path.isdir(path):
+            print(f"⚠️  Skipping {path}: not found")
+            continue
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", path, "--repeats", str(args.repeats)],
+            capture_output=True, text=True
+        )
+        if output.returncode != 0:
+            print(f"⚠️  {path} failed:\n{output.stderr.strip().splitlines()[-1]}")
+            continue
+        results[path] = json.loads(output.stdout.strip().splitlines()[-1])
+        results[path]["disk_mb"] = disk_mb(path)
+
+    if not results:
+        return
+    reference = next(iter(results.values()))["predictions"]
+    print(f"{'model':45} {'acc':>6} {'agree':>6} {'disk MB':>8} {'RSS MB':>8} {'load ms':>8} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'texts/s':>8}")
+    for path, result in results.items():
+        result["agreement"] = float(np.mean([a == b for a, b in zip(result["predictions"], reference)]))
+        print(f"{path[-45:]:45} {result['accuracy']:6.1%} {result['agreement']:6.1%} {result['disk_mb']:8.1f} "
+              f"{result['rss_mb']:8.1f} {result['load_ms']:8.0f} {result['p50_ms']:7.2f} {result['p95_ms']:7.2f} "
+              f"{result['texts_per_second']:8.0f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import argparse
+import os
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import FeatureUnion, Pipeline
+
+# Run from the repository root:
+#   python training/distill_classifier.py                    # TF-IDF + logistic regression student
+#   python training/distill_classifier.py --student bert     # few-layer BERT student
+#
+# Distills the fine-tuned BERT teacher (bert_disease_classifier) into a
+# small student for production (config.DISEASE_CLASSIFIER = "student").
+# Targets mix the teacher's temperature-softened probabilities with the
+# gold labels: alpha * softmax(teacher / T) + (1 - alpha) * one_hot(gold).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.app.services.model_bundle import data_hash, read_manifest, write_bundle
+from backend.app.services.text_classifier import STUDENT_FILE
+from training.text_split import load_split, split_manifest
+
+TEACHER_DIR = "backend/app/models/bert_disease_classifier"
+STUDENT_DIR = "backend/app/models/disease_student"
+# Index order of a legacy teacher's outputs (as in bert_services.label_map);
+# bundled teachers record their own in bundle.json
+TEACHER_LABELS = ['cholesterol', 'thyroid', 'diabetes', 'hypertension', 'healthy']
+
+
+def teacher_labels(teacher_dir: str = TEACHER_DIR):
+    manifest = read_manifest(teacher_dir) if os.path.isdir(teacher_dir) else None
+    return manifest["labels"] if manifest else TEACHER_LABELS
+
+
+def teacher_logits(texts, teacher_dir: str = TEACHER_DIR, batch_size: int = 32) -> np.ndarray:
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(teacher_dir, local_files_only=True)
+    model = AutoModelForSequenceClassification.from_pretrained(teacher_dir, local_files_only=True)
+    model.eval()
+    logits = []
+    with torch.inference_mode():
+        for start in range(0, len(texts), batch_size):
+            inputs = tokenizer(list(texts[start:start + batch_size]), return_tensors="pt",
+                               padding=True, truncation=True, max_length=128)
+            logits.append(model(**inputs).logits.numpy())
+    return np.concatenate(logits)
+
+
+def pad_logits(logits: np.ndarray, width: int) -> np.ndarray:
+    # Labels the teacher never predicts get a vanishing probability
+    return np.pad(logits, ((0, 0), (0, width - logits.shape[1])), constant_values=-1e4)
+
+
+def soft_targets(logits: np.ndarray, temperature: float) -> np.ndarray:
+    scaled = logits / temperature
+    scaled -= scaled.max(axis=1, keepdims=True)
+    exp = np.exp(scaled)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def distillation_targets(gold: pd.Series, logits: np.ndarray, labels, temperature: float, alpha: float) -> np.ndarray:
+    """
+    (n, len(labels)) target distribution. Without teacher logits the
+    targets are the gold one-hot labels.
+    """
+    one_hot = np.zeros((len(gold), len(labels)))
+    one_hot[np.arange(len(gold)), [labels.index(label) for label in gold]] = 1.0
+    if logits is None:
+        return one_hot
+    return alpha * soft_targets(logits, temperature) + (1 - alpha) * one_hot
+
+
+def train_tfidf_student(texts, targets: np.ndarray, labels):
+    """
+    Logistic regression on soft targets: every text is repeated once per
+    class with the target probability as its sample weight, so minimizing
+    weighted log-loss is cross-entropy against the teacher's distribution.
+    """
+    n, k = targets.shape
+    repeated_texts = np.repeat(np.asarray(texts, dtype=object), k)
+    classes = np.tile(np.arange(k), n)
+    weights = targets.ravel()
+    keep = weights > 1e-6
+
+    pipeline = Pipeline([
+        ("features", FeatureUnion([
+            ("words", TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, min_df=1)),
+            ("chars", TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 5), sublinear_tf=True, min_df=1)),
+        ])),
+        ("classifier", LogisticRegression(C=10.0, max_iter=2000)),
+    ])
+    pipeline.fit(repeated_texts[keep], classes[keep], classifier__sample_weight=weights[keep])
+    return pipeline
+
+
+def train_bert_student(texts, targets: np.ndarray, labels, out_dir: str, layers: int, epochs: int,
+                       temperature: float, teacher_dir: str = TEACHER_DIR):
+    """
+    A `layers`-deep copy of the teacher (embeddings, pooler and evenly
+    spaced encoder layers), trained with KL divergence to the soft targets.
+    """
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer, BertConfig
+
+    tokenizer = AutoTokenizer.from_pretrained(teacher_dir, local_files_only=True)
+    teacher = AutoModelForSequenceClassification.from_pretrained(teacher_dir, local_files_only=True)
+
+    config = BertConfig.from_dict({
+        **teacher.config.to_dict(),
+        "num_hidden_layers": layers,
+        "id2label": dict(enumerate(labels)),
+        "label2id": {label: i for i, label in enumerate(labels)},
+    })
+    student = AutoModelForSequenceClassification.from_config(config)
+    student.bert.embeddings.load_state_dict(teacher.bert.embeddings.state_dict())
+    stride = max(1, teacher.config.num_hidden_layers // layers)
+    for i in range(layers):
+        student.bert.encoder.layer[i].load_state_dict(teacher.bert.encoder.layer[i * stride].state_dict())
+    student.bert.pooler.load_state_dict(teacher.bert.pooler.state_dict())
+    del teacher
+
+    encoded = tokenizer(list(texts), return_tensors="pt", padding=True, truncation=True, max_length=128)
+    target_tensor = torch.tensor(targets, dtype=torch.float32)
+    optimizer = torch.optim.AdamW(student.parameters(), lr=5e-5, weight_decay=0.01)
+    student.train()
+    for epoch in range(epochs):
+        order = torch.randperm(len(texts))
+        total = 0.0
+        for start in range(0, len(texts), 8):
+            batch = order[start:start + 8]
+            logits = student(input_ids=encoded["input_ids"][batch],
+                             attention_mask=encoded["attention_mask"][batch]).logits
+            # T^2 keeps gradient scale comparable across temperatures
+            loss = torch.nn.functional.kl_div(
+                torch.log_softmax(logits / temperature, dim=-1), target_tensor[batch], reduction="batchmean"
+            ) * temperature ** 2
+            loss.backward()
+            optimizer.step()
+            optimizer.zero_grad()
+            total += loss.item() * len(batch)
+        print(f"   epoch {epoch + 1}: KD loss {total / len(texts):.4f}")
+
+    student.save_pretrained(out_dir)
+    tokenizer.save_pretrained(out_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill the BERT disease classifier into a small student")
+    parser.add_argument("--student", choices=["tfidf", "bert"], default="tfidf")
+    parser.add_argument("--teacher", default=TEACHER_DIR)
+    parser.add_argument("--out", default=STUDENT_DIR)
+    parser.add_argument("--temperature", type=float, default=2.0)
+    parser.add_argument("--alpha", type=float, default=0.7, help="weight of teacher targets vs gold labels")
+    parser.add_argument("--layers", type=int, default=4, help="encoder layers of the BERT student")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--extra-texts", help="CSV with a text column of unlabeled reports for the teacher to label")
+    parser.add_argument("--no-teacher", action="store_true", help="train on gold labels only (no torch needed)")
+    args = parser.parse_args()
+
+    train_df, test_df = load_split()
+    texts = list(train_df["text"])
+    base_labels = TEACHER_LABELS if args.no_teacher else teacher_labels(args.teacher)
+    labels = base_labels + sorted(set(train_df["label"]) - set(base_labels))
+
+    if args.no_teacher:
+        targets = distillation_targets(train_df["label"], None, labels, args.temperature, args.alpha)
+    else:
+        print(f"🧑‍🏫 Scoring {len(texts)} texts with the teacher...")
+        logits = pad_logits(teacher_logits(texts, args.teacher), len(labels))
+        targets = distillation_targets(train_df["label"], logits, labels, args.temperature, args.alpha)
+        if args.extra_texts:
+            # Unlabeled reports: teacher-only targets
+            extra = pd.read_csv(args.extra_texts)["text"].dropna().tolist()
+            extra_logits = pad_logits(teacher_logits(extra, args.teacher), len(labels))
+            texts += extra
+            targets = np.vstack([targets, soft_targets(extra_logits, args.temperature)])
+
+    os.makedirs(args.out, exist_ok=True)
+    teacher = None if args.no_teacher else args.teacher
+    if args.student == "tfidf":
+        pipeline = train_tfidf_student(texts, targets, labels)
+        joblib.dump({"pipeline": pipeline, "labels": labels, "temperature": args.temperature,
+                     "alpha": args.alpha, "teacher": teacher},
+                    os.path.join(args.out, STUDENT_FILE))
+        write_bundle(args.out, labels=labels, kind="tfidf", data_hash=data_hash(train_df["text"], train_df["label"]),
+                     split=split_manifest(test_df), teacher=teacher, temperature=args.temperature, alpha=args.alpha)
+    else:
+        train_bert_student(texts, targets, labels, args.out, args.layers, args.epochs, args.temperature, args.teacher)
+        from transformers import AutoTokenizer
+        write_bundle(args.out, labels=labels, kind="bert", max_length=128, data_hash=data_hash(train_df["text"], train_df["label"]),
+                     tokenizer=AutoTokenizer.from_pretrained(args.out, local_files_only=True),
+                     split=split_manifest(test_df), teacher=teacher, temperature=args.temperature, alpha=args.alpha,
+                     layers=args.layers)
+
+    print(f"✅ {args.student} student saved to {args.out}")
+    print("   Serve it with NUTRICARE_DISEASE_CLASSIFIER=student; compare with training/benchmark_classifiers.py")
+
+
+if __name__ == "__main__":
+    main()
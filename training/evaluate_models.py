@@ -1,13 +1,191 @@
-import pandas as pd
+import argparse
+import json
+import os
+import sys
+import time
+
 import joblib
-from sklearn.metrics import accuracy_score
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+# Run from the repository root:
+#   python training/evaluate_models.py
+#   python training/evaluate_models.py --models rf student --out reports/eval.json
+#   python training/evaluate_models.py --compare reports/previous.json
+#
+# One evaluation for the numeric RandomForest and the disease text
+# classifiers, each on the held-out split its training script set aside:
+# train_ml_model.py's 80/20 split for the forest, and for the text models
+# the held-out rows their bundle.json records (training/text_split.py).
+# Text models without that record are not evaluated. Predictions are made
+# in batches, metrics come from one vectorized confusion matrix
+# (backend/app/utils/metrics.py), and the JSON report uses sorted keys so
+# two runs diff cleanly.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.app.services.compact_forest import CompactForest
+from backend.app.utils.metrics import classification_report, metric_deltas
+from training.preprocessing.preprocess_numeric import load_numeric_dataset
+
+DATASET_DIR = "training/data/medical_numeric"
+MODELS_DIR = "training/models"
+TEXT_MODELS = {
+    "bert": "backend/app/models/bert_disease_classifier",
+    "student": "backend/app/models/disease_student",
+}
+NUMERIC_CLASSES = {0: "no_diabetes", 1: "prediabetes", 2: "diabetes"}  # Diabetes_012
+
+
+def batched(predict, inputs, batch_size: int):
+    """
+    Concatenated predict(batch) over inputs, plus the wall time it took.
+    """
+    outputs = []
+    start = time.perf_counter()
+    for offset in range(0, len(inputs), batch_size):
+        outputs.append(predict(inputs[offset:offset + batch_size]))
+    seconds = time.perf_counter() - start
+    return np.concatenate(outputs), seconds
+
+
+def throughput(rows: int, seconds: float, batch_size: int, load_seconds: float) -> dict:
+    return {
+        "batch_size": batch_size,
+        "load_ms": round(load_seconds * 1000, 2),
+        "seconds": round(seconds, 4),
+        "rows_per_second": round(rows / seconds, 1) if seconds else None,
+    }
+
+
+def evaluate_forest(models_dir: str, dataset_dir: str, batch_size: int) -> dict:
+    X, y, features = load_numeric_dataset(dataset_dir)
+    # Same split as train_ml_model.py, so only rows the forest never saw are scored
+    _, X_test, _, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+    forest_dir = os.path.join(models_dir, "forest")
+    pickles = {"model": os.path.join(models_dir, "ml_model.pkl"), "scaler": os.path.join(models_dir, "scaler.pkl")}
+    stale = CompactForest.exists(forest_dir) and CompactForest.stale_reason(forest_dir, pickles)
+    if stale:
+        print(f"⚠️  Compact forest skipped ({stale})")
+    start = time.perf_counter()
+    if CompactForest.exists(forest_dir) and not stale:
+        artifact = forest_dir
+        forest = CompactForest.load(forest_dir)
+        predict = forest.predict_proba  # scales raw rows itself
+        classes = forest.classes_
+    else:
+        artifact = pickles["model"]
+        model = joblib.load(artifact)
+        scaler = joblib.load(pickles["scaler"])
+
+        def predict(rows):
+            return model.predict_proba(scaler.transform(rows))
+        classes = model.classes_
+    load_seconds = time.perf_counter() - start
+
+    probabilities, seconds = batched(predict, X_test, batch_size)
+    names = [NUMERIC_CLASSES.get(int(c), str(c)) for c in classes]
+    lookup = {int(c): name for c, name in zip(classes, names)}
+    y_pred = np.asarray(names)[probabilities.argmax(axis=1)]
+    y_true = np.asarray([lookup[int(v)] for v in y_test])
+
+    return {
+        "kind": "random_forest",
+        "artifact": artifact,
+        "split": {"dataset": dataset_dir, "test_size": 0.2, "seed": 42, "rows": int(len(y_test)),
+                  "features": list(features)},
+        "metrics": classification_report(y_true, y_pred, labels=names),
+        "throughput": throughput(len(y_test), seconds, batch_size, load_seconds),
+    }
+
+
+def evaluate_text(model_dir: str, batch_size: int) -> dict:
+    from backend.app.services.model_bundle import load_bundle
+    from training.distill_classifier import TEACHER_LABELS
+    from training.text_split import TEXT_DATA, held_out_rows
+
+    start = time.perf_counter()
+    bundle = load_bundle(model_dir, fallback_labels=dict(enumerate(TEACHER_LABELS)))
+    load_seconds = time.perf_counter() - start
+
+    # Only rows the bundle says the model never trained on; without that
+    # record the training rows are unknown and any score could be inflated
+    split = bundle.manifest.get("split")
+    test_df = held_out_rows(pd.read_csv(TEXT_DATA).dropna(), split)
+    if test_df is None:
+        raise ValueError(f"{model_dir} records no held-out split in its bundle.json; retrain it to evaluate")
+    if test_df.empty:
+        raise ValueError(f"none of {model_dir}'s held-out rows are in {TEXT_DATA}")
+    texts = list(test_df["text"])
+
+    bundle.classifier.predict_proba(texts[:1])  # warm up lazy initialisation
+    probabilities, seconds = batched(bundle.classifier.predict_proba, texts, batch_size)
+    y_pred = np.asarray(bundle.labels)[probabilities.argmax(axis=1)]
+    labels = list(bundle.labels) + sorted(set(test_df["label"]) - set(bundle.labels))
+
+    return {
+        "kind": bundle.manifest.get("kind"),
+        "artifact": model_dir,
+        "bundle": {k: bundle.manifest.get(k) for k in ("data_hash", "created", "weights_sha256")},
+        "split": {"dataset": TEXT_DATA, "test_size": split["test_size"], "seed": split["seed"],
+                  "rows": len(texts), "used_for_selection": split.get("used_for_selection", False)},
+        "metrics": classification_report(test_df["label"], y_pred, labels=labels),
+        "throughput": throughput(len(texts), seconds, batch_size, load_seconds),
+    }
+
+
+def print_summary(name: str, result: dict, previous: dict = None):
+    metrics = result["metrics"]
+    rate = result["throughput"]["rows_per_second"]
+    print(f"📊 {name}: accuracy {metrics['accuracy']:.4f}, macro F1 {metrics['macro']['f1']:.4f}, "
+          f"weighted F1 {metrics['weighted']['f1']:.4f}, {rate:,.0f} rows/s")
+    if result["split"].get("used_for_selection"):
+        print("   ⚠️  held-out rows also picked the epoch/hyperparameters; scores are optimistic")
+    for label, row in metrics["per_class"].items():
+        print(f"   {label:<16} P {row['precision']:.3f}  R {row['recall']:.3f}  "
+              f"F1 {row['f1']:.3f}  n={row['support']}")
+    if previous and name in previous.get("models", {}):
+        deltas = metric_deltas(metrics, previous["models"][name]["metrics"])
+        print("   vs previous: " + ", ".join(f"{k} {v:+.4f}" for k, v in deltas.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the numeric and text models on held-out data")
+    parser.add_argument("--models", nargs="+", default=["rf", "bert", "student"],
+                        help="rf, bert, student, or a text model directory")
+    parser.add_argument("--models-dir", default=MODELS_DIR, help="RandomForest artifacts")
+    parser.add_argument("--dataset", default=DATASET_DIR, help="Preprocessed numeric dataset")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Rows per predict call (default 8192 for rf, 32 for text)")
+    parser.add_argument("--out", default=None, help="Write the JSON report here")
+    parser.add_argument("--compare", default=None, help="Previous JSON report to diff against")
+    args = parser.parse_args()
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
 
-df = pd.read_csv("training/data/medical_numeric_processed.csv")
+    report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "models": {}}
+    for name in args.models:
+        try:
+            if name == "rf":
+                result = evaluate_forest(args.models_dir, args.dataset, args.batch_size or 8192)
+            else:
+                result = evaluate_text(TEXT_MODELS.get(name, name), args.batch_size or 32)
+        except Exception as e:
+            print(f"❌ {name} evaluation error: {e}")
+            continue
+        report["models"][name] = result
+        print_summary(name, result, previous)
 
-X = df.drop("Diabetes_012", axis=1)
-y = df["Diabetes_012"]
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"✅ Report written to {args.out}")
 
-model = joblib.load("training/models/ml_model.pkl")
-pred = model.predict(X)
 
-print("Accuracy:", accuracy_score(y, pred))
+if __name__ == "__main__":
+    main()
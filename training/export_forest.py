@@ -0,0 +1,51 @@
+import argparse
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+
+# Run from the repository root: python training/export_forest.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.app.services.compact_forest import CompactForest, export_forest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export ml_model.pkl to flat NumPy node arrays")
+    parser.add_argument("--model", default="training/models/ml_model.pkl")
+    parser.add_argument("--scaler", default="training/models/scaler.pkl")
+    parser.add_argument("--out", default="training/models/forest")
+    parser.add_argument("--data", default="training/data/medical_numeric.csv")
+    parser.add_argument("--check-rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    scaler = joblib.load(args.scaler)
+    meta = export_forest(model, scaler, args.out, sources={"model": args.model, "scaler": args.scaler})
+    print(f"✅ Exported {meta['n_trees']} trees / {meta['n_nodes']:,} nodes to {args.out}")
+
+    # Parity against the pickled forest, on real rows when available
+    if os.path.exists(args.data):
+        import pandas as pd
+        rows = pd.read_csv(args.data, nrows=args.check_rows).drop("Diabetes_012", axis=1).to_numpy(dtype=np.float64)
+    else:
+        rows = scaler.inverse_transform(np.random.default_rng(0).normal(size=(args.check_rows, meta["n_features"])))
+
+    start = time.perf_counter()
+    compact = CompactForest.load(args.out).predict_proba(rows)
+    compact_seconds = time.perf_counter() - start
+    expected = model.predict_proba(scaler.transform(rows))
+
+    max_diff = float(np.abs(compact - expected).max())
+    label_mismatches = int((compact.argmax(axis=1) != expected.argmax(axis=1)).sum())
+    print(f"Parity on {len(rows)} rows: max |Δp| = {max_diff:.2e}, label mismatches = {label_mismatches}")
+    print(f"Compact load + predict: {compact_seconds * 1000:.1f} ms")
+    if max_diff > 1e-5 or label_mismatches:
+        print("❌ Compact forest does not match the pickled model")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
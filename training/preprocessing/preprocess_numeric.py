@@ -1,19 +1,149 @@
-import pandas as pd
+import hashlib
+import json
 import os
 
-def preprocess_numeric():
+import numpy as np
+import pandas as pd
+
+# BRFSS features used by train_ml_model.py with the smallest dtype that
+# holds them: binary flags and ordinal scales fit int8, BMI is float32.
+NUMERIC_DTYPES = {
+    "BMI": np.float32,
+    "Age": np.int8,           # _AGEG5YR, 1-13
+    "HighBP": np.int8,
+    "HighChol": np.int8,
+    "PhysActivity": np.int8,
+    "GenHlth": np.int8,       # 1 (excellent) - 5 (poor)
+    "Diabetes_012": np.int8,  # target
+}
+TARGET_COL = "Diabetes_012"
+META_FILE = "columns.json"
+CHUNK_ROWS = 100_000
+
+
+def source_fingerprint(input_path: str, with_hash: bool = True) -> dict:
+    """
+    Size, mtime and (optionally) sha256 of the source CSV.
+    """
+    stat = os.stat(input_path)
+    fingerprint = {"path": input_path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if with_hash:
+        digest = hashlib.sha256()
+        with open(input_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        fingerprint["sha256"] = digest.hexdigest()
+    return fingerprint
+
+
+def dataset_is_current(input_path: str, output_dir: str) -> bool:
+    """
+    True if output_dir was built from input_path as it is now with the
+    current NUMERIC_DTYPES. Size and mtime are checked first; the CSV is only
+    hashed when they differ (e.g. a re-download of identical data).
+    """
+    try:
+        with open(os.path.join(output_dir, META_FILE)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    source = meta.get("source")
+    if not source or not os.path.exists(input_path):
+        return False
+    if meta["columns"] != {column: np.dtype(dtype).name for column, dtype in NUMERIC_DTYPES.items()}:
+        return False
+    current = source_fingerprint(input_path, with_hash=False)
+    if current["size"] != source["size"]:
+        return False
+    if current["mtime_ns"] == source["mtime_ns"]:
+        return True
+    return source_fingerprint(input_path)["sha256"] == source.get("sha256")
+
+
+def _chunks(input_path: str, chunksize: int):
+    # Read as float32: missing values need NaN, and ints are cast after filling
+    return pd.read_csv(
+        input_path,
+        usecols=list(NUMERIC_DTYPES),
+        dtype={column: np.float32 for column in NUMERIC_DTYPES},
+        chunksize=chunksize,
+    )
+
+
+def preprocess_numeric(input_path: str = "training/data/medical_numeric.csv",
+                       output_dir: str = "training/data/medical_numeric",
+                       chunksize: int = CHUNK_ROWS):
+    """
+    Chunked CSV -> one .npy per column in its compact dtype, plus columns.json.
+    Missing values are filled with the column mean. Memory stays at one
+    chunk regardless of survey size; load with load_numeric_dataset().
+    The source CSV's size, mtime and hash are recorded so a changed CSV is
+    detected by dataset_is_current().
+    """
     print("Loading numeric data...")
 
-    input_path = "training/data/medical_numeric.csv"
-    output_path = "training/data/medical_numeric_processed.csv"
+    # Pass 1: row count and column means
+    rows = 0
+    sums = {column: 0.0 for column in NUMERIC_DTYPES}
+    counts = {column: 0 for column in NUMERIC_DTYPES}
+    for chunk in _chunks(input_path, chunksize):
+        rows += len(chunk)
+        for column in NUMERIC_DTYPES:
+            values = chunk[column].to_numpy()
+            sums[column] += float(np.nansum(values, dtype=np.float64))
+            counts[column] += int(np.count_nonzero(~np.isnan(values)))
+    means = {column: sums[column] / counts[column] if counts[column] else 0.0 for column in NUMERIC_DTYPES}
+
+    # Pass 2: fill and write into preallocated memmaps
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = {
+        column: np.lib.format.open_memmap(
+            os.path.join(output_dir, f"{column}.npy"), mode="w+", dtype=dtype, shape=(rows,)
+        )
+        for column, dtype in NUMERIC_DTYPES.items()
+    }
+    start = 0
+    for chunk in _chunks(input_path, chunksize):
+        end = start + len(chunk)
+        for column, dtype in NUMERIC_DTYPES.items():
+            values = chunk[column].to_numpy()
+            values = np.where(np.isnan(values), means[column], values)
+            if np.issubdtype(dtype, np.integer):
+                values = np.rint(values)
+            outputs[column][start:end] = values.astype(dtype)
+        start = end
+    for output in outputs.values():
+        output.flush()
+
+    meta = {
+        "rows": rows,
+        "columns": {column: np.dtype(dtype).name for column, dtype in NUMERIC_DTYPES.items()},
+        "means": means,
+        "target": TARGET_COL,
+        "source": source_fingerprint(input_path),
+    }
+    with open(os.path.join(output_dir, META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    print("Numeric data shape:", (rows, len(NUMERIC_DTYPES)))
+    print("Saved to:", output_dir)
 
-    df = pd.read_csv(input_path)
-    df.fillna(df.mean(numeric_only=True), inplace=True)
+    return meta
 
-    os.makedirs("training/data", exist_ok=True)
-    df.to_csv(output_path, index=False)
 
-    print("Numeric data shape:", df.shape)
-    print("Saved to:", output_path)
+def load_numeric_dataset(path: str = "training/data/medical_numeric", mmap: bool = True):
+    """
+    (X, y, feature names) from preprocess_numeric() output: X is a float32
+    (rows, features) array in NUMERIC_DTYPES order, y the int8 target.
+    With mmap the columns are paged in from disk rather than read up front.
+    """
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    mmap_mode = "r" if mmap else None
+    features = [column for column in meta["columns"] if column != meta["target"]]
 
-    return df
+    X = np.empty((meta["rows"], len(features)), dtype=np.float32)
+    for i, column in enumerate(features):
+        X[:, i] = np.load(os.path.join(path, f"{column}.npy"), mmap_mode=mmap_mode)
+    y = np.load(os.path.join(path, f"{meta['target']}.npy"), mmap_mode=mmap_mode)
+    return X, y, features
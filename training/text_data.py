@@ -0,0 +1,114 @@
+import hashlib
+import inspect
+import json
+import os
+import time
+
+import pandas as pd
+from datasets import Dataset, load_from_disk
+from transformers import TrainerCallback, TrainingArguments
+
+from backend.app.services.model_bundle import data_hash as labelled_data_hash
+from training.text_split import TEXT_DATA, load_split
+
+# Shared text-data helpers for train_bert.py and tune_bert_hyperparams.py:
+# label encoding, tokenization without padding (DataCollatorWithPadding pads
+# each batch to its own longest sequence), an on-disk tokenized cache, and a
+# throughput callback.
+
+TOKENIZED_CACHE_DIR = "training/cache/tokenized"
+# Pretrained checkpoint to fine-tune; a local directory works for offline runs
+BASE_MODEL = os.environ.get("NUTRICARE_BERT_BASE", "bert-base-uncased")
+
+
+def load_text_data(path: str = TEXT_DATA):
+    """
+    (df, label_map) with labels encoded as ints in first-seen order.
+    """
+    df = pd.read_csv(path)
+    df = df.dropna()
+
+    label_map = {label: idx for idx, label in enumerate(df["label"].unique())}
+    df["label"] = df["label"].map(label_map)
+    return df, label_map
+
+
+def load_text_split(path: str = TEXT_DATA):
+    """
+    (train_df, test_df, label_map): text_split's held-out split, labels
+    encoded as in load_text_data.
+    """
+    train_df, test_df = load_split(path)
+    _, label_map = load_text_data(path)
+    return (train_df.assign(label=train_df["label"].map(label_map)),
+            test_df.assign(label=test_df["label"].map(label_map)), label_map)
+
+
+def data_hash(df: pd.DataFrame) -> str:
+    return labelled_data_hash(df["text"], df["label"])
+
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    return f"{type(tokenizer).__name__}:{tokenizer.name_or_path}:{len(tokenizer)}"
+
+
+def cache_key(df: pd.DataFrame, tokenizer, max_length: int) -> str:
+    key = json.dumps([tokenizer_fingerprint(tokenizer), max_length, data_hash(df)])
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def tokenize_dataset(df: pd.DataFrame, tokenizer, max_length: int,
+                     cache_dir: str = TOKENIZED_CACHE_DIR) -> Dataset:
+    """
+    Truncated but unpadded encodings plus a "length" column for
+    group_by_length. Cached under cache_dir, keyed by tokenizer,
+    max_length and the data itself, so reruns skip tokenization.
+    """
+    path = os.path.join(cache_dir, cache_key(df, tokenizer, max_length)) if cache_dir else None
+    if path and os.path.exists(path):
+        return load_from_disk(path)
+
+    dataset = Dataset.from_pandas(df[["text", "label"]], preserve_index=False)
+
+    def tokenize(batch):
+        encoded = tokenizer(batch["text"], truncation=True, max_length=max_length)
+        encoded["length"] = [len(ids) for ids in encoded["input_ids"]]
+        return encoded
+
+    dataset = dataset.map(tokenize, batched=True, remove_columns=["text"])
+    if path:
+        dataset.save_to_disk(path)
+    return dataset
+
+
+def length_grouping_args() -> dict:
+    """
+    TrainingArguments that batch similar lengths together via the dataset's
+    "length" column. transformers 5 replaced group_by_length=True with
+    train_sampling_strategy="group_by_length"; use whichever is available.
+    """
+    parameters = inspect.signature(TrainingArguments).parameters
+    if "train_sampling_strategy" in parameters:
+        return {"train_sampling_strategy": "group_by_length", "length_column_name": "length"}
+    return {"group_by_length": True, "length_column_name": "length"}
+
+
+class ThroughputCallback(TrainerCallback):
+    """
+    Logs epoch wall time and real (non-pad) tokens/sec from the dataset's
+    "length" column.
+    """
+
+    def __init__(self, dataset: Dataset):
+        self.tokens_per_epoch = int(sum(dataset["length"]))
+        self.epoch_start = None
+        self.epochs = []
+
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self.epoch_start = time.perf_counter()
+
+    def on_epoch_end(self, args, state, control, **kwargs):
+        seconds = time.perf_counter() - self.epoch_start
+        tokens_per_second = self.tokens_per_epoch / seconds if seconds else 0.0
+        self.epochs.append({"epoch": state.epoch, "seconds": seconds, "tokens_per_second": tokens_per_second})
+        print(f"⏱️  Epoch {state.epoch:.0f}: {seconds:.1f}s, {tokens_per_second:,.0f} tokens/s")
@@ -0,0 +1,51 @@
+import hashlib
+from typing import Dict, Optional
+
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+# The one train / held-out split of the disease text data. Every script that
+# trains a text model (train_bert.py, tune_bert_hyperparams.py,
+# distill_classifier.py) trains on the train rows only and records the
+# held-out rows in its bundle.json under "split"; evaluate_models.py scores
+# a model on exactly those rows. Split on string labels, before encoding,
+# so every script gets the same rows. No torch or datasets needed.
+
+TEXT_DATA = "training/data/medical_text_processed.csv"
+SPLIT_SEED = 42
+TEST_SIZE = 0.2
+
+
+def load_split(path: str = TEXT_DATA, test_size: float = TEST_SIZE):
+    """
+    (train_df, test_df) with string labels.
+    """
+    df = pd.read_csv(path).dropna()
+    return train_test_split(df, test_size=test_size, random_state=SPLIT_SEED, stratify=df["label"])
+
+
+def row_id(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def split_manifest(test_df: pd.DataFrame, test_size: float = TEST_SIZE, used_for_selection: bool = False) -> Dict:
+    """
+    bundle.json "split" entry. used_for_selection marks held-out rows that
+    picked the epoch or hyperparameters: unseen in training, but scores on
+    them are optimistic.
+    """
+    return {
+        "seed": SPLIT_SEED,
+        "test_size": test_size,
+        "held_out": sorted(row_id(text) for text in test_df["text"]),
+        "used_for_selection": used_for_selection,
+    }
+
+
+def held_out_rows(df: pd.DataFrame, split: Optional[Dict]) -> Optional[pd.DataFrame]:
+    """
+    Rows of df a model's bundle lists as held out, or None if it lists none.
+    """
+    if not split or not split.get("held_out"):
+        return None
+    return df[df["text"].map(row_id).isin(set(split["held_out"]))]
@@ -1,88 +1,107 @@
-import pandas as pd
-from datasets import Dataset
+import os
+import sys
+
 from transformers import (
     BertTokenizer,
     BertForSequenceClassification,
+    DataCollatorWithPadding,
     Trainer,
     TrainingArguments
 )
 
-# -------------------------------
-# 1. Load data
-# -------------------------------
-df = pd.read_csv("training/data/medical_text_processed.csv")
+# Run from the repository root: python training/train_bert.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Drop empty rows
-df = df.dropna()
+from backend.app.services.model_bundle import write_bundle
+from training.text_data import (
+    BASE_MODEL,
+    ThroughputCallback,
+    data_hash,
+    length_grouping_args,
+    load_text_split,
+    tokenize_dataset
+)
+from training.text_split import split_manifest
+
+MAX_LENGTH = 128
+MODEL_DIR = "backend/app/models/bert_disease_classifier"
 
 # -------------------------------
-# 2. Encode labels (IMPORTANT FIX)
+# 1. Load data and encode labels
 # -------------------------------
-label_map = {label: idx for idx, label in enumerate(df["label"].unique())}
-df["label"] = df["label"].map(label_map)
+# Train on text_split's train rows only; the held-out rows are recorded in
+# the bundle so evaluate_models.py can score the model on unseen data
+train_df, test_df, label_map = load_text_split()
 
 print("Label mapping:", label_map)
 
 # -------------------------------
-# 3. Convert to HuggingFace Dataset
-# -------------------------------
-dataset = Dataset.from_pandas(df)
-
-# -------------------------------
-# 4. Tokenizer
+# 2. Tokenizer + tokenized dataset
 # -------------------------------
-tokenizer = BertTokenizer.from_pretrained("bert-base-uncased")
-
-def tokenize(batch):
-    return tokenizer(
-        batch["text"],
-        padding="max_length",
-        truncation=True,
-        max_length=128
-    )
-
-dataset = dataset.map(tokenize, batched=True)
-dataset = dataset.remove_columns(["text"])
-dataset.set_format("torch")
+# No padding here: the collator pads each batch to its longest sequence,
+# and group_by_length batches similar lengths together. Encodings are
+# cached on disk keyed by tokenizer, max_length and data.
+tokenizer = BertTokenizer.from_pretrained(BASE_MODEL)
+dataset = tokenize_dataset(train_df, tokenizer, MAX_LENGTH)
+real_tokens = sum(dataset["length"])
+print(f"Tokens: {real_tokens:,} real vs {len(dataset) * MAX_LENGTH:,} with max_length padding")
 
 # -------------------------------
-# 5. Model
+# 3. Model
 # -------------------------------
+# Label names go into the model config, so the saved weights carry their own mapping
+labels = sorted(label_map, key=label_map.get)
 model = BertForSequenceClassification.from_pretrained(
-    "bert-base-uncased",
-    num_labels=len(label_map)
+    BASE_MODEL,
+    num_labels=len(label_map),
+    id2label=dict(enumerate(labels)),
+    label2id=label_map
 )
 
 # -------------------------------
-# 6. Training arguments
+# 4. Training arguments
 # -------------------------------
 training_args = TrainingArguments(
-    output_dir="backend/app/models/bert_disease_classifier",
+    output_dir=MODEL_DIR,
     eval_strategy="no",
     per_device_train_batch_size=4,
     num_train_epochs=3,
     logging_steps=5,
-    save_strategy="epoch"
+    save_strategy="epoch",
+    **length_grouping_args()
 )
 
 # -------------------------------
-# 7. Trainer
+# 5. Trainer
 # -------------------------------
+throughput = ThroughputCallback(dataset)
 trainer = Trainer(
     model=model,
     args=training_args,
-    train_dataset=dataset
+    train_dataset=dataset,
+    data_collator=DataCollatorWithPadding(tokenizer),
+    callbacks=[throughput]
 )
 
 # -------------------------------
-# 8. Train
+# 6. Train
 # -------------------------------
-trainer.train()
+train_output = trainer.train()
 
 # -------------------------------
-# 9. Save model
-# -------------------------------
-trainer.save_model("backend/app/models/bert_disease_classifier")
-tokenizer.save_pretrained("backend/app/models/bert_disease_classifier")
+# 7. Save model + bundle manifest
+# -------------------------------
+trainer.save_model(MODEL_DIR)
+tokenizer.save_pretrained(MODEL_DIR)
+write_bundle(
+    MODEL_DIR,
+    labels=labels,
+    kind="bert",
+    max_length=MAX_LENGTH,
+    data_hash=data_hash(train_df),
+    tokenizer=tokenizer,
+    benchmark={"train": train_output.metrics, "epochs": throughput.epochs},
+    split=split_manifest(test_df)
+)
 
 print("✅ BERT model trained and saved successfully")
@@ -1,52 +1,151 @@
-import pandas as pd
-from sklearn.model_selection import train_test_split, cross_val_score
+import argparse
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from sklearn.model_selection import train_test_split, cross_validate, StratifiedKFold
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, classification_report
+from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
+from sklearn.utils.class_weight import compute_class_weight
 import joblib
+import numpy as np
 
-# Load data
-df = pd.read_csv("training/data/medical_numeric.csv")
-
-# 👇 Correct target column
-TARGET_COL = "Diabetes_012"   # change ONLY if your CSV differs
+# Run from the repository root: python training/train_ml_model.py [--quick]
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-X = df.drop(TARGET_COL, axis=1)
-y = df[TARGET_COL]
+from backend.app.services.compact_forest import export_forest
+from training.preprocessing.preprocess_numeric import dataset_is_current, load_numeric_dataset, preprocess_numeric
 
-# Scale features
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
-
-# Train-test split
-X_train, X_test, y_train, y_test = train_test_split(
-    X_scaled, y, test_size=0.2, random_state=42, stratify=y
-)
+DATASET_CSV = "training/data/medical_numeric.csv"
+DATASET_DIR = "training/data/medical_numeric"
+MODELS_DIR = "training/models"
 
-# Train model with better params
-model = RandomForestClassifier(
+FOREST_PARAMS = dict(
     n_estimators=500,
     max_depth=10,
     min_samples_split=5,
     min_samples_leaf=2,
     random_state=42,
-    n_jobs=-1,
     class_weight='balanced'
 )
-model.fit(X_train, y_train)
-
-# Cross-validation
-cv_scores = cross_val_score(model, X_train, y_train, cv=5)
-print(f"Cross-validation scores: {cv_scores}")
-print(f"Mean CV accuracy: {cv_scores.mean():.4f}")
-
-# Evaluate
-y_pred = model.predict(X_test)
-acc = accuracy_score(y_test, y_pred)
-print(f"✅ Test Accuracy: {acc * 100:.2f}%")
-print(classification_report(y_test, y_pred))
-
-# Save model and scaler
-joblib.dump(model, "training/models/ml_model.pkl")
-joblib.dump(scaler, "training/models/scaler.pkl")
-print("✅ Model and scaler saved to training/models/")
+
+timings = {}
+
+
+@contextmanager
+def phase(name: str):
+    start = time.perf_counter()
+    yield
+    timings[name] = time.perf_counter() - start
+    print(f"⏱️  {name}: {timings[name]:.1f}s")
+
+
+def build_pipeline(forest_jobs: int, **forest_overrides) -> Pipeline:
+    # Trees do not need scaling; the scaler stays because the backend
+    # (numeric_model_service) feeds the forest scaled features.
+    return Pipeline([
+        ("scaler", StandardScaler()),
+        ("forest", RandomForestClassifier(**{**FOREST_PARAMS, "n_jobs": forest_jobs, **forest_overrides})),
+    ])
+
+
+def split_jobs(n_jobs: int, folds: int):
+    """
+    (parallel folds, threads per forest) so the product stays within n_jobs
+    instead of every fold's forest grabbing all cores.
+    """
+    cv_jobs = max(1, min(folds, n_jobs))
+    return cv_jobs, max(1, n_jobs // cv_jobs)
+
+
+def quick_oob(X_train, y_train, n_jobs: int, step: int):
+    """
+    Grow one forest in `step`-tree increments with warm_start and report
+    the out-of-bag accuracy at each size: one fit instead of CV's five.
+    The last increment is shortened if needed so the forest ends at exactly
+    FOREST_PARAMS["n_estimators"] trees.
+    """
+    # Explicit weights: the "balanced" preset is recomputed per warm-start call
+    classes = np.unique(y_train)
+    class_weight = dict(zip(classes, compute_class_weight("balanced", classes=classes, y=y_train)))
+    pipeline = build_pipeline(n_jobs, oob_score=True, warm_start=True, n_estimators=step,
+                              class_weight=class_weight)
+    forest = pipeline.named_steps["forest"]
+    X_scaled = pipeline.named_steps["scaler"].fit_transform(X_train)
+    target = FOREST_PARAMS["n_estimators"]
+    sizes = list(range(step, target, step)) + [target]
+    for n_trees in sizes:
+        forest.set_params(n_estimators=n_trees)
+        forest.fit(X_scaled, y_train)
+        print(f"   {n_trees:4d} trees: OOB accuracy {forest.oob_score_:.4f}")
+    return pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the BRFSS RandomForest")
+    parser.add_argument("--quick", action="store_true", help="warm-start OOB scoring instead of cross-validation")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--n-jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--oob-step", type=int, default=100)
+    args = parser.parse_args()
+
+    with phase("load"):
+        # Rebuild the column cache when the CSV changed since it was written
+        if not dataset_is_current(DATASET_CSV, DATASET_DIR):
+            preprocess_numeric(DATASET_CSV, DATASET_DIR)
+        X, y, feature_names = load_numeric_dataset(DATASET_DIR)
+        print(f"Loaded {X.shape[0]:,} rows x {len(feature_names)} features ({X.nbytes / 1e6:.1f} MB)")
+
+    # Split first so the scaler only ever sees training rows
+    with phase("split"):
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42, stratify=y
+        )
+
+    if args.quick:
+        with phase("oob"):
+            pipeline = quick_oob(X_train, y_train, args.n_jobs, args.oob_step)
+    else:
+        cv_jobs, forest_jobs = split_jobs(args.n_jobs, args.folds)
+        with phase("cross-validation"):
+            cv = cross_validate(
+                build_pipeline(forest_jobs), X_train, y_train,
+                cv=StratifiedKFold(args.folds, shuffle=True, random_state=42),
+                n_jobs=cv_jobs
+            )
+            print(f"Cross-validation scores: {cv['test_score']}")
+            print(f"Mean CV accuracy: {cv['test_score'].mean():.4f} "
+                  f"({cv_jobs} parallel folds x {forest_jobs} threads)")
+
+        with phase("final fit"):
+            pipeline = build_pipeline(args.n_jobs)
+            pipeline.fit(X_train, y_train)
+
+    with phase("evaluate"):
+        y_pred = pipeline.predict(X_test)
+        acc = accuracy_score(y_test, y_pred)
+        print(f"✅ Test Accuracy: {acc * 100:.2f}%")
+        print(classification_report(y_test, y_pred))
+
+    with phase("save"):
+        os.makedirs(MODELS_DIR, exist_ok=True)
+        pickles = {"model": os.path.join(MODELS_DIR, "ml_model.pkl"),
+                   "scaler": os.path.join(MODELS_DIR, "scaler.pkl")}
+        joblib.dump(pipeline.named_steps["forest"], pickles["model"])
+        joblib.dump(pipeline.named_steps["scaler"], pickles["scaler"])
+        print(f"✅ Model and scaler saved to {MODELS_DIR}/")
+
+    # Re-export so the backend's compact forest matches the new pickles
+    with phase("export"):
+        meta = export_forest(pipeline.named_steps["forest"], pipeline.named_steps["scaler"],
+                             os.path.join(MODELS_DIR, "forest"), sources=pickles)
+        print(f"✅ Compact forest exported ({meta['n_trees']} trees / {meta['n_nodes']:,} nodes)")
+
+    print("\nPhase timings: " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in timings.items()))
+
+
+if __name__ == "__main__":
+    main()
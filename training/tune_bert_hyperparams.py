@@ -1,31 +1,58 @@
-import pandas as pd
+import argparse
+import fcntl
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+
 import numpy as np
-from datasets import Dataset
 from transformers import (
     BertTokenizer,
     BertForSequenceClassification,
+    DataCollatorWithPadding,
     Trainer,
-    TrainingArguments,
-    EarlyStoppingCallback
+    TrainerCallback,
+    TrainingArguments
 )
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, precision_recall_fscore_support
 import optuna
 import torch
-import os
+
+# Run from the repository root: python training/tune_bert_hyperparams.py [--workers N]
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.app.services.model_bundle import write_bundle
+from training.text_data import (
+    BASE_MODEL,
+    data_hash,
+    length_grouping_args,
+    load_text_data,
+    load_text_split,
+    tokenize_dataset
+)
+from training.text_split import split_manifest
 
 # Set random seeds for reproducibility
 torch.manual_seed(42)
 np.random.seed(42)
 
+STUDY_NAME = "bert_disease_classification"
+STORAGE = "sqlite:///training/cache/optuna_bert.db"
+MAX_LENGTHS = [128, 256, 512]
+MAX_EPOCHS = 10
+EARLY_STOPPING_PATIENCE = 3
+TUNED_MODEL_DIR = "backend/app/models/bert_disease_classifier_tuned"
+# Weights of the best trial so far; the only model a tuning run writes
+BEST_TRIAL_DIR = "training/cache/best_trial"
+
+# Per-process cache: label_map, tokenizer, and {max_length: (train, val)} datasets
+_prepared = {}
+
 def load_and_preprocess_data():
     """Load and preprocess the medical text data"""
-    df = pd.read_csv("training/data/medical_text_processed.csv")
-    df = df.dropna()
-
-    # Encode labels
-    label_map = {label: idx for idx, label in enumerate(df["label"].unique())}
-    df["label"] = df["label"].map(label_map)
+    df, label_map = load_text_data()
 
     print(f"Label mapping: {label_map}")
     print(f"Dataset size: {len(df)}")
@@ -33,23 +60,28 @@ def load_and_preprocess_data():
 
     return df, label_map
 
-def tokenize_data(df, tokenizer, max_length=256):
-    """Tokenize the dataset"""
-    dataset = Dataset.from_pandas(df)
-
-    def tokenize(batch):
-        return tokenizer(
-            batch["text"],
-            padding="max_length",
-            truncation=True,
-            max_length=max_length
-        )
-
-    dataset = dataset.map(tokenize, batched=True)
-    dataset = dataset.remove_columns(["text"])
-    dataset.set_format("torch")
-
-    return dataset
+def prepare_datasets(max_lengths=MAX_LENGTHS):
+    """
+    Load, split and tokenize once per candidate max_length. Trials in this
+    process share the result; other processes hit the on-disk tokenized
+    cache instead of re-tokenizing.
+    """
+    if _prepared:
+        return _prepared
+    load_and_preprocess_data()
+    # text_split's held-out rows are the validation set that ranks trials
+    train_df, val_df, label_map = load_text_split()
+    tokenizer = BertTokenizer.from_pretrained(BASE_MODEL)
+
+    _prepared["label_map"] = label_map
+    _prepared["tokenizer"] = tokenizer
+    _prepared["data_hash"] = data_hash(train_df)
+    _prepared["split"] = split_manifest(val_df, used_for_selection=True)
+    _prepared["datasets"] = {
+        max_length: (tokenize_dataset(train_df, tokenizer, max_length), tokenize_dataset(val_df, tokenizer, max_length))
+        for max_length in max_lengths
+    }
+    return _prepared
 
 def compute_metrics(eval_pred):
     """Compute evaluation metrics"""
@@ -66,46 +98,141 @@ def compute_metrics(eval_pred):
         'f1': f1
     }
 
+class OptunaPruningCallback(TrainerCallback):
+    """Report epoch-level eval accuracy to the trial and stop it when pruned"""
+
+    def __init__(self, trial, metric="eval_accuracy"):
+        self.trial = trial
+        self.metric = metric
+
+    def on_evaluate(self, args, state, control, metrics=None, **kwargs):
+        if not metrics or self.metric not in metrics:
+            return
+        epoch = int(round(state.epoch or 0))
+        self.trial.report(metrics[self.metric], step=epoch)
+        if self.trial.should_prune():
+            raise optuna.TrialPruned(f"pruned at epoch {epoch}")
+
+class BestStateCallback(TrainerCallback):
+    """
+    Checkpoint-free replacement for save_strategy="epoch" +
+    load_best_model_at_end + EarlyStoppingCallback: keeps the best
+    epoch's weights as an in-memory CPU copy and stops after `patience`
+    evaluations without improvement.
+    """
+
+    def __init__(self, metric="eval_accuracy", patience=EARLY_STOPPING_PATIENCE):
+        self.metric = metric
+        self.patience = patience
+        self.best_score = None
+        self.best_state = None
+        self.evaluations = 0
+        self.stale = 0
+
+    def on_evaluate(self, args, state, control, metrics=None, model=None, **kwargs):
+        if not metrics or self.metric not in metrics:
+            return
+        self.evaluations += 1
+        if self.best_score is None or metrics[self.metric] > self.best_score:
+            self.best_score = metrics[self.metric]
+            self.best_state = {k: v.detach().to("cpu", copy=True) for k, v in model.state_dict().items()}
+            self.stale = 0
+        else:
+            self.stale += 1
+            if self.stale >= self.patience:
+                control.should_training_stop = True
+
+    def restore(self, model):
+        if self.best_state is not None:
+            model.load_state_dict(self.best_state)
+
+def checkpoint_bytes(model) -> int:
+    """
+    Approximate size of one Trainer checkpoint: weights plus the two AdamW
+    moment buffers (optimizer.pt), all fp32.
+    """
+    return 3 * sum(p.numel() * p.element_size() for p in model.parameters())
+
+def read_saved_trial():
+    """{"trial", "score", "max_length"} of the weights in BEST_TRIAL_DIR, or None"""
+    score_file = os.path.join(BEST_TRIAL_DIR, "score.json")
+    if not os.path.exists(score_file):
+        return None
+    with open(score_file) as f:
+        return json.load(f)
+
+def saved_trial_in_study(study) -> bool:
+    """True if BEST_TRIAL_DIR holds a completed trial of this study with its recorded score"""
+    saved = read_saved_trial()
+    if saved is None:
+        return False
+    return any(t.number == saved.get("trial") and t.value == saved["score"]
+               for t in study.get_trials(states=[optuna.trial.TrialState.COMPLETE]))
+
+def saved_trial_is_best(study) -> bool:
+    """True if BEST_TRIAL_DIR holds the study's best trial (or one tied with it)"""
+    saved = read_saved_trial()
+    if saved is None or not saved_trial_in_study(study):
+        return False
+    return saved.get("trial") == study.best_trial.number or saved["score"] == study.best_value
+
+def persist_if_best(score, model, max_length, trial_number):
+    """
+    Save the trial's weights to BEST_TRIAL_DIR if they beat the best saved
+    so far. Locked, since parallel workers finish trials concurrently.
+    """
+    os.makedirs(os.path.dirname(BEST_TRIAL_DIR), exist_ok=True)
+    with open(BEST_TRIAL_DIR + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        score_file = os.path.join(BEST_TRIAL_DIR, "score.json")
+        if os.path.exists(score_file):
+            with open(score_file) as f:
+                if json.load(f)["score"] >= score:
+                    return False
+        staging = BEST_TRIAL_DIR + ".tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        model.save_pretrained(staging)
+        prepared = prepare_datasets()
+        prepared["tokenizer"].save_pretrained(staging)
+        with open(os.path.join(staging, "label_map.json"), "w") as f:
+            json.dump(prepared["label_map"], f)
+        with open(os.path.join(staging, "score.json"), "w") as f:
+            json.dump({"trial": trial_number, "score": score, "max_length": max_length}, f)
+        label_map = prepared["label_map"]
+        write_bundle(staging, labels=sorted(label_map, key=label_map.get), kind="bert", max_length=max_length,
+                     data_hash=prepared["data_hash"], tokenizer=prepared["tokenizer"],
+                     benchmark={"eval_accuracy": score}, split=prepared["split"])
+        shutil.rmtree(BEST_TRIAL_DIR, ignore_errors=True)
+        os.replace(staging, BEST_TRIAL_DIR)
+    return True
+
 def objective(trial):
     """Optuna objective function for hyperparameter tuning"""
 
-    # Load data
-    df, label_map = load_and_preprocess_data()
-
-    # Split data
-    train_df, val_df = train_test_split(df, test_size=0.2, random_state=42, stratify=df['label'])
-
-    # Tokenizer
-    tokenizer = BertTokenizer.from_pretrained("bert-base-uncased")
-
-    # Tokenize datasets
-    train_dataset = tokenize_data(train_df, tokenizer)
-    val_dataset = tokenize_data(val_df, tokenizer)
+    prepared = prepare_datasets()
 
     # Hyperparameters to tune
     learning_rate = trial.suggest_float('learning_rate', 1e-5, 5e-4, log=True)
     batch_size = trial.suggest_categorical('batch_size', [4, 8, 16])
     weight_decay = trial.suggest_float('weight_decay', 0.0, 0.3)
-    num_epochs = trial.suggest_int('num_epochs', 3, 10)
+    num_epochs = trial.suggest_int('num_epochs', 3, MAX_EPOCHS)
     warmup_steps = trial.suggest_int('warmup_steps', 0, 500)
-    max_length = trial.suggest_categorical('max_length', [128, 256, 512])
+    max_length = trial.suggest_categorical('max_length', MAX_LENGTHS)
 
-    # Re-tokenize with new max_length if different
-    if max_length != 256:
-        train_dataset = tokenize_data(train_df, tokenizer, max_length)
-        val_dataset = tokenize_data(val_df, tokenizer, max_length)
+    train_dataset, val_dataset = prepared["datasets"][max_length]
 
     # Model
     model = BertForSequenceClassification.from_pretrained(
-        "bert-base-uncased",
-        num_labels=len(label_map)
+        BASE_MODEL,
+        num_labels=len(prepared["label_map"])
     )
 
-    # Training arguments
+    # Training arguments (no checkpoints: BestStateCallback keeps the best epoch in memory)
+    output_dir = f"./temp_trial_{trial.number}"
     training_args = TrainingArguments(
-        output_dir=f"./temp_trial_{trial.number}",
+        output_dir=output_dir,
         eval_strategy="epoch",
-        save_strategy="epoch",
+        save_strategy="no",
         learning_rate=learning_rate,
         per_device_train_batch_size=batch_size,
         per_device_eval_batch_size=batch_size,
@@ -113,53 +240,121 @@ def objective(trial):
         weight_decay=weight_decay,
         warmup_steps=warmup_steps,
         logging_steps=10,
-        load_best_model_at_end=True,
-        metric_for_best_model="accuracy",
-        greater_is_better=True,
-        save_total_limit=1,
+        **length_grouping_args(),
         dataloader_pin_memory=False,
         report_to="none"  # Disable wandb/tensorboard logging
     )
 
     # Trainer
+    best = BestStateCallback()
     trainer = Trainer(
         model=model,
         args=training_args,
         train_dataset=train_dataset,
         eval_dataset=val_dataset,
+        data_collator=DataCollatorWithPadding(prepared["tokenizer"]),
         compute_metrics=compute_metrics,
-        callbacks=[EarlyStoppingCallback(early_stopping_patience=3)]
+        callbacks=[best, OptunaPruningCallback(trial)]
     )
 
-    # Train
-    trainer.train()
-
-    # Evaluate
-    eval_results = trainer.evaluate()
-
-    # Clean up
-    import shutil
-    if os.path.exists(f"./temp_trial_{trial.number}"):
-        shutil.rmtree(f"./temp_trial_{trial.number}")
-
-    return eval_results['eval_accuracy']
+    start = time.perf_counter()
+    try:
+        # Train (raises TrialPruned from the callback when the pruner stops it)
+        trainer.train()
+    finally:
+        # What save_strategy="epoch" would have written, for the end-of-run report
+        trial.set_user_attr("checkpoint_bytes_avoided", best.evaluations * checkpoint_bytes(model))
+        trial.set_user_attr("trial_seconds", time.perf_counter() - start)
+        # Clean up (logs only; no checkpoints are written)
+        if os.path.exists(output_dir):
+            shutil.rmtree(output_dir)
+
+    # The best epoch's score, already evaluated; only a new study best touches disk
+    best.restore(model)
+    persist_if_best(best.best_score, model, max_length, trial.number)
+    return best.best_score
+
+def make_pruner(name: str):
+    if name == "hyperband":
+        return optuna.pruners.HyperbandPruner(min_resource=1, max_resource=MAX_EPOCHS, reduction_factor=3)
+    if name == "median":
+        return optuna.pruners.MedianPruner(n_startup_trials=3, n_warmup_steps=1)
+    return optuna.pruners.NopPruner()
+
+def make_storage(url: str):
+    # Several worker processes write the same SQLite file; wait on its lock
+    return optuna.storages.RDBStorage(url, engine_kwargs={"connect_args": {"timeout": 60}})
+
+def run_worker(worker_id: int, storage_url: str, pruner: str, n_trials: int, timeout: int, threads: int):
+    """One tuning process: its own sampler seed and torch thread budget, shared study"""
+    torch.set_num_threads(threads)
+    study = optuna.load_study(
+        study_name=STUDY_NAME,
+        storage=make_storage(storage_url),
+        sampler=optuna.samplers.TPESampler(seed=42 + worker_id),
+        pruner=make_pruner(pruner)
+    )
+    study.optimize(objective, n_trials=n_trials, timeout=timeout)
 
 def main():
     """Main function to run hyperparameter tuning"""
+    parser = argparse.ArgumentParser(description="Optuna search over BERT fine-tuning hyperparameters")
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--timeout", type=int, default=3600, help="seconds, per worker")
+    parser.add_argument("--workers", type=int, default=1, help="parallel trial processes")
+    parser.add_argument("--pruner", choices=["median", "hyperband", "none"], default="median")
+    parser.add_argument("--storage", default=STORAGE)
+    parser.add_argument("--retrain-final", action="store_true",
+                        help="retrain on the final split instead of keeping the best trial's weights")
+    args = parser.parse_args()
 
     print("🚀 Starting BERT Hyperparameter Tuning for 90-95% Accuracy")
     print("=" * 60)
 
-    # Create study
+    # Tokenize every candidate max_length once up front; workers load it from disk
+    prepare_datasets()
+
+    os.makedirs("training/cache", exist_ok=True)
     study = optuna.create_study(
         direction='maximize',
-        study_name='bert_disease_classification',
-        sampler=optuna.samplers.TPESampler(seed=42)
+        study_name=STUDY_NAME,
+        storage=make_storage(args.storage),
+        sampler=optuna.samplers.TPESampler(seed=42),
+        pruner=make_pruner(args.pruner),
+        load_if_exists=True
     )
+    # A resumed study keeps its best weights, so new trials are compared against
+    # the study's best; weights from another study or storage are discarded
+    if not saved_trial_in_study(study):
+        shutil.rmtree(BEST_TRIAL_DIR, ignore_errors=True)
+    elif study.trials:
+        print(f"↩️  Resuming study: {len(study.trials)} earlier trials, best weights kept in {BEST_TRIAL_DIR}")
 
     # Run optimization
-    print("🔍 Optimizing hyperparameters...")
-    study.optimize(objective, n_trials=20, timeout=3600)  # 20 trials or 1 hour timeout
+    print(f"🔍 Optimizing hyperparameters ({args.workers} worker(s), {args.pruner} pruner)...")
+    if args.workers > 1:
+        threads = max(1, (os.cpu_count() or 1) // args.workers)
+        per_worker = -(-args.trials // args.workers)
+        context = multiprocessing.get_context("spawn")
+        workers = [
+            context.Process(target=run_worker, args=(i, args.storage, args.pruner, per_worker, args.timeout, threads))
+            for i in range(args.workers)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        study = optuna.load_study(study_name=STUDY_NAME, storage=make_storage(args.storage))
+    else:
+        study.optimize(objective, n_trials=args.trials, timeout=args.timeout)
+
+    pruned = len(study.get_trials(states=[optuna.trial.TrialState.PRUNED]))
+    complete = len(study.get_trials(states=[optuna.trial.TrialState.COMPLETE]))
+    print(f"Trials: {complete} complete, {pruned} pruned")
+    finished = study.get_trials(states=[optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED])
+    avoided = sum(t.user_attrs.get("checkpoint_bytes_avoided", 0) for t in finished)
+    trial_seconds = sum(t.user_attrs.get("trial_seconds", 0) for t in finished)
+    print(f"💾 Checkpoint writes avoided: {avoided / 1e9:.1f} GB over {trial_seconds / 60:.1f} trial-minutes")
 
     print("\n" + "=" * 60)
     print("🎯 BEST HYPERPARAMETERS FOUND:")
@@ -169,42 +364,47 @@ def main():
     for key, value in study.best_params.items():
         print(f"  {key}: {value}")
 
-    # Train final model with best parameters
-    print("\n🏆 Training final model with best hyperparameters...")
-    train_final_model(study.best_params)
+    if args.retrain_final or not saved_trial_is_best(study):
+        # Train final model with best parameters (also when the saved weights
+        # are missing or are not the best trial's, e.g. the best is from a run
+        # whose weights were lost)
+        print("\n🏆 Training final model with best hyperparameters...")
+        train_final_model(study.best_params)
+    else:
+        shutil.rmtree(TUNED_MODEL_DIR, ignore_errors=True)
+        shutil.copytree(BEST_TRIAL_DIR, TUNED_MODEL_DIR)
+        print(f"\n🏆 Best trial's weights saved to: {TUNED_MODEL_DIR}")
 
 def train_final_model(best_params):
     """Train the final model with the best hyperparameters"""
 
-    # Load data
-    df, label_map = load_and_preprocess_data()
-
-    # Split data (use more data for training)
-    train_df, val_df = train_test_split(df, test_size=0.3, random_state=42, stratify=df['label'])
+    # Load data: the same split as the trials, so the held-out rows stay unseen
+    load_and_preprocess_data()
+    train_df, val_df, label_map = load_text_split()
     # For small datasets, use cross-validation instead of separate test set
     test_df = val_df.copy()  # Use validation set as test set for small data
 
     print(f"Train size: {len(train_df)}, Val size: {len(val_df)}, Test size: {len(test_df)}")
 
     # Tokenizer
-    tokenizer = BertTokenizer.from_pretrained("bert-base-uncased")
+    tokenizer = BertTokenizer.from_pretrained(BASE_MODEL)
 
-    # Tokenize datasets
-    train_dataset = tokenize_data(train_df, tokenizer, best_params['max_length'])
-    val_dataset = tokenize_data(val_df, tokenizer, best_params['max_length'])
-    test_dataset = tokenize_data(test_df, tokenizer, best_params['max_length'])
+    # Tokenize datasets (cached on disk)
+    train_dataset = tokenize_dataset(train_df, tokenizer, best_params['max_length'])
+    val_dataset = tokenize_dataset(val_df, tokenizer, best_params['max_length'])
+    test_dataset = val_dataset
 
     # Model
     model = BertForSequenceClassification.from_pretrained(
-        "bert-base-uncased",
+        BASE_MODEL,
         num_labels=len(label_map)
     )
 
-    # Training arguments with best params
+    # Training arguments with best params (best epoch kept in memory, saved once)
     training_args = TrainingArguments(
-        output_dir="backend/app/models/bert_disease_classifier_tuned",
+        output_dir=TUNED_MODEL_DIR,
         eval_strategy="epoch",
-        save_strategy="epoch",
+        save_strategy="no",
         learning_rate=best_params['learning_rate'],
         per_device_train_batch_size=best_params['batch_size'],
         per_device_eval_batch_size=best_params['batch_size'],
@@ -212,27 +412,27 @@ def train_final_model(best_params):
         weight_decay=best_params['weight_decay'],
         warmup_steps=best_params['warmup_steps'],
         logging_steps=10,
-        load_best_model_at_end=True,
-        metric_for_best_model="accuracy",
-        greater_is_better=True,
-        save_total_limit=2,
+        **length_grouping_args(),
         dataloader_pin_memory=False,
         report_to="none"
     )
 
     # Trainer
+    best = BestStateCallback()
     trainer = Trainer(
         model=model,
         args=training_args,
         train_dataset=train_dataset,
         eval_dataset=val_dataset,
+        data_collator=DataCollatorWithPadding(tokenizer),
         compute_metrics=compute_metrics,
-        callbacks=[EarlyStoppingCallback(early_stopping_patience=3)]
+        callbacks=[best]
     )
 
     # Train
     print("Training final model...")
     trainer.train()
+    best.restore(model)
 
     # Evaluate on test set
     print("Evaluating on test set...")
@@ -240,17 +440,20 @@ def train_final_model(best_params):
     print(f"Test Results: {test_results}")
 
     # Save model and tokenizer
-    trainer.save_model("backend/app/models/bert_disease_classifier_tuned")
-    tokenizer.save_pretrained("backend/app/models/bert_disease_classifier_tuned")
+    trainer.save_model(TUNED_MODEL_DIR)
+    tokenizer.save_pretrained(TUNED_MODEL_DIR)
 
-    # Save label mapping
-    import json
-    with open("backend/app/models/bert_disease_classifier_tuned/label_map.json", "w") as f:
+    # Save label mapping + bundle manifest
+    with open(os.path.join(TUNED_MODEL_DIR, "label_map.json"), "w") as f:
         json.dump(label_map, f)
+    write_bundle(TUNED_MODEL_DIR, labels=sorted(label_map, key=label_map.get), kind="bert",
+                 max_length=best_params['max_length'], data_hash=data_hash(train_df), tokenizer=tokenizer,
+                 benchmark={"test": test_results, "params": best_params},
+                 split=split_manifest(val_df, used_for_selection=True))
 
     print("✅ Tuned BERT model trained and saved successfully!")
     print(f"🎯 Final Test Accuracy: {test_results['eval_accuracy']:.4f}")
-    print(f"📁 Model saved to: backend/app/models/bert_disease_classifier_tuned")
+    print(f"📁 Model saved to: {TUNED_MODEL_DIR}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()